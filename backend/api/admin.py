@@ -1,17 +1,104 @@
+from django import forms
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
 from .models import (
     User,
     Venue,
     Space,
     Amenity,
     SpaceAmenity,
+    ArchivedBooking,
     Booking,
     Review,
 )
+from .occupancy import in_force
+from .utils.booking_days import booking_days
+
+
+ESTIMATE_SQL = {
+    "mysql": (
+        "SELECT TABLE_ROWS FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+    ),
+    "postgresql": "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+}
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses the planner's row estimate instead of COUNT(*) for unfiltered change
+    lists on large tables. Filtered or small lists are counted exactly.
+    """
+    exact_below = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        sql = ESTIMATE_SQL.get(connections[queryset.db].vendor)
+        if sql and not queryset.query.where:
+            with connections[queryset.db].cursor() as cursor:
+                cursor.execute(sql, [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] and row[0] >= self.exact_below:
+                return int(row[0])
+        return super().count
+
+
+class IdFilter(admin.SimpleListFilter):
+    """
+    Filters on a foreign key by typing its ID, instead of listing every
+    related row in the sidebar. Subclasses set title, parameter_name and
+    field_path.
+    """
+    template = "admin/id_filter.html"
+    field_path = None
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield {
+            "selected": self.value() is None,
+            "query_string": changelist.get_query_string(remove=[self.parameter_name]),
+            # Keeps the search, ordering and other filters when the form is submitted.
+            "query_parts": [
+                (key, value)
+                for key, value in changelist.params.items()
+                if key != self.parameter_name
+            ],
+        }
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value is None or not value.isdigit():
+            return queryset
+        return queryset.filter(**{self.field_path: int(value)})
+
+
+class VenueIdFilter(IdFilter):
+    title = "venue ID"
+    parameter_name = "venue_id"
+    field_path = "venue_id"
+
+
+class SpaceVenueIdFilter(VenueIdFilter):
+    field_path = "space__venue_id"
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Change list settings for tables that grow with traffic."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdmin):
     readonly_fields = ("id", "created_at", "updated_at")
     list_display = (
         "id", "name", "email", "phone",
@@ -38,9 +125,15 @@ class VenueAdmin(admin.ModelAdmin):
     )
     list_filter = ("venue_type", "city", "created_at")
     search_fields = ("name", "owner__name", "address", "description")
+    autocomplete_fields = ("owner",)
     ordering = ("-created_at",)
     inlines = [SpaceInline]
 
+    def get_queryset(self, request):
+        # Instead of list_select_related, so autocomplete results (which
+        # render __str__, owner name included) are joined too.
+        return super().get_queryset(request).select_related("owner")
+
 
 @admin.register(Space)
 class SpaceAdmin(admin.ModelAdmin):
@@ -51,10 +144,15 @@ class SpaceAdmin(admin.ModelAdmin):
         "price_per_day", "is_published", "amenities_enabled",
         "created_at", "updated_at"
     )
-    list_filter = ("is_published", "venue", "created_at", "updated_at")
+    list_filter = ("is_published", VenueIdFilter, "created_at", "updated_at")
     search_fields = ("name", "description", "venue__name")
+    autocomplete_fields = ("venue",)
     ordering = ("-created_at",)
 
+    def get_queryset(self, request):
+        # Instead of list_select_related, so autocomplete results are joined too.
+        return super().get_queryset(request).select_related("venue__owner")
+
 
 @admin.register(Amenity)
 class AmenityAdmin(admin.ModelAdmin):
@@ -65,16 +163,34 @@ class AmenityAdmin(admin.ModelAdmin):
 
 
 @admin.register(SpaceAmenity)
-class SpaceAmenityAdmin(admin.ModelAdmin):
+class SpaceAmenityAdmin(LargeTableAdmin):
     readonly_fields = ("id", "created_at", "updated_at")
     list_display = ("id", "space", "amenity", "amount", "created_at")
-    list_filter = ("amenity", "space__venue")
+    list_filter = ("amenity", SpaceVenueIdFilter)
+    list_select_related = ("space__venue", "amenity")
     search_fields = ("space__name", "amenity__name", "space__venue__name")
+    autocomplete_fields = ("space", "amenity")
     ordering = ("-created_at",)
 
 
+class BookingAdminForm(forms.ModelForm):
+    """Reports dates taken by another booking as a form error, not a failed save."""
+
+    def clean(self):
+        data = super().clean()
+        space, start, end = (data.get(key) for key in ("space", "start_datetime", "end_datetime"))
+        if data.get("status") in Booking.ACTIVE_STATUSES and space and start and end:
+            taken = in_force().filter(
+                space=space, date__in=booking_days(start, end)
+            ).exclude(booking_id=self.instance.pk)
+            if taken.exists():
+                raise forms.ValidationError("These dates are already booked on this space.")
+        return data
+
+
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(LargeTableAdmin):
+    form = BookingAdminForm
     readonly_fields = ("id", "created_at", "updated_at")
     list_display = (
         "id", "space", "renter",
@@ -82,21 +198,45 @@ class BookingAdmin(admin.ModelAdmin):
         "status", "total_price", "currency", "payment_status",
         "created_at",
     )
-    list_filter = ("status", "payment_status", "currency", "space__venue")
+    list_filter = ("status", "payment_status", "currency", SpaceVenueIdFilter)
+    list_select_related = ("space__venue", "renter")
     search_fields = ("space__name", "space__venue__name", "renter__name", "renter__email")
+    autocomplete_fields = ("space", "renter")
     ordering = ("-created_at",)
 
 
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(LargeTableAdmin):
+    list_display = (
+        "id", "space", "renter",
+        "start_datetime", "end_datetime",
+        "status", "total_price", "currency", "payment_status",
+        "created_at",
+    )
+    list_filter = ("status", "payment_status", SpaceVenueIdFilter)
+    list_select_related = ("space__venue", "renter")
+    search_fields = ("space__name", "space__venue__name", "renter__name", "renter__email")
+    ordering = ("-end_datetime",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(LargeTableAdmin):
     readonly_fields = ("id", "created_at", "updated_at")
     list_display = ("id", "get_venue", "get_reviewer", "rating", "created_at")
     list_filter = ("rating",)
+    list_select_related = ("booking__space__venue__owner", "booking__renter")
     search_fields = (
         "comment",
         "booking__space__venue__name",
         "booking__renter__name",
     )
+    raw_id_fields = ("booking",)
     ordering = ("-created_at",)
 
     def get_venue(self, obj):
@@ -0,0 +1,295 @@
+"""
+Host analytics backed by the SpaceDailyStat rollup.
+
+Every booking change enqueues an apply_booking_rollup task (api/signals.py,
+api/tasks.py) that recomputes the rollup rows of the days the booking covered
+before and after the change from that space's bookings, live and archived.
+A recompute writes absolute values, so tasks may run late, out of order or
+more than once and the rollup still converges; a FAILED task leaves its days
+stale only until the next change to them, a retry of the task or
+`backfill_analytics`. The analytics endpoint only ever reads the rollup, so
+its cost depends on the number of spaces and days requested, never on the
+size of the booking table.
+Page views and impressions come from the daily view tables the write-behind
+counters fill (api/counters.py).
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal, ROUND_DOWN
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils.dateparse import parse_datetime
+
+from . import archive, sharding
+from .models import Booking, Space, SpaceDailyStat, SpaceDailyViews, VenueDailyViews
+from .utils.booking_days import booking_days, day_bounds
+
+GRANULARITIES = {
+    "day": None,
+    "week": TruncWeek,
+    "month": TruncMonth,
+}
+
+# Upper bound on the requested window so one query can never scan unbounded history.
+MAX_RANGE_DAYS = 366 * 3
+
+CENT = Decimal("0.01")
+
+# What booking_contributions() reads of a booking.
+SNAPSHOT_FIELDS = ("space_id", "start_datetime", "end_datetime", "total_price", "status")
+
+
+def booking_contributions(snapshot):
+    """
+    Returns {date: (booked_days, revenue, booking_count)} for one booking
+    snapshot (see Booking.snapshot). Revenue is split evenly across the
+    booked days; the rounding remainder goes to the first day so the sum
+    always equals total_price.
+    """
+    if snapshot["status"] not in Booking.REVENUE_STATUSES:
+        return {}
+
+    days = booking_days(snapshot["start_datetime"], snapshot["end_datetime"])
+    if not days:
+        return {}
+
+    total = Decimal(snapshot["total_price"] or 0)
+    per_day = (total / len(days)).quantize(CENT, rounding=ROUND_DOWN)
+    first_day = total - per_day * (len(days) - 1)
+
+    contributions = {}
+    for index, day in enumerate(days):
+        contributions[day] = (
+            1,
+            first_day if index == 0 else per_day,
+            1 if index == 0 else 0,
+        )
+    return contributions
+
+
+def refresh_days(space_id, days):
+    """
+    Recomputes the rollup rows of one space on `days` from its bookings on
+    the current database; returns how many rows it wrote.
+    """
+    if not days:
+        return 0
+    using = sharding.current()
+    with transaction.atomic(using=using):
+        # Recomputes of one space take turns, so the last one to commit read
+        # every booking that committed before it started.
+        if not list(Space.objects.select_for_update().filter(pk=space_id).values_list("pk")):
+            return 0  # Deleted: its rows went with it.
+
+        totals = {day: [0, Decimal("0.00"), 0] for day in days}
+        start, end = day_bounds(min(days), max(days))
+        for bookings in archive.history(
+            space_id=space_id, status__in=Booking.REVENUE_STATUSES,
+            start_datetime__lte=end, end_datetime__gte=start,
+        ):
+            for booking in bookings.only(*SNAPSHOT_FIELDS):
+                for day, (booked, revenue, count) in booking_contributions(booking.snapshot()).items():
+                    if day in totals:
+                        row = totals[day]
+                        row[0] += booked
+                        row[1] += revenue
+                        row[2] += count
+
+        # Days nothing covers need no row unless one is there to zero out.
+        existing = set(
+            SpaceDailyStat.objects.filter(space_id=space_id, date__in=totals)
+            .values_list("date", flat=True)
+        )
+        rows = [
+            SpaceDailyStat(space_id=space_id, date=day, booked_days=booked,
+                           revenue=revenue, booking_count=count)
+            for day, (booked, revenue, count) in sorted(totals.items())
+            if booked or day in existing
+        ]
+        SpaceDailyStat.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["space", "date"],
+            update_fields=["booked_days", "revenue", "booking_count", "updated_at"],
+        )
+    return len(rows)
+
+
+def snapshot_from_payload(payload):
+    """Restores a Booking.snapshot() that went through a JSON task payload."""
+    if payload is None:
+        return None
+    return {
+        **payload,
+        "start_datetime": parse_datetime(payload["start_datetime"]),
+        "end_datetime": parse_datetime(payload["end_datetime"]),
+        "total_price": Decimal(payload["total_price"]),
+    }
+
+
+def affected_days(before, after):
+    """
+    {space_id: set of dates} a booking change from its `before` to its
+    `after` snapshot can alter in the rollup. Either side may be None
+    (created / deleted).
+    """
+    days = defaultdict(set)
+    for snapshot in (before, after):
+        if snapshot is not None:
+            days[snapshot["space_id"]].update(
+                booking_days(snapshot["start_datetime"], snapshot["end_datetime"])
+            )
+    return days
+
+
+def rebuild(bookings, batch_size=1000):
+    """
+    Recomputes rollup rows from an iterable of bookings and bulk inserts them.
+    The caller is responsible for clearing the rows being rebuilt first.
+    """
+    totals = defaultdict(lambda: [0, Decimal("0.00"), 0])
+    for booking in bookings:
+        snapshot = booking.snapshot()
+        for day, (booked, revenue, count) in booking_contributions(snapshot).items():
+            row = totals[(snapshot["space_id"], day)]
+            row[0] += booked
+            row[1] += revenue
+            row[2] += count
+
+    SpaceDailyStat.objects.bulk_create(
+        [
+            SpaceDailyStat(
+                space_id=space_id,
+                date=day,
+                booked_days=booked,
+                revenue=revenue,
+                booking_count=count,
+            )
+            for (space_id, day), (booked, revenue, count) in totals.items()
+        ],
+        batch_size=batch_size,
+    )
+    return len(totals)
+
+
+def period_days(period_start, granularity, start_date, end_date):
+    """Number of days of [start_date, end_date] that fall inside the period."""
+    if granularity == "day":
+        return 1
+    if granularity == "week":
+        period_end = period_start + timedelta(days=6)
+    else:
+        next_month = (period_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        period_end = next_month - timedelta(days=1)
+    return (min(period_end, end_date) - max(period_start, start_date)).days + 1
+
+
+def venue_analytics(venue, start_date, end_date, granularity="day"):
+    """
+    Aggregates the rollup for one venue over [start_date, end_date] grouped by
+    the requested granularity, both for the venue as a whole and per space.
+    """
+    trunc = GRANULARITIES[granularity]
+    rows = SpaceDailyStat.objects.filter(
+        space__venue=venue,
+        date__gte=start_date,
+        date__lte=end_date,
+    )
+    period = F("date") if trunc is None else trunc("date")
+    rows = rows.annotate(period=period)
+
+    space_ids = list(venue.spaces.values_list("id", flat=True))
+
+    def row_payload(period_start, booked, revenue, count, capacity):
+        days = period_days(period_start, granularity, start_date, end_date)
+        available = days * capacity
+        return {
+            "period": period_start.isoformat(),
+            "booked_days": booked,
+            "revenue": str(revenue.quantize(CENT)),
+            "booking_count": count,
+            "occupancy_rate": round(booked / available, 4) if available else None,
+        }
+
+    totals = (
+        rows.values("period")
+        .annotate(
+            booked=Sum("booked_days"),
+            revenue=Sum("revenue"),
+            count=Sum("booking_count"),
+        )
+        .order_by("period")
+    )
+    per_space = (
+        rows.values("space_id", "period")
+        .annotate(
+            booked=Sum("booked_days"),
+            revenue=Sum("revenue"),
+            count=Sum("booking_count"),
+        )
+        .order_by("space_id", "period")
+    )
+
+    space_views = defaultdict(list)
+    for row in view_counts(SpaceDailyViews.objects.filter(space__venue=venue), period,
+                           start_date, end_date, "space_id"):
+        space_views[row["space_id"]].append(view_payload(row))
+
+    spaces = defaultdict(list)
+    for row in per_space:
+        spaces[row["space_id"]].append(row_payload(
+            _as_date(row["period"]), row["booked"], row["revenue"], row["count"], 1
+        ))
+
+    return {
+        "venue": venue.id,
+        "from": start_date.isoformat(),
+        "to": end_date.isoformat(),
+        "granularity": granularity,
+        "totals": [
+            row_payload(
+                _as_date(row["period"]), row["booked"], row["revenue"],
+                row["count"], len(space_ids),
+            )
+            for row in totals
+        ],
+        "views": [
+            view_payload(row)
+            for row in view_counts(VenueDailyViews.objects.filter(venue=venue), period,
+                                   start_date, end_date)
+        ],
+        "spaces": [
+            {
+                "space": space_id,
+                "periods": spaces.get(space_id, []),
+                "views": space_views.get(space_id, []),
+            }
+            for space_id in space_ids
+        ],
+    }
+
+
+def view_counts(rows, period, start_date, end_date, *group):
+    """Views and impressions of daily view rows summed per period (and `group`)."""
+    return (
+        rows.filter(date__gte=start_date, date__lte=end_date)
+        .annotate(period=period)
+        .values(*group, "period")
+        .annotate(views=Sum("views"), impressions=Sum("impressions"))
+        .order_by(*group, "period")
+    )
+
+
+def view_payload(row):
+    return {
+        "period": _as_date(row["period"]).isoformat(),
+        "views": row["views"],
+        "impressions": row["impressions"],
+    }
+
+
+def _as_date(value):
+    # TruncWeek/TruncMonth may hand back datetimes depending on the backend.
+    return value.date() if hasattr(value, "date") else value
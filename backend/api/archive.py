@@ -0,0 +1,86 @@
+"""
+Hot/cold split of the Booking table.
+
+Bookings that ended more than BOOKING_ARCHIVE_DAYS ago move to ArchivedBooking
+(`manage.py archive_bookings`), keeping their id. Hot paths (overlap checks,
+reservations, availability, holds) read only Booking and the occupancy
+ledger, which never hold an archived booking. Code that needs history reads
+both tables:
+
+    live, archived = archive.history(space__venue_id=3)
+
+Bookings are moved in batches of `batch_size`, each its own transaction
+(insert into the archive, delete from Booking), so a run can stop anywhere
+and the next one picks up where it left off. The move bypasses the Booking
+signals: an archived booking still counts in the analytics rollup and frees
+no future dates. A booking with a review stays live, because the review
+points at it; reviewing an archived booking moves it back first (restore,
+which locks the archived row so concurrent reviews restore it once).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import sharding
+from .models import ArchivedBooking, Booking, SpaceOccupancy
+
+ARCHIVE_DAYS = 365
+BATCH_SIZE = 1000
+
+FIELDS = [
+    field.attname for field in Booking._meta.concrete_fields if field.name != "updated_at"
+]
+
+
+def cutoff(days=None):
+    if days is None:
+        days = getattr(settings, "BOOKING_ARCHIVE_DAYS", ARCHIVE_DAYS)
+    return timezone.now() - timedelta(days=days)
+
+
+def history(*args, **kwargs):
+    """The live and the archived bookings matching a filter, as two querysets."""
+    return Booking.objects.filter(*args, **kwargs), ArchivedBooking.objects.filter(*args, **kwargs)
+
+
+def archivable(before):
+    return Booking.objects.filter(end_datetime__lt=before, review__isnull=True)
+
+
+def archive_batch(before, batch_size=BATCH_SIZE):
+    """Moves up to `batch_size` bookings that ended before `before`; returns how many."""
+    with transaction.atomic(using=sharding.current()):
+        queryset = archivable(before).order_by("end_datetime", "id")
+        if connections[queryset.db].features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True, of=("self",))
+        else:
+            queryset = queryset.select_for_update()
+        rows = list(queryset.values(*FIELDS)[:batch_size])
+        if not rows:
+            return 0
+        ids = [row["id"] for row in rows]
+        ArchivedBooking.objects.bulk_create([ArchivedBooking(**row) for row in rows])
+        SpaceOccupancy.objects.filter(booking_id__in=ids).delete()
+        live = Booking.objects.filter(id__in=ids)
+        live._raw_delete(live.db)
+    return len(rows)
+
+
+def restore(archived):
+    """
+    Moves an archived booking back into Booking and returns it. If another
+    request restored it first, returns that live booking instead.
+    """
+    with transaction.atomic(using=sharding.current()):
+        # Concurrent restores queue up here; the losers find the row gone.
+        if not ArchivedBooking.objects.select_for_update().filter(pk=archived.pk).exists():
+            return Booking.objects.filter(pk=archived.pk).first()
+        row = {name: getattr(archived, name) for name in FIELDS}
+        # bulk_create sends no signals: the rollup already counts the booking.
+        booking, = Booking.objects.bulk_create([Booking(**row)])
+        Booking.objects.filter(pk=booking.pk).update(created_at=archived.created_at)
+        booking.created_at = archived.created_at
+        archived.delete()
+    return booking
@@ -5,13 +5,17 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 
+from . import identity
 from .models import User
 from .serializers import UserSerializer
 from .jwt_utils import generate_token, decode_token
+from .throttling import IPTokenBucketThrottle
 
 
 class RegisterView(APIView):
     permission_classes = (AllowAny,)
+    throttle_classes = (IPTokenBucketThrottle,)
+    throttle_scope = "register"
 
     def post(self, request):
         data = request.data.copy()
@@ -33,6 +37,8 @@ class RegisterView(APIView):
 
 class LoginView(APIView):
     permission_classes = (AllowAny,)
+    throttle_classes = (IPTokenBucketThrottle,)
+    throttle_scope = "login"
 
     def post(self, request):
         """
@@ -99,7 +105,7 @@ class MeView(APIView):
             return Response({"detail": "Invalid or expired token."}, status=status.HTTP_401_UNAUTHORIZED)
         user_id = payload.get("user_id")
         try:
-            user = User.objects.get(id=user_id)
+            user = identity.get(User, user_id)
         except User.DoesNotExist:
             return Response({"detail": "Invalid token."}, status=status.HTTP_401_UNAUTHORIZED)
         serializer = UserSerializer(user)
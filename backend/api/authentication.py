@@ -1,14 +1,12 @@
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
+from . import identity
 from .jwt_utils import decode_token
 from .models import User
 
 
 class JWTAuthentication(BaseAuthentication):
     def authenticate(self, request):
-        print("User model:", User)
-        print("User count:", User.objects.count())
-
         auth = request.headers.get("Authorization", "")
 
         if not auth.startswith("Bearer "):
@@ -25,7 +23,7 @@ class JWTAuthentication(BaseAuthentication):
             raise AuthenticationFailed("Invalid token payload.")
 
         try:
-            user = User.objects.get(id=user_id)
+            user = identity.get(User, user_id)
         except User.DoesNotExist:
             raise AuthenticationFailed("User not found.")
 
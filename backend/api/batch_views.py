@@ -0,0 +1,219 @@
+# backend/api/batch_views.py
+"""
+POST /api/batch/ runs several API requests in one round trip:
+
+    [
+        {"id": "space", "method": "GET", "path": "/api/spaces/7/"},
+        {"id": "days", "method": "GET", "path": "/api/bookings/7/reservations/?month=2025-03"},
+        {"method": "POST", "path": "/api/reviews/", "body": {"venue": 3, "rating": 5}}
+    ]
+
+Sub-requests are resolved and dispatched in-process with the batch
+request's user, so the bearer token is checked once. Runs of consecutive
+GETs execute concurrently on a thread pool (each thread uses its own
+database connection); any other method waits for everything before it and
+runs alone, so writes keep their order. Sub-requests are not one
+transaction: each succeeds or fails on its own.
+
+Sub-requests skip the middleware, so what it would do for them is done
+here: each gets its own identity map, and each counts towards
+LOAD_SHED_MAX_IN_FLIGHT alongside the batch itself, getting a 503 result
+while the process is at the limit (api/middleware.py).
+
+Each result carries the sub-request's status, headers, body, duration and
+query count. Limits: BATCH_MAX_REQUESTS sub-requests per batch, and a
+sub-response body larger than BATCH_MAX_RESPONSE_BYTES is replaced by a 413
+result; a streamed body is abandoned as soon as it passes the limit.
+"""
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import orjson
+from django.conf import settings
+from django.db import connection, connections
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import status
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .identity import identity_map
+from .middleware import in_flight, overloaded_response
+
+METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE"}
+
+
+class BatchView(APIView):
+    permission_classes = (AllowAny,)
+
+    def post(self, request):
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get("requests")
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"detail": "Send a non-empty list of sub-requests."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        max_requests = getattr(settings, "BATCH_MAX_REQUESTS", 20)
+        if len(items) > max_requests:
+            return Response(
+                {"detail": f"A batch may hold at most {max_requests} sub-requests."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        errors = {i: self.validate(item) for i, item in enumerate(items)}
+        errors = {i: error for i, error in errors.items() if error}
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user if request.user.is_authenticated else None
+        results = [None] * len(items)
+        for group in self.groups(items):
+            if len(group) > 1 and self.can_run_concurrently():
+                workers = getattr(settings, "BATCH_MAX_WORKERS", 4)
+                with ThreadPoolExecutor(max_workers=min(workers, len(group))) as pool:
+                    for i, result in zip(group, pool.map(
+                        lambda i: self.run_in_thread(request, user, items[i]), group
+                    )):
+                        results[i] = result
+            else:
+                for i in group:
+                    results[i] = self.run(request, user, items[i])
+
+        for i, (item, result) in enumerate(zip(items, results)):
+            result["id"] = item.get("id", i)
+        return Response(results)
+
+    @staticmethod
+    def validate(item):
+        if not isinstance(item, dict):
+            return "Must be an object with method and path."
+        if str(item.get("method", "GET")).upper() not in METHODS:
+            return f"method must be one of {', '.join(sorted(METHODS))}."
+        path = item.get("path")
+        if not isinstance(path, str) or not path.startswith("/api/"):
+            return "path must start with /api/."
+        if urlsplit(path).path.rstrip("/") == "/api/batch":
+            return "Batches cannot be nested."
+        return None
+
+    @staticmethod
+    def groups(items):
+        """Splits indexes into runs of consecutive GETs and single writes."""
+        groups = []
+        for i, item in enumerate(items):
+            is_get = str(item.get("method", "GET")).upper() == "GET"
+            if is_get and groups and groups[-1][1]:
+                groups[-1][0].append(i)
+            else:
+                groups.append(([i], is_get))
+        return [indexes for indexes, _ in groups]
+
+    @staticmethod
+    def can_run_concurrently():
+        # Other threads cannot see rows written in an open transaction (for
+        # example ATOMIC_REQUESTS or a test case), so stay on this thread.
+        return getattr(settings, "BATCH_MAX_WORKERS", 4) > 1 and not connection.in_atomic_block
+
+    def run_in_thread(self, parent, user, item):
+        try:
+            return self.run(parent, user, item)
+        finally:
+            connections.close_all()
+
+    def run(self, parent, user, item):
+        method = str(item.get("method", "GET")).upper()
+        url = urlsplit(item["path"])
+        try:
+            match = resolve(url.path)
+        except Resolver404:
+            return {"status": 404, "headers": {}, "body": {"detail": "Not found."},
+                    "duration_ms": 0, "queries": 0}
+
+        body = b""
+        if "body" in item and method != "GET":
+            body = orjson.dumps(item["body"])
+        sub = self.build_request(parent, method, url, body, user)
+        sub.resolver_match = match
+
+        if not in_flight.enter(getattr(settings, "LOAD_SHED_MAX_IN_FLIGHT", 0)):
+            return self.result(overloaded_response(), 0, 0)
+
+        max_bytes = getattr(settings, "BATCH_MAX_RESPONSE_BYTES", 5 * 1024 * 1024)
+        queries = []
+        started = time.perf_counter()
+        try:
+            with identity_map(), connection.execute_wrapper(
+                lambda execute, *args: queries.append(1) or execute(*args)
+            ):
+                response = match.func(sub, *match.args, **match.kwargs)
+                if hasattr(response, "render"):
+                    response.render()
+                content = self.read(response, max_bytes)
+        finally:
+            in_flight.exit()
+        duration = round((time.perf_counter() - started) * 1000, 3)
+
+        if content is None:
+            return {"status": 413, "headers": {},
+                    "body": {"detail": f"Response exceeds {max_bytes} bytes; request it directly."},
+                    "duration_ms": duration, "queries": len(queries)}
+        return self.result(response, duration, len(queries), content)
+
+    @staticmethod
+    def read(response, max_bytes):
+        """The response body, or None once it passes `max_bytes`."""
+        if not response.streaming:
+            return response.content if len(response.content) <= max_bytes else None
+        chunks, size = [], 0
+        try:
+            for chunk in response.streaming_content:
+                size += len(chunk)
+                if size > max_bytes:
+                    return None
+                chunks.append(chunk)
+        finally:
+            # Stops a streamed list from reading any further batches.
+            response.close()
+        return b"".join(chunks)
+
+    @staticmethod
+    def result(response, duration, queries, content=None):
+        if content is None:
+            content = response.content
+        headers = dict(response.items())
+        if headers.get("Content-Type", "").startswith("application/json") and content:
+            payload = orjson.loads(content)
+        else:
+            payload = content.decode("utf-8", "replace")
+        return {"status": response.status_code, "headers": headers, "body": payload,
+                "duration_ms": duration, "queries": queries}
+
+    @staticmethod
+    def build_request(parent, method, url, body, user):
+        sub = HttpRequest()
+        sub.method = method
+        sub.path = sub.path_info = url.path
+        sub.META = {
+            **parent._request.META,
+            "REQUEST_METHOD": method,
+            "PATH_INFO": url.path,
+            "QUERY_STRING": url.query,
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(body)),
+            "HTTP_ACCEPT": "application/json",
+        }
+        # Sub-responses are embedded in this one, never compressed on their own.
+        sub.META.pop("HTTP_ACCEPT_ENCODING", None)
+        sub.GET = QueryDict(url.query)
+        sub._stream = io.BytesIO(body)
+        sub._read_started = False
+        if user is not None:
+            # DRF authenticates a request carrying this as that user without
+            # decoding the token again.
+            sub._force_auth_user = user
+        return sub
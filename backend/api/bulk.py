@@ -0,0 +1,170 @@
+"""
+Set-based bulk changes for hosts:
+
+    POST /api/spaces/bulk/
+        {"items": [{"id": 7, "is_published": false}, {"id": 8, "price_per_day": "12.50"}]}
+    POST /api/bookings/bulk-status/
+        {"items": [{"id": 41, "status": "ACCEPTED"}, {"id": 42, "status": "REJECTED"}]}
+
+All items are validated before anything is written: each must be
+well-formed, name a row on one of the user's active venues and, for
+bookings, move a PENDING booking whose hold has not expired (a lapsed
+hold is marked EXPIRED on the spot). If any item fails, nothing is applied
+(400). Otherwise the batch is applied atomically with a single UPDATE (a
+CASE over the ids per changed column), however many items it holds. Either
+way `results` has one entry per item, in request order:
+
+    {"id": 7, "result": "updated"}
+    {"id": 8, "result": "error", "errors": {...}}
+    {"id": 9, "result": "skipped"}          valid, but the batch was rejected
+
+`queryset.update()` bypasses signals and auto_now, so the side effects
+api/signals.py would apply are applied here: updated_at, the venue feed
+bump, the occupancy ledger, the analytics rollup and availability events.
+"""
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import holds, sharding
+from .events import publish_reservation_change
+from .models import Booking, Space, SpaceOccupancy, Venue
+from .serializers import BookingStatusItemSerializer, SpaceBulkItemSerializer
+from .tasks import apply_booking_rollup
+
+MAX_ITEMS = 500
+
+
+class Item:
+    def __init__(self, raw, serializer_class):
+        serializer = serializer_class(data=raw)
+        self.valid = serializer.is_valid()
+        self.data = serializer.validated_data if self.valid else {}
+        self.errors = None if self.valid else serializer.errors
+        self.id = self.data.get("id", raw.get("id") if isinstance(raw, dict) else None)
+
+    def reject(self, errors):
+        self.valid, self.errors = False, errors
+
+    def result(self, applied):
+        if self.errors is not None:
+            return {"id": self.id, "result": "error", "errors": self.errors}
+        return {"id": self.id, "result": "updated" if applied else "skipped"}
+
+
+def parse_items(data, serializer_class):
+    items = data.get("items") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValidationError({"items": "Send a non-empty list of items."})
+    max_items = getattr(settings, "BULK_MAX_ITEMS", MAX_ITEMS)
+    if len(items) > max_items:
+        raise ValidationError({"items": f"At most {max_items} items per request."})
+
+    parsed = [Item(raw, serializer_class) for raw in items]
+    seen = set()
+    for item in parsed:
+        # Only valid ids are ints; a malformed one may not even be hashable.
+        if not item.valid:
+            continue
+        if item.id in seen:
+            item.reject({"id": "Listed more than once."})
+        seen.add(item.id)
+    return parsed
+
+
+def case(items, field, output_field):
+    """CASE id WHEN ... THEN <new value> ... ELSE <column> END, for items that set `field`."""
+    whens = [When(id=item.id, then=Value(item.data[field])) for item in items if field in item.data]
+    if not whens:
+        return None
+    return Case(*whens, default=F(field), output_field=output_field)
+
+
+def finish(items, applied):
+    return applied, [item.result(applied) for item in items]
+
+
+def update_spaces(user, data):
+    """Publishes/unpublishes and reprices spaces; returns (applied, results)."""
+    items = parse_items(data, SpaceBulkItemSerializer)
+    ids = [item.id for item in items if item.valid]
+
+    with transaction.atomic(using=sharding.current()):
+        venue_ids = dict(
+            Space.objects.select_for_update(of=("self",))
+            .filter(id__in=ids, venue__owner=user, venue__is_active=True)
+            .values_list("id", "venue_id")
+        )
+        for item in items:
+            if item.valid and item.id not in venue_ids:
+                item.reject({"id": "No such space on your venues."})
+        if any(not item.valid for item in items):
+            return finish(items, False)
+
+        now = timezone.now()
+        changes = {"updated_at": Value(now)}
+        for field in ("is_published", "price_per_day"):
+            expression = case(items, field, Space._meta.get_field(field))
+            if expression is not None:
+                changes[field] = expression
+        Space.objects.filter(id__in=ids).update(**changes)
+        # Venue rows carry space data, so the venue feed must see the change.
+        Venue.objects.filter(id__in=set(venue_ids.values())).update(changed_at=now)
+
+    return finish(items, True)
+
+
+def transition_bookings(user, data):
+    """Accepts or rejects pending bookings; returns (applied, results)."""
+    items = parse_items(data, BookingStatusItemSerializer)
+    ids = [item.id for item in items if item.valid]
+
+    with transaction.atomic(using=sharding.current()):
+        bookings = {
+            booking.id: booking
+            for booking in Booking.objects.select_for_update(of=("self",))
+            .filter(id__in=ids, space__venue__owner=user)
+            .annotate(venue_ref=F("space__venue_id"))
+        }
+        now = timezone.now()
+        # A lapsed hold no longer holds its dates; it is expired, not accepted.
+        holds.expire([
+            booking for booking in bookings.values()
+            if booking.status == "PENDING"
+            and booking.hold_expires_at is not None and booking.hold_expires_at <= now
+        ], now)
+        for item in items:
+            if not item.valid:
+                continue
+            booking = bookings.get(item.id)
+            if booking is None:
+                item.reject({"id": "No such booking on your venues."})
+            elif booking.status != "PENDING":
+                item.reject({"status": f"Booking is {booking.status}; only PENDING "
+                                       "bookings can be accepted or rejected."})
+        if any(not item.valid for item in items):
+            return finish(items, False)
+
+        Booking.objects.filter(id__in=ids).update(
+            status=case(items, "status", models.CharField()), updated_at=Value(now),
+        )
+
+        rejected = [item.id for item in items if item.data["status"] == "REJECTED"]
+        if rejected:
+            # Rejected bookings stop occupying their dates.
+            SpaceOccupancy.objects.filter(booking_id__in=rejected).delete()
+
+        rollups = []
+        for item in items:
+            booking = bookings[item.id]
+            before = booking.snapshot()
+            booking.status, booking.updated_at = item.data["status"], now
+            after = booking.snapshot()
+            booking._loaded = after
+            rollups.append({"before": before, "after": after})
+            publish_reservation_change(booking, before, after, venue_id=booking.venue_ref)
+        apply_booking_rollup.enqueue_many(rollups)
+
+    return finish(items, True)
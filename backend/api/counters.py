@@ -0,0 +1,238 @@
+"""
+Write-behind view counters for venues and spaces.
+
+Serving a venue or space page counts a view, and listing one counts an
+impression. Neither writes on the request: record() adds to a buffer in
+process memory, keyed by row and Bangkok date, and a background thread
+flushes it every VIEW_COUNTER_FLUSH_SECONDS (sooner once it holds
+VIEW_COUNTER_MAX_KEYS rows). A flush is one batched upsert per table and
+database that adds the buffered counts to VenueDailyViews / SpaceDailyViews.
+
+The buffer is also flushed when the process exits normally, so a graceful
+restart keeps its counts; a killed process loses at most one interval.
+With VIEW_COUNTER_FLUSH_SECONDS = 0 nothing flushes unless flush() is called.
+
+Ranking (ranking()) and host analytics read the daily tables, never the
+buffer, so counts show up there after the next flush.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import sharding
+from .models import Space, SpaceDailyViews, Venue, VenueDailyViews
+from .utils.booking_days import today
+
+logger = logging.getLogger(__name__)
+
+# Counted model -> (daily table, the table's foreign key to it).
+TABLES = {
+    Venue: (VenueDailyViews, "venue"),
+    Space: (SpaceDailyViews, "space"),
+}
+COUNTERS = ("views", "impressions")
+# Rows per INSERT statement; keeps the parameter count under SQLite's limit.
+CHUNK_SIZE = 100
+
+_lock = threading.Lock()
+_wake = threading.Event()
+_buffer = {}
+_flusher = None
+
+
+def _reset():
+    global _lock, _buffer, _flusher
+    # The parent's thread does not survive a fork, and its counts are its own.
+    _lock, _buffer, _flusher = threading.Lock(), {}, None
+
+
+os.register_at_fork(after_in_child=_reset)
+
+
+def flush_interval():
+    return getattr(settings, "VIEW_COUNTER_FLUSH_SECONDS", 10)
+
+
+def record(model, ids, views=0, impressions=0):
+    """Adds to the buffered counts of the `model` rows `ids`; runs no query."""
+    day = today()
+    with _lock:
+        for pk in ids:
+            counts = _buffer.setdefault((model, pk, day), [0, 0])
+            counts[0] += views
+            counts[1] += impressions
+        full = len(_buffer) >= getattr(settings, "VIEW_COUNTER_MAX_KEYS", 10000)
+    _start_flusher()
+    if full:
+        _wake.set()
+
+
+def record_view(model, pk):
+    record(model, [pk], views=1)
+
+
+def record_impressions(model, ids):
+    record(model, ids, impressions=1)
+
+
+def discard():
+    """Drops the buffered counts without writing them."""
+    with _lock:
+        _buffer.clear()
+
+
+def flush():
+    """Writes the buffered counts to the daily tables; returns how many rows it upserted."""
+    global _buffer
+    with _lock:
+        pending, _buffer = _buffer, {}
+    if not pending:
+        return 0
+
+    try:
+        groups = defaultdict(list)
+        for (model, pk, day), (views, impressions) in pending.items():
+            groups[model, sharding.locate(model, pk)].append((pk, day, views, impressions))
+    except Exception:
+        logger.exception("Could not flush view counters")
+        restore(pending.items())
+        return 0
+
+    written = 0
+    for (model, alias), rows in groups.items():
+        try:
+            written += upsert(model, alias, rows)
+        except Exception:
+            logger.exception("Could not flush %s view counters to %s", model.__name__, alias)
+            restore(((model, pk, day), (views, impressions))
+                    for pk, day, views, impressions in rows)
+    return written
+
+
+def restore(entries):
+    """Puts ((model, pk, day), (views, impressions)) counts back for the next flush."""
+    with _lock:
+        for key, (views, impressions) in entries:
+            counts = _buffer.setdefault(key, [0, 0])
+            counts[0] += views
+            counts[1] += impressions
+
+
+def upsert(model, alias, rows):
+    """
+    Adds (pk, date, views, impressions) rows to the model's daily table on
+    `alias`, inserting the (pk, date) rows that do not exist yet.
+    """
+    table, key = TABLES[model]
+    # Rows deleted since they were viewed would fail the foreign key.
+    existing = set(
+        model._base_manager.using(alias)
+        .filter(pk__in={row[0] for row in rows})
+        .values_list("pk", flat=True)
+    )
+    rows = [row for row in rows if row[0] in existing]
+    if not rows:
+        return 0
+
+    connection = connections[alias]
+    fields = [
+        table._meta.get_field(name)
+        for name in (key, "date", *COUNTERS, "created_at", "updated_at")
+    ]
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    placeholders = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    on_conflict = conflict_clause(connection, table, fields[0].column)
+    now = timezone.now()
+
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        for start in range(0, len(rows), CHUNK_SIZE):
+            chunk = rows[start:start + CHUNK_SIZE]
+            params = [
+                field.get_db_prep_value(value, connection)
+                for pk, day, views, impressions in chunk
+                for field, value in zip(fields, (pk, day, views, impressions, now, now))
+            ]
+            cursor.execute(
+                f"INSERT INTO {connection.ops.quote_name(table._meta.db_table)} ({columns}) "
+                f"VALUES {', '.join([placeholders] * len(chunk))} {on_conflict}",
+                params,
+            )
+    return len(rows)
+
+
+def conflict_clause(connection, table, key_column):
+    """The vendor's upsert suffix adding the new counts to an existing row."""
+    qn = connection.ops.quote_name
+    if connection.vendor == "mysql":
+        updates = [f"{qn(name)} = {qn(name)} + VALUES({qn(name)})" for name in COUNTERS]
+        updates.append(f"{qn('updated_at')} = VALUES({qn('updated_at')})")
+        return "ON DUPLICATE KEY UPDATE " + ", ".join(updates)
+    # SQLite (3.24+) and PostgreSQL.
+    updates = [
+        f"{qn(name)} = {qn(table._meta.db_table)}.{qn(name)} + excluded.{qn(name)}"
+        for name in COUNTERS
+    ]
+    updates.append(f"{qn('updated_at')} = excluded.{qn('updated_at')}")
+    return f"ON CONFLICT ({qn(key_column)}, {qn('date')}) DO UPDATE SET " + ", ".join(updates)
+
+
+def ranking(model, start_date, end_date, limit, **filters):
+    """
+    The `limit` most viewed `model` rows over [start_date, end_date] on the
+    current database, best first (ties go to impressions): a list of
+    {"id", "views", "impressions"}.
+    """
+    table, key = TABLES[model]
+    rows = (
+        table.objects.filter(date__gte=start_date, date__lte=end_date, **filters)
+        .values(key)
+        .annotate(views=Sum("views"), impressions=Sum("impressions"))
+        .order_by("-views", "-impressions", key)[:limit]
+    )
+    return [
+        {"id": row[key], "views": row["views"], "impressions": row["impressions"]}
+        for row in rows
+    ]
+
+
+def _run(interval):
+    while True:
+        _wake.wait(interval)
+        _wake.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception("Could not flush view counters")
+        finally:
+            # This thread's connections would otherwise stay open for good.
+            connections.close_all()
+
+
+def _start_flusher():
+    global _flusher
+    interval = flush_interval()
+    if not interval or _flusher is not None:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=_run, args=(interval,), name="view-counters", daemon=True
+            )
+            _flusher.start()
+
+
+@atexit.register
+def _flush_at_exit():
+    if not flush_interval():
+        return
+    try:
+        flush()
+    except Exception:
+        logger.exception("Could not flush view counters at exit")
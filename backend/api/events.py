@@ -0,0 +1,203 @@
+"""
+In-process pub/sub for reservation changes, consumed by the SSE streams
+(api/sse.py).
+
+Booking writes publish a delta once their transaction commits:
+
+    {"space": 7, "venue": 3, "booking": 42,
+     "reserved": [{"start": "2025-03-01", "end": "2025-03-03"}],
+     "released": []}
+
+to the channels "space:<id>" and "venue:<id>". Each open stream holds a
+Subscription: a bounded asyncio queue fed from any thread. A subscriber that
+falls QUEUE_SIZE events behind gets a single RESYNC marker instead of the
+backlog and is sent a fresh snapshot.
+
+EVENTS_BROKER names the broker class (default LocalBroker, which only
+reaches streams served by the publishing process); None disables publishing.
+A broker that relays between processes subclasses Broker, sends published
+events to its transport in publish(), and calls deliver() for every event
+it receives back.
+"""
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from . import occupancy, sharding
+from .models import Booking, Space
+from .utils.booking_days import booking_days
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 100
+RESYNC = object()
+
+
+class Subscription:
+    def __init__(self, broker, channels, loop, maxsize):
+        self.broker = broker
+        self.channels = tuple(channels)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def push(self, event):
+        """Thread-safe; the event is queued on the subscriber's event loop."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The subscriber's loop has closed; it unsubscribes on its way out.
+            pass
+
+    def _put(self, event):
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = RESYNC
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """Returns the next event (or RESYNC), or None after `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """Fans events out to the subscriptions of this process."""
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def subscribe(self, channels, loop=None, maxsize=None):
+        """Must be called from the event loop that will read the subscription."""
+        subscription = Subscription(
+            self, channels, loop or asyncio.get_running_loop(),
+            maxsize or getattr(settings, "SSE_QUEUE_SIZE", QUEUE_SIZE),
+        )
+        with self.lock:
+            for channel in subscription.channels:
+                self.subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                subscribers = self.subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscribers[channel]
+
+    def subscriber_count(self):
+        with self.lock:
+            return len({sub for subs in self.subscribers.values() for sub in subs})
+
+    def deliver(self, channel, event):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.push(event)
+
+    def publish(self, channel, event):
+        raise NotImplementedError
+
+
+class LocalBroker(Broker):
+    def publish(self, channel, event):
+        self.deliver(channel, event)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The process-wide broker, or None when EVENTS_BROKER is None."""
+    global _broker
+    path = getattr(settings, "EVENTS_BROKER", "api.events.LocalBroker")
+    if path is None:
+        return None
+    with _broker_lock:
+        if _broker is None or f"{type(_broker).__module__}.{type(_broker).__name__}" != path:
+            _broker = import_string(path)()
+        return _broker
+
+
+def occupied_days(snapshot):
+    if not occupancy.is_occupying(snapshot):
+        return set()
+    return set(booking_days(snapshot["start_datetime"], snapshot["end_datetime"]))
+
+
+def reservation_delta(before, after):
+    """
+    Per space, the days a booking write reserved and released; a move to
+    another space shows up under both spaces. Empty when nothing changed.
+    """
+    deltas = {}
+    for snapshot in (before, after):
+        if snapshot is not None:
+            deltas.setdefault(snapshot["space_id"], (set(), set()))
+    for space_id, (reserved, released) in deltas.items():
+        was = occupied_days(before) if before and before["space_id"] == space_id else set()
+        now = occupied_days(after) if after and after["space_id"] == space_id else set()
+        reserved.update(now - was)
+        released.update(was - now)
+    return {
+        space_id: (sorted(reserved), sorted(released))
+        for space_id, (reserved, released) in deltas.items()
+        if reserved or released
+    }
+
+
+def publish_reservation_change(booking, before, after, venue_id=None):
+    """
+    Publishes the booking's reservation delta once the transaction commits.
+    Pass `venue_id` when the caller knows it, to save a lookup.
+    """
+    if get_broker() is None:
+        return
+    deltas = reservation_delta(before, after)
+    if not deltas:
+        return
+    booking_id = booking.pk
+    venue_ids = {}
+    if venue_id is not None:
+        venue_ids[booking.space_id] = venue_id
+    elif Booking.space.is_cached(booking):
+        venue_ids[booking.space_id] = booking.space.venue_id
+
+    def send():
+        try:
+            missing = set(deltas) - set(venue_ids)
+            if missing:
+                venue_ids.update(
+                    Space.objects.filter(pk__in=missing).values_list("id", "venue_id")
+                )
+            broker = get_broker()
+            for space_id, (reserved, released) in deltas.items():
+                event = {
+                    "space": space_id,
+                    "venue": venue_ids.get(space_id),
+                    "booking": booking_id,
+                    "reserved": occupancy.merge_spans(reserved),
+                    "released": occupancy.merge_spans(released),
+                }
+                broker.publish(f"space:{space_id}", event)
+                if event["venue"] is not None:
+                    broker.publish(f"venue:{event['venue']}", event)
+        except Exception:
+            # Streams resynchronise on reconnect; never fail the write's caller.
+            logger.warning("Could not publish reservation change", exc_info=True)
+
+    transaction.on_commit(send, using=sharding.current())
@@ -0,0 +1,66 @@
+"""
+Compound venue documents: `GET /api/venues/<id>/?expand=...`.
+
+    spaces            the venue's spaces (without amenities)
+    spaces.amenities  the spaces with their amenity names (implies spaces)
+    reservations      reserved date spans from today on, keyed by space id
+    reviews           the RECENT_REVIEWS most recent reviews of the venue
+
+Each expansion adds exactly one query, whatever the number of spaces,
+reservations or reviews; expansions that are not requested run nothing.
+"""
+from rest_framework.exceptions import ValidationError
+
+from . import occupancy
+from .models import Review
+from .serializers import ReviewSerializer, SpaceSerializer
+from .utils.booking_days import today
+
+VENUE_EXPANSIONS = ("spaces", "spaces.amenities", "reservations", "reviews")
+RECENT_REVIEWS = 10
+
+
+def parse_expand(value, allowed=VENUE_EXPANSIONS):
+    requested = {part.strip() for part in (value or "").split(",") if part.strip()}
+    unknown = sorted(requested - set(allowed))
+    if unknown:
+        raise ValidationError({
+            "expand": f"Unknown expansion(s): {', '.join(unknown)}. "
+                      f"Allowed: {', '.join(allowed)}."
+        })
+    if "spaces.amenities" in requested:
+        requested.add("spaces")
+    return requested
+
+
+def expand_venue(venue, expand):
+    data = {}
+
+    if "spaces" in expand:
+        spaces = venue.spaces.all().order_by("-created_at")
+        if "spaces.amenities" in expand:
+            data["spaces"] = SpaceSerializer(
+                SpaceSerializer.setup_eager_loading(spaces), many=True
+            ).data
+        else:
+            data["spaces"] = SpaceSerializer(spaces, many=True, omit=("amenities",)).data
+
+    if "reservations" in expand:
+        dates = {}
+        for space_id, day in (
+            occupancy.in_force().filter(space__venue=venue, date__gte=today())
+            .order_by("space_id", "date")
+            .values_list("space_id", "date")
+        ):
+            dates.setdefault(space_id, []).append(day)
+        data["reservations"] = {
+            str(space_id): occupancy.merge_spans(days) for space_id, days in dates.items()
+        }
+
+    if "reviews" in expand:
+        reviews = ReviewSerializer.setup_eager_loading(
+            Review.objects.filter(booking__space__venue=venue).order_by("-created_at")
+        )[:RECENT_REVIEWS]
+        data["reviews"] = ReviewSerializer(reviews, many=True).data
+
+    return data
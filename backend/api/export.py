@@ -0,0 +1,227 @@
+"""
+Incremental change export for analytics (`manage.py export_changes`).
+
+Every exported model carries `updated_at`, so a table's changes since the
+last run are the rows after its watermark on the (updated_at, id) key. With
+region sharding (api/sharding.py) a table's rows are read from every
+database that holds it and merged on the same key. Rows are read in keyset
+chunks and written as they are read, to one file per table and run:
+
+    <output>/<db_table>/dt=<run date>/<run id>.jsonl      (or .parquet)
+
+Deletes of every exported table, cascades included, arrive through
+api_tombstone as (resource = model name, object_id) rows. Two moves delete
+without one and keep the id: archived bookings (api/archive.py) leave
+api_booking and show up in api_archivedbooking stamped with the archival
+time, so the union of the two tables by id is the full booking history; and
+resharding (`manage.py reshard`) moves rows between databases, which the
+export merges anyway. Tombstones are pruned after SYNC_TOMBSTONE_DAYS, so
+--since-watermark runs must come more often than that.
+
+Tables whose deletes cannot be represented this way are not exported (see
+EXCLUDED): they are internal or derived, and are deleted in bulk without
+signals or rewritten under new ids (backfill_analytics, resharding).
+
+Watermarks are kept in <output>/_watermarks.json and only advance for tables
+whose file was written completely. Each table is exported by its own worker
+process; the functions here are importable before Django is set up so they
+work under any multiprocessing start method.
+"""
+import heapq
+import json
+import os
+from datetime import timedelta
+from itertools import chain, islice
+from importlib.util import find_spec
+
+FORMATS = ("jsonl", "parquet")
+WATERMARKS_FILE = "_watermarks.json"
+SETTLE_SECONDS = 2
+
+EXCLUDED = (
+    "api.idblock",          # id allocation bookkeeping
+    "api.spaceoccupancy",   # the booking ledger, derived from bookings
+    "api.spacedailystat",   # the analytics rollup, derived from bookings
+    # Renumbered when resharding moves them; counts stay readable through
+    # the analytics endpoint.
+    "api.venuedailyviews",
+    "api.spacedailyviews",
+)
+
+
+def export_models():
+    from django.apps import apps
+    return [
+        model for model in apps.get_app_config("api").get_models()
+        if model._meta.label_lower not in EXCLUDED
+    ]
+
+
+def load_watermarks(output):
+    path = os.path.join(output, WATERMARKS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_watermarks(output, watermarks):
+    path = os.path.join(output, WATERMARKS_FILE)
+    with open(path + ".tmp", "w") as fh:
+        json.dump(watermarks, fh, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def init_worker():
+    import django
+    django.setup()
+
+
+def changed_rows(model, since, until, chunk_size, using=None):
+    """Yields lists of row dicts after `since` up to `until`, in key order."""
+    from django.db.models import Q
+    from django.utils.dateparse import parse_datetime
+
+    queryset = (
+        model.objects.using(using).filter(updated_at__lte=until)
+        .order_by("updated_at", "id")
+        .values(*[field.attname for field in model._meta.concrete_fields])
+    )
+    last = None
+    if since:
+        last = (parse_datetime(since[0]), since[1])
+    while True:
+        page = queryset
+        if last is not None:
+            page = page.filter(
+                Q(updated_at__gt=last[0]) | Q(updated_at=last[0], id__gt=last[1])
+            )
+        chunk = list(page[:chunk_size])
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last = (chunk[-1]["updated_at"], chunk[-1]["id"])
+
+
+def merged_changed_rows(model, since, until, chunk_size):
+    """changed_rows() across every database holding the model's table."""
+    from api import sharding
+
+    if not sharding.enabled() or not (sharding.is_sharded(model) or sharding.is_local(model)):
+        yield from changed_rows(model, since, until, chunk_size)
+        return
+    rows = heapq.merge(
+        *[chain.from_iterable(changed_rows(model, since, until, chunk_size, alias))
+          for alias in sharding.databases()],
+        key=lambda row: (row["updated_at"], row["id"]),
+    )
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class JSONLWriter:
+    extension = "jsonl"
+
+    def __init__(self, path, model):
+        import orjson
+        self.orjson = orjson
+        self.fh = open(path, "wb")
+
+    def write(self, rows):
+        self.fh.write(b"".join(
+            self.orjson.dumps(row, default=str, option=self.orjson.OPT_APPEND_NEWLINE)
+            for row in rows
+        ))
+
+    def close(self):
+        self.fh.close()
+
+
+class ParquetWriter:
+    """One row group per chunk; needs the optional `pyarrow` package."""
+    extension = "parquet"
+
+    def __init__(self, path, model):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.fields = model._meta.concrete_fields
+        self.schema = pa.schema([(field.attname, self.arrow_type(field)) for field in self.fields])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def arrow_type(self, field):
+        pa = self.pa
+        internal_type = field.get_internal_type()
+        if internal_type == "DecimalField":
+            return pa.decimal128(field.max_digits, field.decimal_places)
+        if internal_type == "DateTimeField":
+            return pa.timestamp("us", tz="UTC")
+        if internal_type == "DateField":
+            return pa.date32()
+        if internal_type == "BooleanField":
+            return pa.bool_()
+        if internal_type.endswith(("AutoField", "IntegerField")) or field.is_relation:
+            return pa.int64()
+        return pa.string()
+
+    def write(self, rows):
+        columns = {}
+        for field, column in zip(self.fields, self.schema):
+            values = [row[field.attname] for row in rows]
+            if column.type == self.pa.string():
+                values = [None if v is None or isinstance(v, str) else json.dumps(v, default=str)
+                          for v in values]
+            columns[field.attname] = values
+        self.writer.write_table(self.pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {"jsonl": JSONLWriter, "parquet": ParquetWriter}
+
+
+def format_available(fmt):
+    return fmt != "parquet" or find_spec("pyarrow") is not None
+
+
+def export_table(label, output, run_id, since, fmt, chunk_size):
+    """
+    Exports one model's changes; returns (label, rows written, new watermark).
+    The watermark is unchanged when nothing changed.
+    """
+    from django.apps import apps
+    from django.db import connections
+    from django.utils import timezone
+
+    model = apps.get_model(label)
+    until = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    writer_class = WRITERS[fmt]
+
+    directory = os.path.join(output, model._meta.db_table, f"dt={until:%Y-%m-%d}")
+    path = os.path.join(directory, f"{run_id}.{writer_class.extension}")
+    written, watermark, writer = 0, since, None
+    try:
+        for chunk in merged_changed_rows(model, since, until, chunk_size):
+            if writer is None:
+                os.makedirs(directory, exist_ok=True)
+                writer = writer_class(path + ".tmp", model)
+            writer.write(chunk)
+            written += len(chunk)
+            watermark = [chunk[-1]["updated_at"].isoformat(), chunk[-1]["id"]]
+    except BaseException:
+        if writer is not None:
+            writer.close()
+            os.remove(path + ".tmp")
+        raise
+    finally:
+        connections.close_all()
+
+    if writer is not None:
+        writer.close()
+        os.replace(path + ".tmp", path)
+    return label, written, watermark
@@ -0,0 +1,79 @@
+"""
+Expiry of PENDING booking holds.
+
+A PENDING booking holds its dates until `hold_expires_at` (set on save,
+BOOKING_HOLD_MINUTES after creation). Reads ignore a hold as soon as it
+expires (occupancy.in_force), and a booking that collides with one frees it
+on the spot (occupancy.claim); `manage.py expire_holds` sweeps the rest,
+marking them EXPIRED and deleting their ledger rows.
+
+The sweep walks the (status, hold_expires_at) index in batches of
+`batch_size`, each in its own short transaction that locks only that
+batch's rows and skips rows another transaction holds, so it never blocks
+bookings for long however many holds have piled up. Neither status counts
+towards the analytics rollup, so expiry does not touch it.
+"""
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import sharding
+from .events import publish_reservation_change
+from .models import Booking, SpaceOccupancy
+
+BATCH_SIZE = 1000
+
+
+def expired_holds(now=None):
+    return Booking.objects.filter(status="PENDING", hold_expires_at__lte=now or timezone.now())
+
+
+def expire(bookings, now):
+    """Marks locked, expired PENDING bookings EXPIRED and frees their dates."""
+    ids = [booking.id for booking in bookings]
+    if not ids:
+        return 0
+    Booking.objects.filter(id__in=ids).update(status="EXPIRED", updated_at=now)
+    SpaceOccupancy.objects.filter(booking_id__in=ids).delete()
+    for booking in bookings:
+        before = booking.snapshot()
+        booking.status, booking.updated_at = "EXPIRED", now
+        booking._loaded = booking.snapshot()
+        publish_reservation_change(booking, before, booking._loaded, venue_id=booking.venue_ref)
+    return len(ids)
+
+
+def locked(queryset):
+    features = connections[queryset.db].features
+    # Lock the bookings only, not the spaces the venue_ref annotation joins.
+    of = ("self",) if features.has_select_for_update_of else ()
+    if features.has_select_for_update_skip_locked:
+        return queryset.select_for_update(skip_locked=True, of=of)
+    return queryset.select_for_update(of=of)
+
+
+def expire_conflicting_holds(space_id, days, exclude=None):
+    """
+    Expires the expired holds occupying any of `days` on the space; returns
+    how many were freed. Runs in the caller's transaction.
+    """
+    now = timezone.now()
+    bookings = list(
+        locked(expired_holds(now).filter(occupancy__space_id=space_id, occupancy__date__in=days))
+        .exclude(id=exclude)
+        .annotate(venue_ref=F("space__venue_id"))
+        .distinct()
+    )
+    return expire(bookings, now)
+
+
+def sweep(batch_size=BATCH_SIZE):
+    """Expires up to `batch_size` holds; returns how many."""
+    now = timezone.now()
+    with transaction.atomic(using=sharding.current()):
+        bookings = list(
+            locked(expired_holds(now))
+            .annotate(venue_ref=F("space__venue_id"))
+            .order_by("hold_expires_at")[:batch_size]
+        )
+        return expire(bookings, now)
@@ -0,0 +1,120 @@
+"""
+Idempotency-Key support for POST endpoints that create things.
+
+A client that may retry sends the same `Idempotency-Key` header (any string
+up to MAX_KEY_LENGTH characters) with every attempt. The first attempt runs
+the view; its response is kept in the IDEMPOTENCY_CACHE cache for
+IDEMPOTENCY_TTL seconds, keyed by user, endpoint and key, and later attempts
+get it back with `Idempotent-Replayed: true` without the view running. An
+attempt that arrives while the first is still running waits up to
+IDEMPOTENCY_WAIT_SECONDS for its response, then gets 409. Reusing a key
+with a different body is a 422.
+
+Server errors (5xx) are not kept, so the next attempt runs the view again.
+Requests without the header behave as before. Waiting only works across
+processes when the cache is shared between them (REDIS_URL).
+"""
+import functools
+import hashlib
+import time
+
+import orjson
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from .utils import cache_lock
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+TTL = 24 * 60 * 60
+WAIT_SECONDS = 10
+LOCK_SECONDS = 60
+POLL_SECONDS = 0.05
+
+# Response headers worth replaying; the rest are set afresh on the way out.
+KEPT_HEADERS = ("Location",)
+
+
+def get_cache():
+    return caches[getattr(settings, "IDEMPOTENCY_CACHE", "default")]
+
+
+def fingerprint(request):
+    """Hash of the parsed body, so formatting differences between retries do not matter."""
+    data = request.data
+    if hasattr(data, "lists"):
+        data = dict(data.lists())
+    return hashlib.sha256(orjson.dumps(data, option=orjson.OPT_SORT_KEYS, default=str)).hexdigest()
+
+
+def replay(stored):
+    response = Response(stored["data"], status=stored["status"], headers=stored["headers"])
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(view):
+    """Decorates a viewset action so it honours the Idempotency-Key header."""
+
+    @functools.wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(self, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"detail": f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        cache = get_cache()
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        response_key = f"idempotency:{request.user.pk}:{request.path}:{digest}"
+        lock_key = response_key + ":lock"
+        body = fingerprint(request)
+        wait = getattr(settings, "IDEMPOTENCY_WAIT_SECONDS", WAIT_SECONDS)
+        deadline = time.monotonic() + wait
+
+        while True:
+            stored = cache.get(response_key)
+            if stored is not None:
+                if stored["fingerprint"] != body:
+                    return Response(
+                        {"detail": f"This {HEADER} was already used with a different request body."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    )
+                return replay(stored)
+
+            token = cache_lock.acquire(cache, lock_key, LOCK_SECONDS)
+            if token is not None:
+                break
+            if time.monotonic() >= deadline:
+                return Response(
+                    {"detail": f"A request with this {HEADER} is still in progress."},
+                    status=status.HTTP_409_CONFLICT,
+                    headers={"Retry-After": "1"},
+                )
+            time.sleep(POLL_SECONDS)
+
+        try:
+            try:
+                response = view(self, request, *args, **kwargs)
+            except Exception as exc:
+                # Turn validation and permission errors into the response the
+                # client would get, so a retry replays it too.
+                response = self.handle_exception(exc)
+            if response.status_code < 500:
+                cache.set(response_key, {
+                    "fingerprint": body,
+                    "status": response.status_code,
+                    "data": response.data,
+                    "headers": {name: response[name] for name in KEPT_HEADERS if name in response},
+                }, timeout=getattr(settings, "IDEMPOTENCY_TTL", TTL))
+            return response
+        finally:
+            # Leaves the lock alone if it expired and someone else took it.
+            cache_lock.release(cache, lock_key, token)
+
+    return wrapper
@@ -0,0 +1,103 @@
+"""
+Request-scoped identity map for User, Venue and Space rows.
+
+Within a request each of these rows is loaded by primary key at most once:
+
+    identity.get(Venue, pk)            the row, from the map or the database
+    identity.related(space, "venue")   follows a foreign key through the map
+    identity.remember(instance)        shares a row loaded some other way
+
+Authentication remembers the request's user, so `related(venue, "owner")`
+on a venue the user owns costs nothing. IdentityMapMiddleware
+(api/middleware.py) opens an empty map per request and drops it when the
+response is returned; outside a request (shell, tasks, streamed bodies)
+every lookup goes to the database. Saving a tracked row replaces the map's
+copy with the saved instance and deleting one forgets it (api/signals.py),
+so a request never reads back a stale row of its own making.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.exceptions import ValidationError
+from django.http import Http404
+
+from .models import Space, User, Venue
+
+MODELS = (User, Venue, Space)
+
+_map = ContextVar("identity_map", default=None)
+
+
+@contextmanager
+def identity_map():
+    token = _map.set({})
+    try:
+        yield
+    finally:
+        _map.reset(token)
+
+
+def _key(model, pk):
+    try:
+        return model._meta.concrete_model, model._meta.pk.to_python(pk)
+    except ValidationError:
+        return None
+
+
+def peek(model, pk):
+    """The mapped row, or None; never queries."""
+    rows, key = _map.get(), _key(model, pk)
+    if rows is None or key is None:
+        return None
+    return rows.get(key)
+
+
+def remember(instance):
+    rows = _map.get()
+    if rows is not None and isinstance(instance, MODELS) and instance.pk is not None:
+        rows[_key(type(instance), instance.pk)] = instance
+    return instance
+
+
+def forget(instance):
+    rows = _map.get()
+    if rows is not None and instance.pk is not None:
+        rows.pop(_key(type(instance), instance.pk), None)
+
+
+def get(model, pk):
+    """Like model.objects.get(pk=pk), once per request; raises DoesNotExist."""
+    instance = peek(model, pk)
+    if instance is None:
+        instance = remember(model._default_manager.get(pk=pk))
+    return instance
+
+
+def get_or_404(model, pk):
+    try:
+        return get(model, pk)
+    except (model.DoesNotExist, ValueError, ValidationError):
+        raise Http404(f"No {model._meta.object_name} matches the given query.")
+
+
+def related(instance, name):
+    """`getattr(instance, name)` for a foreign key, loading the target through the map."""
+    field = instance._meta.get_field(name)
+    if field.is_cached(instance):
+        return field.get_cached_value(instance)
+    pk = getattr(instance, field.attname)
+    target = None if pk is None else get(field.related_model, pk)
+    field.set_cached_value(instance, target)
+    return target
+
+
+def is_plain(queryset):
+    """True when the queryset loads rows exactly as get() would."""
+    query = queryset.query
+    return (
+        not query.where
+        and not query.annotations
+        and not query.select_related
+        and not queryset._prefetch_related_lookups
+        and not query.deferred_loading[0]
+    )
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import archive, sharding
+
+
+class Command(BaseCommand):
+    help = (
+        "Move bookings that ended more than BOOKING_ARCHIVE_DAYS ago into the "
+        "archive table, in batches. Safe to stop and rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=None,
+            help="Archive bookings that ended more than this many days ago.",
+        )
+        parser.add_argument("--batch-size", type=int, default=archive.BATCH_SIZE)
+        parser.add_argument(
+            "--pause", type=float, default=0.1,
+            help="Seconds to wait between batches, leaving room for other writers.",
+        )
+
+    def handle(self, *args, **options):
+        before = archive.cutoff(options["days"])
+        total = 0
+        for alias in sharding.databases():
+            with sharding.pinned(alias):
+                while True:
+                    moved = archive.archive_batch(before, options["batch_size"])
+                    total += moved
+                    if moved < options["batch_size"]:
+                        break
+                    if options["verbosity"] > 1:
+                        self.stdout.write(f"  {total} archived so far")
+                    time.sleep(options["pause"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {total} booking(s) that ended before {before:%Y-%m-%d}."
+        ))
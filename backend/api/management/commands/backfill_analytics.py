@@ -0,0 +1,47 @@
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api import analytics, archive, sharding
+from api.models import Booking, SpaceDailyStat
+
+
+class Command(BaseCommand):
+    help = "Rebuild the SpaceDailyStat analytics rollup from existing bookings."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--venue",
+            type=int,
+            help="Only rebuild rows for the spaces of this venue id.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        stats = SpaceDailyStat.objects.all()
+        lookups = {"status__in": Booking.REVENUE_STATUSES}
+
+        if options["venue"]:
+            stats = stats.filter(space__venue_id=options["venue"])
+            lookups["space__venue_id"] = options["venue"]
+
+        deleted = created = 0
+        # Each database's rollup is rebuilt from its own bookings.
+        for alias in sharding.databases():
+            # Archived bookings still count towards the rollup.
+            bookings = chain.from_iterable(
+                queryset.only(
+                    "space_id", "start_datetime", "end_datetime", "total_price", "status"
+                ).iterator(chunk_size=options["batch_size"])
+                for queryset in archive.history(**lookups)
+            )
+
+            with sharding.pinned(alias), transaction.atomic(using=alias):
+                removed, _ = stats.delete()
+                deleted += removed
+                created += analytics.rebuild(bookings, batch_size=options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt analytics rollup: removed {deleted} row(s), wrote {created} row(s)."
+        ))
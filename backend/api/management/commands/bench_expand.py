@@ -0,0 +1,101 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+
+from api.jwt_utils import generate_token
+from api.models import Amenity, Booking, Review, Space, SpaceAmenity, User, Venue
+from api.utils.booking_days import day_bounds, today
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark a venue page loaded with ?expand= against the separate "
+        "requests it replaces. Fixture rows are created inside a transaction "
+        "that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--spaces", type=int, default=20)
+        parser.add_argument("--reviews", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def build(self, space_count, review_count):
+        host = User.objects.create(name="bench host", email="bench-host@example.com",
+                                   phone="+66900000001", password_hash="x")
+        renter = User.objects.create(name="bench renter", email="bench-renter@example.com",
+                                     phone="+66900000002", password_hash="x")
+        venue = Venue.objects.create(name="Bench venue", owner=host, venue_type="GRID",
+                                     address="1 Road", city="Bangkok", province="Bangkok",
+                                     country="TH")
+        spaces = [
+            Space.objects.create(venue=venue, name=f"Space {i}", price_per_day=Decimal("100"),
+                                 is_published=True, amenities_enabled=True)
+            for i in range(space_count)
+        ]
+        amenity, _ = Amenity.objects.get_or_create(name="Bench Wi-Fi")
+        SpaceAmenity.objects.bulk_create(SpaceAmenity(space=s, amenity=amenity) for s in spaces)
+
+        # Saved one by one so the occupancy ledger is filled as in production.
+        for i in range(review_count):
+            day = today() + timedelta(days=i // space_count)
+            start, end = day_bounds(day, day)
+            booking = Booking.objects.create(
+                space=spaces[i % space_count], renter=renter, start_datetime=start,
+                end_datetime=end, total_price=Decimal("100"), status="ACCEPTED",
+            )
+            Review.objects.create(booking=booking, rating=1 + i % 5, comment="ok")
+        return venue, spaces, renter
+
+    def measure(self, flow, repeat):
+        # Each request resets connection.queries, so count executions instead.
+        queries = []
+        with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+            requests = flow()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            flow()
+        return (time.perf_counter() - started) / repeat, requests, len(queries)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                venue, spaces, renter = self.build(options["spaces"], options["reviews"])
+                client = Client(HTTP_AUTHORIZATION="Bearer " + generate_token(renter.id))
+
+                def get(path):
+                    response = client.get(path)
+                    if response.status_code != 200:
+                        raise CommandError(f"GET {path} returned {response.status_code}")
+
+                def separate():
+                    paths = [
+                        f"/api/venues/{venue.id}/",
+                        f"/api/venues/{venue.id}/spaces/",
+                        f"/api/reviews/?venue={venue.id}",
+                    ] + [f"/api/bookings/{space.id}/reservations/" for space in spaces]
+                    for path in paths:
+                        get(path)
+                    return len(paths)
+
+                def expanded():
+                    expand = "spaces,spaces.amenities,reservations,reviews"
+                    get(f"/api/venues/{venue.id}/?expand={expand}")
+                    return 1
+
+                for label, flow in (("separate", separate), ("expand", expanded)):
+                    seconds, requests, queries = self.measure(flow, options["repeat"])
+                    self.stdout.write(
+                        f"{label:<9} {requests:>4} request(s)  {queries:>4} queries  "
+                        f"{seconds * 1000:8.1f} ms"
+                    )
+                raise Rollback
+        except Rollback:
+            pass
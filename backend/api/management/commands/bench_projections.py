@@ -0,0 +1,119 @@
+import gc
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api.models import Amenity, Booking, Review, Space, SpaceAmenity, User, Venue
+from api.projections import (
+    review_projection,
+    space_projection,
+    user_projection,
+    venue_projection,
+)
+from api.serializers import (
+    ReviewSerializer,
+    SpaceSerializer,
+    UserReadSerializer,
+    VenueSerializer,
+)
+from api.utils.booking_days import day_bounds, today
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the projection list path against the ModelSerializer path. "
+        "Fixture rows are created inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=2000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def build(self, count):
+        users = User.objects.bulk_create(
+            User(name=f"bench{i}", email=f"bench{i}@example.com",
+                 phone=f"+66900{i:06d}", password_hash="x")
+            for i in range(count)
+        )
+        venues = Venue.objects.bulk_create(
+            Venue(name=f"Bench {i}", owner=users[i], venue_type="GRID",
+                  address="1 Road", city="Bangkok", province="Bangkok", country="TH")
+            for i in range(count)
+        )
+        spaces = Space.objects.bulk_create(
+            Space(venue=venue, name="Hall", price_per_day=Decimal("120.50"),
+                  is_published=True, amenities_enabled=True)
+            for venue in venues
+        )
+        amenity, _ = Amenity.objects.get_or_create(name="Bench Wi-Fi")
+        SpaceAmenity.objects.bulk_create(SpaceAmenity(space=s, amenity=amenity) for s in spaces)
+
+        # Bookings are bulk inserted on purpose: the rows are thrown away and
+        # the benchmark does not need the ledger or analytics side tables.
+        start, end = day_bounds(today() - timedelta(days=30), today() - timedelta(days=30))
+        bookings = Booking.objects.bulk_create(
+            Booking(space=space, renter=users[i], start_datetime=start, end_datetime=end,
+                    total_price=Decimal("120.50"), status="ACCEPTED")
+            for i, space in enumerate(spaces)
+        )
+        Review.objects.bulk_create(
+            Review(booking=booking, rating=1 + i % 5, comment="ok")
+            for i, booking in enumerate(bookings)
+        )
+
+    def measure(self, produce, repeat):
+        """Best of `repeat` runs with the GC off, as timeit reports them."""
+        best = None
+        gc.disable()
+        try:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                data = produce()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+        finally:
+            gc.enable()
+        return best, data
+
+    def handle(self, *args, **options):
+        count, repeat = options["count"], options["repeat"]
+        cases = [
+            ("venues", lambda: VenueSerializer.setup_eager_loading(
+                Venue.objects.filter(is_active=True).order_by("-created_at")),
+             VenueSerializer, venue_projection),
+            ("spaces", lambda: SpaceSerializer.setup_eager_loading(
+                Space.objects.order_by("-created_at")),
+             SpaceSerializer, space_projection),
+            ("reviews", lambda: ReviewSerializer.setup_eager_loading(
+                Review.objects.order_by("-created_at")),
+             ReviewSerializer, review_projection),
+            ("users", lambda: User.objects.order_by("-created_at"),
+             UserReadSerializer, user_projection),
+        ]
+        renderer = JSONRenderer()
+
+        try:
+            with transaction.atomic():
+                self.build(count)
+                for label, queryset, serializer_class, projection in cases:
+                    slow, expected = self.measure(
+                        lambda: serializer_class(queryset(), many=True).data, repeat
+                    )
+                    fast, actual = self.measure(lambda: projection.data(queryset()), repeat)
+                    same = renderer.render(expected) == renderer.render(actual)
+                    self.stdout.write(
+                        f"{label:<8} {len(actual):>6} rows  serializer {slow * 1000:8.1f} ms  "
+                        f"projection {fast * 1000:8.1f} ms  {slow / fast:5.1f}x  "
+                        f"{'identical' if same else 'OUTPUT DIFFERS'}"
+                    )
+                raise Rollback
+        except Rollback:
+            pass
@@ -0,0 +1,93 @@
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.models import Space, Venue
+from api.renderers import MessagePackRenderer, ORJSONRenderer, msgpack
+from api.serializers import SpaceSerializer, VenueSerializer
+
+
+def build_venues(count):
+    """Unsaved venues carrying the annotations VenueSerializer reads, so no DB is needed."""
+    now = timezone.now()
+    venues = []
+    for i in range(count):
+        venue = Venue(
+            id=i + 1, name=f"Venue {i} – ห้องประชุม", owner_id=i % 97 + 1,
+            venue_type="GRID" if i % 2 else "WHOLE", address=f"{i} Sukhumvit Rd",
+            city="Bangkok", province="Bangkok", country="TH",
+            description="Quiet space near the BTS with parking.",
+            created_at=now - timedelta(minutes=i, microseconds=i),
+            updated_at=now,
+        )
+        venue.total_spaces, venue.published_spaces = i % 7, i % 3
+        venue.rating_avg = None if i % 5 == 0 else 3 + (i % 20) / 10
+        venues.append(venue)
+    return venues
+
+
+def build_spaces(count):
+    now = timezone.now()
+    return [
+        Space(
+            id=i + 1, venue_id=i % 500 + 1, name=f"Space {i}",
+            space_width=Decimal("5.25"), space_height=Decimal("10.00"),
+            price_per_day=Decimal(f"{100 + i}.50"), cleaning_fee=Decimal("0.00"),
+            is_published=bool(i % 2), created_at=now, updated_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Benchmark render time and allocations of the JSON/MessagePack renderers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def measure(self, render, data, repeat):
+        render(data)  # warm-up
+        started = time.perf_counter()
+        for _ in range(repeat):
+            render(data)
+        elapsed = (time.perf_counter() - started) / repeat
+
+        tracemalloc.start()
+        output = render(data)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return elapsed, peak, output
+
+    def handle(self, *args, **options):
+        count, repeat = options["count"], options["repeat"]
+        datasets = {
+            f"{count} venues": VenueSerializer(build_venues(count), many=True).data,
+            f"{count} spaces": SpaceSerializer(build_spaces(count), many=True).data,
+        }
+        renderers = {
+            "stdlib json": JSONRenderer(),
+            "orjson": ORJSONRenderer(),
+        }
+        if msgpack is not None:
+            renderers["msgpack"] = MessagePackRenderer()
+
+        for label, data in datasets.items():
+            self.stdout.write(f"\n{label}")
+            baseline = None
+            for name, renderer in renderers.items():
+                elapsed, peak, output = self.measure(renderer.render, data, repeat)
+                if baseline is None:
+                    baseline = (elapsed, output)
+                note = ""
+                if name == "orjson":
+                    note = "identical" if output == baseline[1] else "OUTPUT DIFFERS"
+                self.stdout.write(
+                    f"  {name:<12} {elapsed * 1000:8.2f} ms  {baseline[0] / elapsed:5.1f}x  "
+                    f"peak {peak / 1024:8.0f} KiB  {len(output) / 1024:7.0f} KiB  {note}"
+                )
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import holds, sharding
+
+
+class Command(BaseCommand):
+    help = (
+        "Expire PENDING bookings whose hold has run out, in bounded batches. "
+        "With --watch, keep sweeping every N seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=holds.BATCH_SIZE)
+        parser.add_argument(
+            "--pause", type=float, default=0.1,
+            help="Seconds to wait between batches, leaving room for other writers.",
+        )
+        parser.add_argument(
+            "--watch", type=float, default=None, metavar="SECONDS",
+            help="Run forever, sweeping again this many seconds after the backlog clears.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            total = 0
+            for alias in sharding.databases():
+                with sharding.pinned(alias):
+                    while True:
+                        expired = holds.sweep(options["batch_size"])
+                        total += expired
+                        if expired < options["batch_size"]:
+                            break
+                        time.sleep(options["pause"])
+            if total or options["verbosity"] > 1:
+                self.stdout.write(f"Expired {total} hold(s).")
+            if options["watch"] is None:
+                return
+            time.sleep(options["watch"])
@@ -0,0 +1,80 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from api import export
+
+
+class Command(BaseCommand):
+    help = (
+        "Export rows of every api model to partitioned JSONL or Parquet files. "
+        "With --since-watermark only rows changed since the previous run are "
+        "exported; either way the per-table watermarks are advanced."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since-watermark",
+            action="store_true",
+            help="Only export rows changed after each table's stored watermark.",
+        )
+        parser.add_argument("--output", default=settings.EXPORT_DIR)
+        parser.add_argument("--format", choices=export.FORMATS, default="jsonl")
+        parser.add_argument(
+            "--models",
+            help="Comma-separated model names to export (default: all api models).",
+        )
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        fmt = options["format"]
+        if not export.format_available(fmt):
+            raise CommandError("--format parquet needs the optional pyarrow package.")
+
+        labels = {model._meta.model_name: model._meta.label for model in export.export_models()}
+        if options["models"]:
+            names = [name.strip().lower() for name in options["models"].split(",")]
+            unknown = [name for name in names if name not in labels]
+            if unknown:
+                raise CommandError(f"Unknown model(s): {', '.join(unknown)}")
+            labels = {name: labels[name] for name in names}
+
+        output = options["output"]
+        os.makedirs(output, exist_ok=True)
+        watermarks = export.load_watermarks(output)
+        since = watermarks if options["since_watermark"] else {}
+        run_id = timezone.now().strftime("%Y%m%dT%H%M%S%f")
+
+        # Worker processes open their own connections.
+        connections.close_all()
+        failures = []
+        workers = max(1, min(options["workers"], len(labels)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=export.init_worker) as pool:
+            futures = {
+                pool.submit(
+                    export.export_table, label, output, run_id,
+                    since.get(label), fmt, options["chunk_size"],
+                ): label
+                for label in labels.values()
+            }
+            for future in as_completed(futures):
+                label = futures[future]
+                try:
+                    _, written, watermark = future.result()
+                except Exception as e:
+                    failures.append(label)
+                    self.stderr.write(f"{label}: failed: {e}")
+                    continue
+                if watermark is not None:
+                    watermarks[label] = watermark
+                self.stdout.write(f"{label}: {written} row(s)")
+
+        export.save_watermarks(output, watermarks)
+        if failures:
+            raise CommandError(f"Export failed for: {', '.join(sorted(failures))}")
+        self.stdout.write(self.style.SUCCESS(f"Export {run_id} written to {output}."))
@@ -0,0 +1,171 @@
+import os
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, migrations, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+from django.test import Client
+
+from api import query_plans
+from api.jwt_utils import generate_token
+from api.models import Amenity, Booking, Review, Space, SpaceAmenity, User, Venue
+from api.utils.booking_days import day_bounds, today
+
+PASSWORD = "index-advisor"
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the API's endpoints against the configured database, EXPLAIN "
+        "every SELECT they run and propose a migration adding composite indexes "
+        "for full scans, filesorts and temporary tables. Fixture rows are created "
+        "inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, default=200,
+            help="Venues (and users, spaces, bookings, reviews) to create as fixtures.",
+        )
+        parser.add_argument(
+            "--write", action="store_true",
+            help="Write the proposed migration into api/migrations instead of printing it.",
+        )
+
+    def build(self, count):
+        users = User.objects.bulk_create(
+            User(name=f"advisor{i}", email=f"advisor{i}@example.com",
+                 phone=f"+66910{i:06d}", password_hash=make_password(PASSWORD) if i == 1 else "x")
+            for i in range(count)
+        )
+        venues = Venue.objects.bulk_create(
+            Venue(name=f"Advisor {i}", owner=users[i], venue_type="GRID", is_active=i % 4 != 0,
+                  address="1 Road", city="Bangkok", province="Bangkok", country="TH")
+            for i in range(count)
+        )
+        spaces = Space.objects.bulk_create(
+            Space(venue=venue, name="Hall", price_per_day=Decimal("100.00"),
+                  is_published=i % 2 == 0, amenities_enabled=True)
+            for i, venue in enumerate(venues)
+        )
+        amenity, _ = Amenity.objects.get_or_create(name="Advisor Wi-Fi")
+        SpaceAmenity.objects.bulk_create(SpaceAmenity(space=s, amenity=amenity) for s in spaces)
+
+        # Bulk inserted: the plans do not depend on the ledger or the rollup.
+        # users[1] rents every space, and owns the venue the requests use.
+        start, end = day_bounds(today() - timedelta(days=30), today() - timedelta(days=30))
+        statuses = [status for status, _ in Booking.STATUS_CHOICES]
+        bookings = Booking.objects.bulk_create(
+            Booking(space=space, renter=users[1], start_datetime=start,
+                    end_datetime=end, total_price=Decimal("100.00"),
+                    status=statuses[i % len(statuses)])
+            for i, space in enumerate(spaces)
+        )
+        Review.objects.bulk_create(
+            Review(booking=booking, rating=1 + i % 5, comment="ok")
+            for i, booking in enumerate(bookings) if i != 1
+        )
+        return users[1], venues[1], spaces[1]
+
+    def endpoints(self, user, venue, space):
+        tomorrow = today() + timedelta(days=1)
+        return [
+            ("GET", "/api/venues/", None),
+            ("GET", f"/api/venues/{venue.id}/", None),
+            ("GET", f"/api/venues/{venue.id}/?expand=spaces,spaces.amenities,reservations,reviews",
+             None),
+            ("GET", f"/api/venues/{venue.id}/spaces/", None),
+            ("GET", f"/api/venues/{venue.id}/analytics/?granularity=week", None),
+            ("GET", "/api/spaces/", None),
+            ("GET", f"/api/spaces/{space.id}/", None),
+            ("GET", f"/api/bookings/{space.id}/reservations/", None),
+            ("GET", "/api/reviews/", None),
+            ("GET", f"/api/reviews/?venue={venue.id}", None),
+            ("GET", "/api/users/", None),
+            ("GET", "/api/auth/me/", None),
+            ("POST", "/api/auth/login/", {"username": user.name, "password": PASSWORD}),
+            ("POST", f"/api/bookings/{space.id}/confirm/",
+             {"StartDate": str(tomorrow), "EndDate": str(tomorrow), "totalCost": "100.00"}),
+            ("POST", "/api/reviews/", {"venue": venue.id, "rating": 5}),
+        ]
+
+    def replay(self, client, method, path, body):
+        """Runs one request; returns the distinct SELECTs it executed."""
+        queries = {}
+
+        def record(execute, sql, params, many, context):
+            if not many and sql.lstrip().upper().startswith("SELECT"):
+                queries.setdefault(sql, params)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            if method == "GET":
+                response = client.get(path)
+            else:
+                response = client.post(path, body, content_type="application/json")
+        if response.status_code >= 400:
+            self.stderr.write(f"  {method} {path} returned {response.status_code}")
+        return queries
+
+    def advise(self, user, venue, space):
+        client = Client(HTTP_AUTHORIZATION="Bearer " + generate_token(user.id))
+        proposals = {}
+        for method, path, body in self.endpoints(user, venue, space):
+            for sql, params in self.replay(client, method, path, body).items():
+                try:
+                    plan = query_plans.explain(connection, sql, params)
+                except Exception as e:
+                    self.stderr.write(f"  could not EXPLAIN a query of {method} {path}: {e}")
+                    continue
+                for issue in query_plans.plan_issues(connection.vendor, plan, sql):
+                    model = query_plans.model_for_table(issue.table)
+                    if model is None or model._meta.app_label != "api":
+                        continue
+                    fields = query_plans.propose_index(model, sql)
+                    self.stderr.write(
+                        f"{method} {path}: {issue.kind} on {issue.table}"
+                        + (f" -> index ({', '.join(fields)})" if fields else "")
+                    )
+                    if fields:
+                        proposals[model, tuple(fields)] = None
+        return proposals
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                proposals = self.advise(*self.build(max(options["rows"], 2)))
+                raise Rollback
+        except Rollback:
+            pass
+
+        if not proposals:
+            self.stderr.write("No missing indexes found.")
+            return
+
+        app = apps.get_app_config("api")
+        leaf = sorted(MigrationLoader(None, ignore_no_migrations=True).graph.leaf_nodes(app.label))
+        number = int(leaf[-1][1].split("_")[0]) + 1 if leaf else 1
+        migration = migrations.Migration(f"{number:04d}_index_advisor", app.label)
+        migration.dependencies = leaf
+        migration.operations = [
+            migrations.AddIndex(
+                model_name=model._meta.model_name,
+                index=query_plans.index_for(model, list(fields)),
+            )
+            for model, fields in proposals
+        ]
+        writer = MigrationWriter(migration)
+        if options["write"]:
+            with open(writer.path, "w") as fh:
+                fh.write(writer.as_string())
+            self.stderr.write(f"Wrote {os.path.relpath(writer.path)}.")
+        else:
+            self.stdout.write(writer.as_string())
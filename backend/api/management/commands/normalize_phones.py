@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import User
+from api.utils.calling_codes import CALLING_CODES
+from api.utils.phone_format import normalize_phone_numbers
+
+
+class Command(BaseCommand):
+    help = (
+        "Rewrite User.phone values into E.164, in chunks of users. National "
+        "numbers without a country code are formatted for --country."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--country",
+            choices=sorted(CALLING_CODES),
+            help="Country for numbers stored without a country code.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would change without writing.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        updated = unchanged = 0
+        failures = []
+        last_pk = 0
+
+        while True:
+            chunk = list(
+                User.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", "phone")[:chunk_size]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+
+            normalized, errors = normalize_phone_numbers(
+                {phone for _, phone in chunk}, options["country"]
+            )
+            changes = {}
+            for pk, phone in chunk:
+                if phone in errors:
+                    failures.append((pk, phone, errors[phone]))
+                elif normalized[phone] == phone:
+                    unchanged += 1
+                else:
+                    changes[pk] = normalized[phone]
+
+            # phone is unique: skip numbers another user already has, or that
+            # two users in this chunk normalize to.
+            taken = set(
+                User.objects.filter(phone__in=changes.values())
+                .exclude(pk__in=changes)
+                .values_list("phone", flat=True)
+            )
+            seen = set()
+            for pk, phone in list(changes.items()):
+                if phone in taken or phone in seen:
+                    failures.append((pk, phone, "Duplicates another user's phone."))
+                    del changes[pk]
+                seen.add(phone)
+
+            if changes and not options["dry_run"]:
+                now = timezone.now()
+                with transaction.atomic():
+                    User.objects.bulk_update(
+                        [User(pk=pk, phone=phone, updated_at=now) for pk, phone in changes.items()],
+                        ["phone", "updated_at"],
+                    )
+            updated += len(changes)
+
+        for pk, phone, error in failures:
+            self.stderr.write(f"User {pk}: {phone!r}: {error}")
+        verb = "Would update" if options["dry_run"] else "Updated"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {updated} phone(s); {unchanged} already normalized; "
+            f"{len(failures)} skipped."
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from api import sharding, sync
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete delta-sync tombstones older than SYNC_TOMBSTONE_DAYS from every "
+        "database, in bounded batches. Watermarks older than that are rejected."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        before = sync.tombstone_cutoff()
+        total = 0
+        for alias in sharding.databases():
+            while True:
+                deleted = sync.prune_tombstones(before, alias, options["batch_size"])
+                total += deleted
+                if deleted < options["batch_size"]:
+                    break
+        self.stdout.write(self.style.SUCCESS(f"Deleted {total} tombstone(s)."))
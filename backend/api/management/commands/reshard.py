@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import sharding
+
+
+class Command(BaseCommand):
+    help = (
+        "Move a country's venues, with their spaces, bookings, reviews, ledger "
+        "and analytics rows, to another database in batches. Point the country "
+        "at the new database in DATABASE_SHARDS first, so new venues already "
+        "land there. Safe to stop and rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("country", help="Country code, as stored on Venue.country.")
+        parser.add_argument("--to", required=True, help="Database alias to move to.")
+        parser.add_argument("--batch-size", type=int, default=sharding.BATCH_SIZE,
+                            help="Venues per batch.")
+        parser.add_argument(
+            "--pause", type=float, default=0.1,
+            help="Seconds to wait between batches, leaving room for other writers.",
+        )
+
+    def handle(self, *args, **options):
+        country, target = options["country"], options["to"]
+        if target not in settings.DATABASES:
+            raise CommandError(f"Unknown database {target!r}.")
+        if sharding.shard_for_country(country) != target:
+            raise CommandError(
+                f"DATABASE_SHARDS sends {country} to {sharding.shard_for_country(country)!r}; "
+                f"map it to {target!r} before moving its data."
+            )
+
+        total = 0
+        for source in sharding.databases():
+            if source == target:
+                continue
+            while True:
+                moved = sharding.move_batch(country, source, target, options["batch_size"])
+                total += moved
+                if moved < options["batch_size"]:
+                    break
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"  {total} venue(s) moved so far")
+                time.sleep(options["pause"])
+
+        self.stdout.write(self.style.SUCCESS(f"Moved {total} {country} venue(s) to {target}."))
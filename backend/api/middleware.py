@@ -0,0 +1,220 @@
+import cProfile
+import json
+import re
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+
+from .identity import identity_map
+from .jwt_utils import decode_token
+from .query_plans import explain
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in per-request profiler for staging.
+
+    Enabled with PROFILING_ENABLED; a request is then profiled only when it
+    carries the PROFILING_HEADER header (or `?profile=1`) and its bearer
+    token belongs to one of PROFILING_ALLOWED_USER_IDS. Each profiled request
+    writes two files to PROFILING_DIR:
+        <id>.pstats    cProfile stats, readable with `python -m pstats`
+        <id>.sql.json  every SQL statement with timings, plus EXPLAIN output
+                       for the slowest PROFILING_EXPLAIN_TOP statements
+
+    When PROFILING_ENABLED is off the middleware removes itself at startup,
+    so it costs nothing per request.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.directory = Path(settings.PROFILING_DIR)
+        self.header = settings.PROFILING_HEADER
+        self.allowed_user_ids = set(settings.PROFILING_ALLOWED_USER_IDS)
+        self.explain_top = settings.PROFILING_EXPLAIN_TOP
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        queries = []
+        profiler = cProfile.Profile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(self.recorder(connection.alias, queries))
+                )
+            started = time.perf_counter()
+            response = profiler.runcall(self.get_response, request)
+            elapsed = time.perf_counter() - started
+
+        profile_id = self.write_report(request, response, profiler, queries, elapsed)
+        response["X-Profile-Id"] = profile_id
+        return response
+
+    def should_profile(self, request):
+        requested = (
+            request.headers.get(self.header) == "1"
+            or request.GET.get("profile") == "1"
+        )
+        if not requested:
+            return False
+
+        auth = request.headers.get("Authorization", "")
+        if not auth.startswith("Bearer "):
+            return False
+        payload = decode_token(auth.split(" ", 1)[1].strip())
+        return bool(payload) and payload.get("user_id") in self.allowed_user_ids
+
+    @staticmethod
+    def recorder(alias, queries):
+        def record(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append({
+                    "alias": alias,
+                    "sql": sql,
+                    "params": params,
+                    "many": many,
+                    "ms": round((time.perf_counter() - started) * 1000, 3),
+                })
+        return record
+
+    def explain(self, query):
+        return explain(connections[query["alias"]], query["sql"], query["params"])
+
+    def write_report(self, request, response, profiler, queries, elapsed):
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", request.path).strip("-") or "root"
+        profile_id = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{request.method}-{slug}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        profiler.dump_stats(self.directory / f"{profile_id}.pstats")
+
+        slowest = sorted(
+            (q for q in queries if not q["many"] and q["sql"].lstrip().upper().startswith("SELECT")),
+            key=lambda q: q["ms"],
+            reverse=True,
+        )[:self.explain_top]
+        for query in slowest:
+            try:
+                query["explain"] = self.explain(query)
+            except Exception as e:
+                query["explain_error"] = str(e)
+
+        report = {
+            "method": request.method,
+            "path": request.get_full_path(),
+            "status": response.status_code,
+            "total_ms": round(elapsed * 1000, 3),
+            "sql_count": len(queries),
+            "sql_ms": round(sum(q["ms"] for q in queries), 3),
+            "queries": queries,
+        }
+        with open(self.directory / f"{profile_id}.sql.json", "w") as fh:
+            json.dump(report, fh, indent=2, default=str)
+
+        return profile_id
+
+
+class InFlight:
+    """
+    Counts the requests running in this process. LoadSheddingMiddleware and
+    the batch endpoint's sub-requests (api/batch_views.py), which skip the
+    middleware, share one count.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def enter(self, limit):
+        """Counts one more request unless `limit` are running; 0 means no limit."""
+        with self.lock:
+            if limit and self.count >= limit:
+                return False
+            self.count += 1
+            return True
+
+    def exit(self):
+        with self.lock:
+            self.count -= 1
+
+
+in_flight = InFlight()
+
+
+def overloaded_response():
+    response = JsonResponse(
+        {"detail": "Service temporarily overloaded, try again shortly."},
+        status=503,
+    )
+    response["Retry-After"] = str(getattr(settings, "LOAD_SHED_RETRY_AFTER", 5))
+    return response
+
+
+class LoadSheddingMiddleware:
+    """
+    Answers 503 with Retry-After instead of queueing more work once this
+    process is overloaded, so a spike fails fast rather than timing out every
+    request. A request is shed when either:
+        - LOAD_SHED_MAX_IN_FLIGHT requests are already running in this process
+        - it spent more than LOAD_SHED_MAX_QUEUE_MS waiting in front of Django,
+          measured from the proxy's X-Request-Start header (`t=<epoch>` in
+          seconds, milliseconds or microseconds, as nginx and most PaaS
+          routers send it)
+    A limit of 0 disables that check; with both at 0 the middleware removes
+    itself at startup.
+    """
+
+    def __init__(self, get_response):
+        self.max_in_flight = getattr(settings, "LOAD_SHED_MAX_IN_FLIGHT", 0)
+        self.max_queue_ms = getattr(settings, "LOAD_SHED_MAX_QUEUE_MS", 0)
+        if not (self.max_in_flight or self.max_queue_ms):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if self.max_queue_ms and self.queue_ms(request) > self.max_queue_ms:
+            return overloaded_response()
+
+        if not in_flight.enter(self.max_in_flight):
+            return overloaded_response()
+        try:
+            return self.get_response(request)
+        finally:
+            in_flight.exit()
+
+    @staticmethod
+    def queue_ms(request):
+        header = request.headers.get("X-Request-Start", "")
+        try:
+            started = float(header.removeprefix("t="))
+        except ValueError:
+            return 0
+        if started > 1e14:
+            started /= 1e6
+        elif started > 1e11:
+            started /= 1e3
+        return max(0, (time.time() - started) * 1000)
+
+
+class IdentityMapMiddleware:
+    """Gives every request its own identity map (api/identity.py)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with identity_map():
+            return self.get_response(request)
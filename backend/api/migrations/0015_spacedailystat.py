@@ -0,0 +1,31 @@
+# Generated by Django 5.2.9 on 2026-10-19 06:26
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_remove_review_api_review_venue_i_4f257f_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpaceDailyStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('date', models.DateField()),
+                ('booked_days', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('booking_count', models.IntegerField(default=0)),
+                ('space', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='api.space')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('space', 'date'), name='unique_space_daily_stat')],
+            },
+        ),
+    ]
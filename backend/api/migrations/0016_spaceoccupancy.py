@@ -0,0 +1,58 @@
+# Generated by Django 5.2.9 on 2026-10-19 06:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from api.utils.booking_days import booking_days
+
+
+def backfill_occupancy(apps, schema_editor):
+    """
+    Claims ledger rows for every existing PENDING/ACCEPTED booking. If history
+    already contains double bookings, the earliest booking keeps the date.
+    """
+    Booking = apps.get_model("api", "Booking")
+    SpaceOccupancy = apps.get_model("api", "SpaceOccupancy")
+    db = schema_editor.connection.alias
+
+    bookings = (
+        Booking.objects.using(db).filter(status__in=["PENDING", "ACCEPTED"])
+        .order_by("id")
+        .values_list("id", "space_id", "start_datetime", "end_datetime")
+    )
+    rows = []
+    for booking_id, space_id, start_dt, end_dt in bookings.iterator(chunk_size=1000):
+        rows.extend(
+            SpaceOccupancy(space_id=space_id, date=day, booking_id=booking_id)
+            for day in booking_days(start_dt, end_dt)
+        )
+        if len(rows) >= 1000:
+            SpaceOccupancy.objects.using(db).bulk_create(rows, ignore_conflicts=True)
+            rows = []
+    if rows:
+        SpaceOccupancy.objects.using(db).bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_spacedailystat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpaceOccupancy',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('date', models.DateField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='api.booking')),
+                ('space', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='api.space')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('space', 'date'), name='unique_space_occupancy_date')],
+            },
+        ),
+        migrations.RunPython(backfill_occupancy, migrations.RunPython.noop),
+    ]
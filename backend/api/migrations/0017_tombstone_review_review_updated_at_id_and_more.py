@@ -0,0 +1,39 @@
+# Generated by Django 5.2.9 on 2026-10-19 06:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_spaceoccupancy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('resource', models.CharField(choices=[('venue', 'Venue'), ('space', 'Space'), ('review', 'Review')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['updated_at', 'id'], name='review_updated_at_id'),
+        ),
+        migrations.AddIndex(
+            model_name='space',
+            index=models.Index(fields=['updated_at', 'id'], name='space_updated_at_id'),
+        ),
+        migrations.AddIndex(
+            model_name='venue',
+            index=models.Index(fields=['updated_at', 'id'], name='venue_updated_at_id'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['resource', 'updated_at', 'id'], name='tombstone_feed'),
+        ),
+    ]
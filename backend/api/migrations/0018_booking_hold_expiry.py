@@ -0,0 +1,45 @@
+# Generated by Django 5.2.9 on 2026-10-19 07:01
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def start_holds(apps, schema_editor):
+    """
+    Gives existing PENDING bookings a full hold from now rather than from
+    their creation, so deploying this does not expire them all at once.
+    """
+    Booking = apps.get_model("api", "Booking")
+    hold = timedelta(minutes=getattr(settings, "BOOKING_HOLD_MINUTES", 30))
+    db = schema_editor.connection.alias
+    Booking.objects.using(db).filter(status="PENDING", hold_expires_at__isnull=True).update(
+        hold_expires_at=timezone.now() + hold
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_tombstone_review_review_updated_at_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='hold_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('ACCEPTED', 'Accepted'), ('REJECTED', 'Rejected'), ('CANCELLED', 'Cancelled'), ('EXPIRED', 'Expired')], default='PENDING', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'hold_expires_at'], name='api_booking_status_6d0806_idx'),
+        ),
+        migrations.RunPython(start_holds, migrations.RunPython.noop),
+    ]
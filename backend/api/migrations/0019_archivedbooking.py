@@ -0,0 +1,51 @@
+# Generated by Django 5.2.9 on 2026-10-19 07:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_booking_hold_expiry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('start_datetime', models.DateTimeField()),
+                ('end_datetime', models.DateTimeField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('ACCEPTED', 'Accepted'), ('REJECTED', 'Rejected'), ('CANCELLED', 'Cancelled'), ('EXPIRED', 'Expired')], max_length=20)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('currency', models.CharField(max_length=10)),
+                ('payment_status', models.CharField(choices=[('UNPAID', 'Unpaid'), ('PAID', 'Paid')], max_length=30)),
+                ('hold_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['end_datetime'], name='api_booking_end_dat_2dab3f_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedbooking',
+            name='renter',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='api.user'),
+        ),
+        migrations.AddField(
+            model_name='archivedbooking',
+            name='space',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='api.space'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['space', 'start_datetime'], name='api_archive_space_i_7df6f8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['renter'], name='api_archive_renter__629200_idx'),
+        ),
+    ]
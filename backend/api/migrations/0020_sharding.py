@@ -0,0 +1,45 @@
+# Generated by Django 5.2.9 on 2026-10-19 07:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_archivedbooking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdBlock',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AlterField(
+            model_name='archivedbooking',
+            name='renter',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='api.user'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='renter',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='api.user'),
+        ),
+        migrations.AlterField(
+            model_name='spaceamenity',
+            name='amenity',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='space_amenities', to='api.amenity'),
+        ),
+        migrations.AlterField(
+            model_name='venue',
+            name='owner',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='api.user'),
+        ),
+    ]
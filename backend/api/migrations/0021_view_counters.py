@@ -0,0 +1,44 @@
+# Generated by Django 5.2.9 on 2026-10-19 07:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_sharding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpaceDailyViews',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('date', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('impressions', models.PositiveIntegerField(default=0)),
+                ('space', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_views', to='api.space')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('space', 'date'), name='unique_space_daily_views')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VenueDailyViews',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('date', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('impressions', models.PositiveIntegerField(default=0)),
+                ('venue', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_views', to='api.venue')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('venue', 'date'), name='unique_venue_daily_views')],
+            },
+        ),
+    ]
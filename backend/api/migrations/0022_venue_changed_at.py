@@ -0,0 +1,34 @@
+# Generated by Django 5.2.9 on 2026-10-19 07:51
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_updated_at(apps, schema_editor):
+    """Starts every venue's feed key at its last update, not at the deploy."""
+    Venue = apps.get_model("api", "Venue")
+    Venue.objects.using(schema_editor.connection.alias).update(changed_at=F("updated_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_view_counters'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='venue',
+            name='venue_updated_at_id',
+        ),
+        migrations.AddField(
+            model_name='venue',
+            name='changed_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(copy_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='venue',
+            index=models.Index(fields=['changed_at', 'id'], name='venue_changed_at_id'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-19 07:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_venue_changed_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tombstone',
+            name='resource',
+            field=models.CharField(choices=[('user', 'User'), ('venue', 'Venue'), ('space', 'Space'), ('amenity', 'Amenity'), ('spaceamenity', 'Space amenity'), ('booking', 'Booking'), ('archivedbooking', 'Archived booking'), ('review', 'Review')], max_length=20),
+        ),
+    ]
@@ -1,6 +1,11 @@
-from django.db import models
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, router, transaction
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
+from . import sharding
 from .utils.phone_format import format_rule
 from django.db.models import Q
 
@@ -17,6 +22,68 @@ class BaseModel(models.Model):
         abstract = True
 
 
+class ShardedQuerySet(models.QuerySet):
+    """
+    With sharding on, create() and bulk_create() let the router place each
+    row by its venue or parent (api/sharding.py) and give new rows ids from
+    the global id blocks.
+    """
+
+    def create(self, **kwargs):
+        if self._db is not None or not sharding.enabled():
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if not sharding.enabled():
+            return super().bulk_create(objs, *args, **kwargs)
+        objs = list(objs)
+        if self.model.global_ids:
+            for obj in objs:
+                if obj.pk is None:
+                    obj.pk = sharding.allocate_id()
+        if self._db is not None:
+            return super().bulk_create(objs, *args, **kwargs)
+        groups = {}
+        for obj in objs:
+            groups.setdefault(router.db_for_write(self.model, instance=obj), []).append(obj)
+        for alias, group in groups.items():
+            super(ShardedQuerySet, self.using(alias)).bulk_create(group, *args, **kwargs)
+        return objs
+
+
+class ShardedModel(BaseModel):
+    """
+    Abstract base of the venue data that lives on the region shards
+    (api/sharding.py). `global_ids = False` keeps the table's own sequence,
+    for rows nothing refers to by id across databases.
+    """
+    global_ids = True
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self.pk is None and self.global_ids and sharding.enabled():
+            self.pk = sharding.allocate_id()
+            kwargs.setdefault("force_insert", True)
+        super().save(*args, **kwargs)
+
+
+class IdBlock(BaseModel):
+    """
+    A block of sharding.ID_BLOCK_SIZE ids for new rows on the region shards,
+    handed to one process; the ids follow from the block's own id.
+    """
+
+    def __str__(self):
+        return f"Id block #{self.id}"
+
+
 class User(BaseModel):
     """
     Represents a platform user account.
@@ -39,7 +106,7 @@ class User(BaseModel):
         return f"{self.name} "
 
 
-class Venue(BaseModel):
+class Venue(ShardedModel):
     """
     Represents a physical place or building that a host lists for rental.
     A venue contains one or more bookable spaces.
@@ -49,7 +116,8 @@ class Venue(BaseModel):
         ("GRID", "Grid-based"),
     ]
     name = models.CharField(max_length=255)
-    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Users are global and not on the shards: no database-level constraint.
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
     venue_type = models.CharField(max_length=10, choices=VENUE_TYPES)
 
     address = models.CharField(max_length=255)
@@ -61,6 +129,11 @@ class Venue(BaseModel):
 
     description = models.TextField(blank=True)
 
+    # Last change to the venue or to what its list row embeds (space counts,
+    # rating): the delta-sync feed key (api/sync.py). updated_at stays the
+    # venue's own.
+    changed_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -69,12 +142,16 @@ class Venue(BaseModel):
                 name="unique_active_venue_name_per_owner"
             )
         ]
+        indexes = [
+            # Delta-sync feed key (api/sync.py)
+            models.Index(fields=["changed_at", "id"], name="venue_changed_at_id"),
+        ]
 
     def __str__(self):
         return f"Venue: {self.name} (Owner: {self.owner.name})"
 
 
-class Space(BaseModel):
+class Space(ShardedModel):
     """
     Represents a bookable subdivision within a Venue for the Renter.
     """
@@ -96,6 +173,12 @@ class Space(BaseModel):
     amenities_enabled = models.BooleanField(default=False)
     description = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            # Delta-sync feed key (api/sync.py)
+            models.Index(fields=["updated_at", "id"], name="space_updated_at_id"),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.venue.name})"
 
@@ -111,7 +194,7 @@ class Amenity(BaseModel):
         return self.name
 
 
-class SpaceAmenity(BaseModel):
+class SpaceAmenity(ShardedModel):
     """
     Join model between Space and Amenity, with optional `amount`.
     Mirrors `space_amenities` table in DBML.
@@ -125,6 +208,7 @@ class SpaceAmenity(BaseModel):
         Amenity,
         on_delete=models.CASCADE,
         related_name="space_amenities",
+        db_constraint=False,
     )
     amount = models.PositiveIntegerField(
         default=1,
@@ -138,7 +222,7 @@ class SpaceAmenity(BaseModel):
         return f"{self.amenity.name} x{self.amount} @ {self.space.name}"
 
 
-class Booking(BaseModel):
+class Booking(ShardedModel):
     """
     Booking made by a renter for a specific space and time range.
     """
@@ -147,6 +231,7 @@ class Booking(BaseModel):
         ("ACCEPTED", "Accepted"),
         ("REJECTED", "Rejected"),
         ("CANCELLED", "Cancelled"),
+        ("EXPIRED", "Expired"),
     ]
 
     PAYMENT_STATUS_CHOICES = [
@@ -163,6 +248,7 @@ class Booking(BaseModel):
         User,
         on_delete=models.CASCADE,
         related_name="bookings",
+        db_constraint=False,
     )
 
     start_datetime = models.DateTimeField()
@@ -192,17 +278,101 @@ class Booking(BaseModel):
         default="UNPAID",
     )
 
+    # A PENDING booking holds its dates until this time (api/holds.py).
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         indexes = [
             models.Index(fields=["space", "start_datetime", "end_datetime"]),
             models.Index(fields=["renter"]),
+            models.Index(fields=["status", "hold_expires_at"]),
+            # Archival scan (api/archive.py)
+            models.Index(fields=["end_datetime"]),
         ]
 
+    # Statuses that occupy the space and count towards revenue.
+    ACTIVE_STATUSES = ("PENDING", "ACCEPTED")
+    REVENUE_STATUSES = ("ACCEPTED",)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded = instance.snapshot()
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.status == "PENDING" and self.hold_expires_at is None:
+            minutes = getattr(settings, "BOOKING_HOLD_MINUTES", 30)
+            self.hold_expires_at = timezone.now() + timedelta(minutes=minutes)
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "hold_expires_at"}
+        # post_save claims the dates in the occupancy ledger; a conflict
+        # (occupancy.DatesUnavailable) must take the row down with it, also
+        # for callers outside a transaction. Inside one this adds nothing.
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+    def snapshot(self):
+        """
+        Captures the fields that side tables (analytics rollup, occupancy
+        ledger) derive from, so a post_save handler can tell what changed
+        since the row was loaded.
+        """
+        return {
+            "space_id": self.space_id,
+            "start_datetime": self.start_datetime,
+            "end_datetime": self.end_datetime,
+            "total_price": self.total_price,
+            "status": self.status,
+        }
+
     def __str__(self):
         return f"Booking #{self.id} - {self.space.name} by {self.renter.name}"
 
 
-class Review(BaseModel):
+class ArchivedBooking(ShardedModel):
+    """
+    Cold storage for bookings that ended long ago, moved out of Booking by
+    api/archive.py under their original id. `created_at` is the booking's;
+    `updated_at` is when it was archived. Nothing writes to these rows.
+    """
+    global_ids = False
+
+    id = models.IntegerField(primary_key=True)
+    space = models.ForeignKey(
+        Space,
+        on_delete=models.CASCADE,
+        related_name="archived_bookings",
+    )
+    renter = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="archived_bookings",
+        db_constraint=False,
+    )
+    start_datetime = models.DateTimeField()
+    end_datetime = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=10)
+    payment_status = models.CharField(max_length=30, choices=Booking.PAYMENT_STATUS_CHOICES)
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["space", "start_datetime"]),
+            models.Index(fields=["renter"]),
+        ]
+
+    snapshot = Booking.snapshot
+
+    def __str__(self):
+        return f"Archived booking #{self.id}"
+
+
+class Review(ShardedModel):
     """
     Review left by a renter about a venue, based on a booking.
     """
@@ -224,6 +394,8 @@ class Review(BaseModel):
         # Index the booking field for faster lookups and enforce one review per booking
         indexes = [
             models.Index(fields=["booking"]),
+            # Delta-sync feed key (api/sync.py)
+            models.Index(fields=["updated_at", "id"], name="review_updated_at_id"),
         ]
 
     def __str__(self):
@@ -231,3 +403,156 @@ class Review(BaseModel):
         venue = self.booking.space.venue if self.booking else None
         reviewer = self.booking.renter if self.booking else None
         return f"Review {self.rating}/5 for {venue.name if venue else '?'} by {reviewer.name if reviewer else '?'}"
+
+
+class SpaceDailyStat(ShardedModel):
+    """
+    Daily analytics rollup for a Space, recomputed from bookings as they change.
+    One row per (space, date) in Bangkok time; a booking contributes one
+    booked day to each date it covers, its price spread over those days, and
+    one booking to its first day.
+    """
+    global_ids = False
+
+    space = models.ForeignKey(
+        Space,
+        on_delete=models.CASCADE,
+        related_name="daily_stats",
+    )
+    date = models.DateField()
+    booked_days = models.IntegerField(default=0)
+    revenue = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal("0.00"),
+    )
+    booking_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["space", "date"],
+                name="unique_space_daily_stat",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.space_id} @ {self.date}: {self.booked_days} day(s)"
+
+
+class SpaceOccupancy(ShardedModel):
+    """
+    Per-day occupancy ledger: one row for every Bangkok date a PENDING or
+    ACCEPTED booking holds on a space. The unique (space, date) constraint is
+    what makes double booking impossible; rows are written in the same
+    transaction as the booking and removed when it is cancelled, rejected or
+    its hold expires. Rows of holds that have expired but not yet been swept
+    are ignored by reads (occupancy.in_force) and freed by a conflicting claim.
+    """
+    global_ids = False
+
+    space = models.ForeignKey(
+        Space,
+        on_delete=models.CASCADE,
+        related_name="occupancy",
+    )
+    date = models.DateField()
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name="occupancy",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["space", "date"],
+                name="unique_space_occupancy_date",
+            )
+        ]
+
+    def __str__(self):
+        return f"Space {self.space_id} on {self.date} (Booking #{self.booking_id})"
+
+
+class VenueDailyViews(ShardedModel):
+    """
+    Page views and list impressions of a Venue per Bangkok date. Written only
+    by the write-behind counters (api/counters.py), which add each process's
+    buffered counts with one upsert per flush.
+    """
+    global_ids = False
+
+    venue = models.ForeignKey(
+        Venue,
+        on_delete=models.CASCADE,
+        related_name="daily_views",
+    )
+    date = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    impressions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["venue", "date"],
+                name="unique_venue_daily_views",
+            )
+        ]
+
+    def __str__(self):
+        return f"Venue {self.venue_id} @ {self.date}: {self.views} view(s)"
+
+
+class SpaceDailyViews(ShardedModel):
+    """Page views and list impressions of a Space per Bangkok date; see VenueDailyViews."""
+    global_ids = False
+
+    space = models.ForeignKey(
+        Space,
+        on_delete=models.CASCADE,
+        related_name="daily_views",
+    )
+    date = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    impressions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["space", "date"],
+                name="unique_space_daily_views",
+            )
+        ]
+
+    def __str__(self):
+        return f"Space {self.space_id} @ {self.date}: {self.views} view(s)"
+
+
+class Tombstone(BaseModel):
+    """
+    Marks a deleted row for the delta-sync feeds (api/sync.py), which
+    report venues, spaces and reviews in `deleted` once, and for the change
+    export (api/export.py), which carries every deletion of an exported
+    table. Written by the post_delete signals in api/signals.py.
+    """
+    RESOURCES = [
+        ("user", "User"),
+        ("venue", "Venue"),
+        ("space", "Space"),
+        ("amenity", "Amenity"),
+        ("spaceamenity", "Space amenity"),
+        ("booking", "Booking"),
+        ("archivedbooking", "Archived booking"),
+        ("review", "Review"),
+    ]
+    resource = models.CharField(max_length=20, choices=RESOURCES)
+    object_id = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["resource", "updated_at", "id"], name="tombstone_feed"),
+        ]
+
+    def __str__(self):
+        return f"Deleted {self.resource} #{self.object_id}"
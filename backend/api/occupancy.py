@@ -0,0 +1,116 @@
+"""
+Occupancy ledger maintenance.
+
+A booking occupies its space on every Bangkok date it covers while its status
+is PENDING or ACCEPTED. Claiming those dates is a plain insert into
+SpaceOccupancy, so a conflicting booking fails on the (space, date) unique key
+instead of relying on a range-overlap scan racing against concurrent writers.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import sharding
+from .models import Booking, SpaceOccupancy
+from .utils.booking_days import booking_days, date_range
+
+
+class DatesUnavailable(Exception):
+    """Raised when a booking tries to claim a date another booking holds."""
+
+
+def is_occupying(snapshot):
+    return snapshot is not None and snapshot["status"] in Booking.ACTIVE_STATUSES
+
+
+def in_force(queryset=None):
+    """Ledger rows, without those of expired holds the sweeper has not reached yet."""
+    if queryset is None:
+        queryset = SpaceOccupancy.objects.all()
+    return queryset.exclude(
+        booking__status="PENDING", booking__hold_expires_at__lte=timezone.now()
+    )
+
+
+def claim(booking_id, snapshot):
+    days = booking_days(snapshot["start_datetime"], snapshot["end_datetime"])
+    rows = [
+        SpaceOccupancy(space_id=snapshot["space_id"], date=day, booking_id=booking_id)
+        for day in days
+    ]
+    try:
+        with transaction.atomic(using=sharding.current()):
+            SpaceOccupancy.objects.bulk_create(rows)
+        return
+    except IntegrityError:
+        pass
+
+    # The dates may only be held by expired holds: free those and retry once.
+    from .holds import expire_conflicting_holds
+    if expire_conflicting_holds(snapshot["space_id"], days, exclude=booking_id):
+        try:
+            with transaction.atomic(using=sharding.current()):
+                SpaceOccupancy.objects.bulk_create(rows)
+            return
+        except IntegrityError:
+            pass
+    raise DatesUnavailable("This date range is already booked.")
+
+
+def release(booking_id):
+    SpaceOccupancy.objects.filter(booking_id=booking_id).delete()
+
+
+def apply_occupancy_change(booking_id, before, after):
+    """
+    Moves a booking's ledger rows from its `before` snapshot to its `after`
+    snapshot; either may be None or non-occupying.
+    """
+    was, now = is_occupying(before), is_occupying(after)
+    if was and now and all(
+        before[key] == after[key]
+        for key in ("space_id", "start_datetime", "end_datetime")
+    ):
+        return
+    if was:
+        release(booking_id)
+    if now:
+        claim(booking_id, after)
+
+
+def is_available(space_id, start_date, end_date):
+    """Cheap indexed pre-check; the unique insert in claim() is authoritative."""
+    return not in_force().filter(
+        space_id=space_id,
+        date__gte=start_date,
+        date__lte=end_date,
+    ).exists()
+
+
+def reserved_dates(space_id, start_date, end_date=None):
+    """Occupied dates of a space in the window, read in order off the unique index."""
+    qs = in_force().filter(space_id=space_id, date__gte=start_date)
+    if end_date is not None:
+        qs = qs.filter(date__lte=end_date)
+    return qs.order_by("date").values_list("date", flat=True)
+
+
+def merge_spans(dates):
+    """
+    Collapses sorted dates into minimal inclusive spans, joining consecutive
+    days even when they belong to different bookings.
+    """
+    spans = []
+    for day in dates:
+        if spans and (day - spans[-1][1]).days <= 1:
+            spans[-1][1] = day
+        else:
+            spans.append([day, day])
+    return [{"start": start.isoformat(), "end": end.isoformat()} for start, end in spans]
+
+
+def day_bitmap(dates, start_date, end_date):
+    """One character per day of the window: "1" occupied, "0" free."""
+    occupied = set(dates)
+    return "".join(
+        "1" if day in occupied else "0" for day in date_range(start_date, end_date)
+    )
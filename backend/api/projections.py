@@ -0,0 +1,227 @@
+"""
+Projection read path for list endpoints.
+
+A Projection mirrors one read serializer but never builds model instances:
+it pulls exactly the columns the serializer outputs with values_list() (joins
+and annotations included) and turns each row tuple into a dict with a
+converter list compiled once from the serializer's own fields, so the output
+is identical to `Serializer(queryset, many=True).data`.
+"""
+import decimal
+from decimal import Decimal
+from operator import itemgetter
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from . import sharding
+from .models import SpaceAmenity
+from .serializers import (
+    ReviewSerializer,
+    SpaceSerializer,
+    UserReadSerializer,
+    VenueSerializer,
+)
+
+# Fields whose to_representation is the identity for values the database returns.
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+    serializers.ReadOnlyField,
+)
+
+
+def datetime_converter(field):
+    """
+    Inlines DateTimeField.to_representation for the default ISO 8601 output.
+    Resolved per call, since the field's timezone is the current timezone.
+    """
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, "timezone") else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if not value:
+            return None
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+    return convert
+
+
+def decimal_converter(field):
+    """Inlines DecimalField.to_representation for string output."""
+    coerce_to_string = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.decimal_places is None:
+        return field.to_representation
+
+    exponent = Decimal(".1") ** field.decimal_places
+    rounding = field.rounding
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+
+    def convert(value):
+        if not isinstance(value, Decimal):
+            return field.to_representation(value)
+        return "{:f}".format(value.quantize(exponent, rounding=rounding, context=context))
+    return convert
+
+
+class Projection:
+    serializer_class = None
+    # Output key -> (ORM lookups to fetch, function(*values) -> output value),
+    # for the serializer's SerializerMethodFields.
+    computed = {}
+
+    def __init__(self):
+        self.lookups = []
+        self.fields = []
+
+        for key, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if key in self.computed:
+                sources, function = self.computed[key]
+                self.fields.append((key, None, self._columns(*sources), function))
+                continue
+
+            lookup = field.source
+            if isinstance(field, serializers.PrimaryKeyRelatedField):
+                lookup = f"{lookup}_id"
+            self.fields.append((key, field, self._columns(lookup), None))
+
+    def _columns(self, *lookups):
+        indexes = []
+        for lookup in lookups:
+            if lookup not in self.lookups:
+                self.lookups.append(lookup)
+            indexes.append(self.lookups.index(lookup))
+        return indexes
+
+    def compile(self):
+        """
+        Returns [(key, getter)] where getter(row_tuple) produces the output
+        value; plain columns become C-level itemgetters.
+        """
+        plan = []
+        for key, field, indexes, function in self.fields:
+            if function is not None:
+                plan.append((key, self._computed_getter(indexes, function)))
+            elif isinstance(field, PASSTHROUGH_FIELDS):
+                plan.append((key, itemgetter(indexes[0])))
+            else:
+                if isinstance(field, serializers.DateTimeField):
+                    convert = datetime_converter(field)
+                elif isinstance(field, serializers.DecimalField):
+                    convert = decimal_converter(field)
+                else:
+                    convert = field.to_representation
+                plan.append((key, self._converted_getter(indexes[0], convert)))
+        return plan
+
+    @staticmethod
+    def _computed_getter(indexes, function):
+        if len(indexes) == 1:
+            index = indexes[0]
+            return lambda row: function(row[index])
+        columns = itemgetter(*indexes)
+        return lambda row: function(*columns(row))
+
+    @staticmethod
+    def _converted_getter(index, convert):
+        # Serializer.to_representation emits None without calling the field.
+        def get(row):
+            value = row[index]
+            return None if value is None else convert(value)
+        return get
+
+    def rows(self, queryset):
+        return queryset.prefetch_related(None).values_list(
+            *sharding.local_lookups(queryset.model, self.lookups)
+        )
+
+    def emit(self, rows, plan=None):
+        """Converts row tuples to output dicts."""
+        plan = plan or self.compile()
+        rows = sharding.join_global(self.serializer_class.Meta.model, self.lookups, rows)
+        if not isinstance(rows, list):
+            rows = list(rows)
+        # Column by column, so plain columns are copied by map(itemgetter) in C.
+        keys = [key for key, _ in plan]
+        columns = [list(map(get, rows)) for _, get in plan]
+        return self.finish([dict(zip(keys, values)) for values in zip(*columns)])
+
+    def finish(self, items):
+        """Hook for values that need one extra query per batch of items."""
+        return items
+
+    def data(self, queryset):
+        return self.emit(self.rows(queryset))
+
+
+def venue_summary(total, published):
+    return {
+        "total_spaces": total,
+        "published_spaces": published,
+        "unpublished_spaces": total - published,
+    }
+
+
+class VenueProjection(Projection):
+    """Expects a queryset prepared by VenueSerializer.setup_eager_loading."""
+    serializer_class = VenueSerializer
+    computed = {
+        "summary": (("total_spaces", "published_spaces"), venue_summary),
+        "average_rating": (
+            ("rating_avg",),
+            lambda avg: round(avg, 1) if avg is not None else None,
+        ),
+    }
+
+
+class SpaceProjection(Projection):
+    serializer_class = SpaceSerializer
+    chunk_size = 1000
+    computed = {
+        # Filled in by data() with one extra query for the whole list.
+        "amenities": (("amenities_enabled",), lambda enabled: enabled),
+    }
+
+    def finish(self, items):
+        enabled_ids = [item["id"] for item in items if item["amenities"]]
+        names = {}
+        for start in range(0, len(enabled_ids), self.chunk_size):
+            for space_id, name in sharding.values_list(
+                SpaceAmenity.objects.filter(
+                    space_id__in=enabled_ids[start:start + self.chunk_size]
+                ).order_by("id"),
+                "space_id", "amenity__name",
+            ):
+                names.setdefault(space_id, []).append(name)
+
+        for item in items:
+            item["amenities"] = names.get(item["id"], []) if item["amenities"] else []
+        return items
+
+
+class ReviewProjection(Projection):
+    serializer_class = ReviewSerializer
+    computed = {
+        "venue": (("booking__space__venue_id",), lambda venue_id: venue_id),
+        "reviewer": (("booking__renter_id",), lambda renter_id: renter_id),
+        "reviewer_name": (("booking__renter__name",), lambda name: name),
+    }
+
+
+class UserProjection(Projection):
+    serializer_class = UserReadSerializer
+
+
+venue_projection = VenueProjection()
+space_projection = SpaceProjection()
+review_projection = ReviewProjection()
+user_projection = UserProjection()
@@ -0,0 +1,181 @@
+"""
+Reading query plans and turning them into index proposals, for
+`manage.py index_advisor` (and EXPLAIN output in ProfilingMiddleware).
+
+plan_issues() reads EXPLAIN output from MySQL, PostgreSQL or SQLite and
+reports, per table, full scans, sorts without an index (filesort) and
+temporary tables. propose_index() then reads the SQL of a flagged query for
+that table's columns: equality filters first, then the ORDER BY columns, then
+one range filter, and proposes that composite index unless an existing index
+already starts with those columns.
+"""
+import re
+from collections import namedtuple
+
+from django.apps import apps
+from django.db import models
+
+FULL_SCAN = "full scan"
+FILESORT = "filesort"
+TEMPORARY = "temporary table"
+
+Issue = namedtuple("Issue", "table kind")
+
+# Identifiers are quoted with backticks on MySQL and double quotes elsewhere.
+Q = r'[`"]?'
+# A bare boolean column is how Django filters on `field=True`.
+EQUALITY = r"(?:=\s*%s|IN\s*\(|IS NULL|(?=\s*(?:\)|AND\b|OR\b|$)))"
+RANGE = r"(?:[<>]=?\s*%s)"
+
+
+def explain(connection, sql, params):
+    """Runs EXPLAIN for one statement; returns the plan as a list of row dicts."""
+    prefix = connection.ops.explain_query_prefix()
+    with connection.cursor() as cursor:
+        cursor.execute(f"{prefix} {sql}", params)
+        columns = [col[0] for col in cursor.description or ()]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def top_level(sql, keyword, start=0):
+    """Index of the first `keyword` at or after `start` outside parentheses, or -1."""
+    for match in re.finditer(rf"\b{keyword}\b", sql[start:], re.IGNORECASE):
+        at = start + match.start()
+        if sql.count("(", 0, at) == sql.count(")", 0, at):
+            return at
+    return -1
+
+
+def clause(sql, keyword, ends):
+    """The top-level clause opened by `keyword`, up to the first of `ends`."""
+    start = top_level(sql, keyword)
+    if start == -1:
+        return ""
+    stops = [top_level(sql, end, start) for end in ends]
+    stops = [stop for stop in stops if stop != -1]
+    return sql[start + len(keyword):min(stops, default=len(sql))]
+
+
+def main_table(sql):
+    match = re.match(rf"\s*{Q}(\w+){Q}", clause(sql, "FROM", ()))
+    return match.group(1) if match else None
+
+
+def select_items(sql):
+    """The top-level items of the SELECT list."""
+    items, depth, current = [], 0, ""
+    for char in clause(sql, "SELECT", ("FROM",)):
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if char == "," and depth == 0:
+            items.append(current)
+            current = ""
+        else:
+            current += char
+    return items + [current]
+
+
+def plan_issues(vendor, plan, sql):
+    """The Issues in an EXPLAIN result, in plan order and without repeats."""
+    issues = []
+    table = main_table(sql)
+    for row in plan:
+        if vendor == "mysql":
+            extra = row.get("Extra") or ""
+            if row.get("type") == "ALL":
+                issues.append(Issue(row.get("table"), FULL_SCAN))
+            if "Using filesort" in extra:
+                issues.append(Issue(row.get("table"), FILESORT))
+            if "Using temporary" in extra:
+                issues.append(Issue(row.get("table"), TEMPORARY))
+        elif vendor == "sqlite":
+            detail = row.get("detail") or ""
+            scan = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+            if scan and "INDEX" not in detail:
+                issues.append(Issue(scan.group(1), FULL_SCAN))
+            if "TEMP B-TREE FOR ORDER BY" in detail:
+                issues.append(Issue(table, FILESORT))
+            elif "TEMP B-TREE" in detail:
+                issues.append(Issue(table, TEMPORARY))
+        elif vendor == "postgresql":
+            line = next(iter(row.values()), "") or ""
+            scan = re.search(r"Seq Scan on (\w+)", line)
+            if scan:
+                issues.append(Issue(scan.group(1), FULL_SCAN))
+            if re.match(r"\s*(->\s*)?Sort\b", line):
+                issues.append(Issue(table, FILESORT))
+            if re.match(r"\s*(->\s*)?(HashAggregate|Materialize)\b", line):
+                issues.append(Issue(table, TEMPORARY))
+    return list(dict.fromkeys(issue for issue in issues if issue.table))
+
+
+def model_for_table(table):
+    for model in apps.get_models():
+        if model._meta.db_table == table:
+            return model
+    return None
+
+
+def columns(text, table, operator=""):
+    pattern = rf"{Q}{re.escape(table)}{Q}\.{Q}(\w+){Q}\s*{operator}"
+    return list(dict.fromkeys(re.findall(pattern, text, re.IGNORECASE)))
+
+
+def order_by_columns(sql, table):
+    """The table's columns in the top-level ORDER BY, resolving `ORDER BY 13`."""
+    found = []
+    items = None
+    for term in clause(sql, "ORDER BY", ("LIMIT", "OFFSET", "FOR UPDATE")).split(","):
+        term = term.strip()
+        if re.match(r"\d+\b", term):
+            items = items if items is not None else select_items(sql)
+            position = int(term.split()[0]) - 1
+            term = items[position] if position < len(items) else ""
+        found.extend(columns(term, table))
+    return list(dict.fromkeys(found))
+
+
+def existing_indexes(model):
+    """Column lists of the indexes the model already declares or implies."""
+    meta = model._meta
+    found = [[meta.pk.column]]
+    for field in meta.concrete_fields:
+        if field.unique or field.db_index:
+            found.append([field.column])
+    for index in meta.indexes:
+        found.append([meta.get_field(name.lstrip("-")).column for name in index.fields])
+    for constraint in meta.constraints:
+        if isinstance(constraint, models.UniqueConstraint) and constraint.fields:
+            found.append([meta.get_field(name).column for name in constraint.fields])
+    for fields in meta.unique_together:
+        found.append([meta.get_field(name).column for name in fields])
+    return found
+
+
+def propose_index(model, sql):
+    """
+    The composite index (a list of field names) that would serve `sql` on
+    `model`, or None when there is nothing to index or an index already
+    covers it.
+    """
+    table = model._meta.db_table
+    where = clause(sql, "WHERE", ("GROUP BY", "HAVING", "ORDER BY", "LIMIT", "FOR UPDATE"))
+    equality = columns(where, table, EQUALITY)
+    ordering = order_by_columns(sql, table)
+    ranged = [column for column in columns(where, table, RANGE) if column not in equality]
+    wanted = list(dict.fromkeys(equality + ordering + ranged[:1]))
+    # Every InnoDB secondary index already ends with the primary key.
+    wanted = [column for column in wanted if column != model._meta.pk.column]
+    if not wanted:
+        return None
+    for index in existing_indexes(model):
+        if index[:len(wanted)] == wanted:
+            return None
+
+    by_column = {field.column: field.name for field in model._meta.concrete_fields}
+    return [by_column[column] for column in wanted if column in by_column] or None
+
+
+def index_for(model, fields):
+    index = models.Index(fields=fields)
+    index.set_name_with_model(model)
+    return index
@@ -0,0 +1,110 @@
+"""
+Fast JSON (orjson) and optional MessagePack renderers and parsers for DRF.
+
+For the API's default (compact, non-ASCII-escaped) output ORJSONRenderer
+writes the same bytes as DRF's JSONRenderer with one exception: floats of
+magnitude below 1e-4 or from 1e16 up are spelled differently (0.00001 for
+1e-05, 1e16 for 1e+16), though they parse back to the same value.
+Datetimes, dates, times, Decimals and lazy strings are handed to DRF's own
+JSONEncoder so their formatting is unchanged, and NaN and infinities raise
+ValueError as they do under DRF's STRICT_JSON. Anything orjson cannot encode
+(integers wider than 64 bits, pretty-printed or ASCII-escaped output for the
+browsable API) falls back to the stdlib renderer.
+"""
+import math
+
+import orjson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:  # optional: MessagePack is only negotiated when installed
+    msgpack = None
+
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS
+    | orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_PASSTHROUGH_DATACLASS
+)
+
+_default = JSONEncoder().default
+
+
+def has_non_finite(data):
+    """True if a NaN or infinite float appears anywhere in the payload."""
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, dict):
+        return any(has_non_finite(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(has_non_finite(value) for value in data)
+    return False
+
+
+class ORJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        if indent is not None or not self.compact or self.ensure_ascii or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # orjson writes NaN and infinities as null; only then is the walk needed.
+        if b'null' in ret and has_non_finite(data):
+            raise ValueError('Out of range float values are not JSON compliant')
+
+        # Match JSONRenderer, which escapes these for JavaScript compatibility.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class ORJSONParser(JSONParser):
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        try:
+            raw = stream.read()
+            if encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+                raw = raw.decode(encoding)
+            return orjson.loads(raw)
+        except (orjson.JSONDecodeError, UnicodeDecodeError) as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Renders `application/msgpack`. Values that have no MessagePack type
+    (datetimes, Decimals, ...) are converted exactly as they are for JSON.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_default, use_bin_type=True, datetime=False)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, strict_map_key=False)
+        except Exception as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
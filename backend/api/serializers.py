@@ -1,9 +1,10 @@
 from django.contrib.auth.hashers import make_password
 from django.core.exceptions import PermissionDenied
 from django.db import IntegrityError, transaction
-from django.db.models import Q, Avg
+from django.db.models import Avg, Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
-from datetime import timedelta, datetime
+from datetime import date, timedelta, datetime
 import pytz
 
 from .models import (
@@ -17,6 +18,8 @@ from .models import (
 )
 from .utils.calling_codes import CALLING_CODES
 from .utils.phone_format import format_phone_number, deformat_phone_number
+from .utils.booking_days import today
+from . import analytics, identity, occupancy, sharding
 
 
 # =========================================================
@@ -126,10 +129,40 @@ class VenueSerializer(serializers.ModelSerializer):
 
         return data
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Annotates the space counts and average rating used by `summary` and
+        `average_rating`, so listing venues costs one query instead of three
+        per venue.
+        """
+        spaces = Space.objects.filter(venue=OuterRef("pk")).order_by().values("venue")
+        ratings = (
+            Review.objects.filter(booking__space__venue=OuterRef("pk"))
+            .order_by()
+            .values("booking__space__venue")
+        )
+        return queryset.annotate(
+            total_spaces=Coalesce(
+                Subquery(spaces.annotate(c=Count("id")).values("c")), 0
+            ),
+            published_spaces=Coalesce(
+                Subquery(
+                    spaces.filter(is_published=True)
+                    .annotate(c=Count("id")).values("c")
+                ),
+                0,
+            ),
+            rating_avg=Subquery(ratings.annotate(a=Avg("rating")).values("a")),
+        )
+
     def get_summary(self, obj):
-        spaces = obj.spaces.all()
-        published = spaces.filter(is_published=True).count()
-        total = spaces.count()
+        if hasattr(obj, "total_spaces"):
+            total, published = obj.total_spaces, obj.published_spaces
+        else:
+            spaces = obj.spaces.all()
+            published = spaces.filter(is_published=True).count()
+            total = spaces.count()
         return {
             "total_spaces": total,
             "published_spaces": published,
@@ -138,10 +171,12 @@ class VenueSerializer(serializers.ModelSerializer):
 
     def get_average_rating(self, obj):
         """Return the average rating for this venue or None if no reviews."""
-        from .models import Review
-        result = Review.objects.filter(
-            booking__space__venue=obj
-        ).aggregate(avg=Avg('rating'))['avg']
+        if hasattr(obj, "rating_avg"):
+            result = obj.rating_avg
+        else:
+            result = Review.objects.filter(
+                booking__space__venue=obj
+            ).aggregate(avg=Avg('rating'))['avg']
         # Round to one decimal place if not None
         return round(result, 1) if result is not None else None
 
@@ -172,6 +207,12 @@ class SpaceSerializer(serializers.ModelSerializer):
             "updated_at",
         ]
 
+    def __init__(self, *args, omit=(), **kwargs):
+        # `omit` drops output fields, e.g. amenities when they were not asked for.
+        super().__init__(*args, **kwargs)
+        for name in omit:
+            self.fields.pop(name)
+
     def validate(self, data):
         errors = {}
 
@@ -199,7 +240,9 @@ class SpaceSerializer(serializers.ModelSerializer):
             errors["cleaning_fee"] = "Cleaning fee cannot be negative."
 
         # ---------- WHOLE VENUE RULE ----------
-        venue = data.get("venue", getattr(self.instance, "venue", None))
+        venue = data.get("venue")
+        if venue is None and self.instance is not None:
+            venue = identity.related(self.instance, "venue")
         if venue and venue.venue_type == "WHOLE":
             qs = venue.spaces
             if self.instance:
@@ -212,6 +255,18 @@ class SpaceSerializer(serializers.ModelSerializer):
 
         return data
     
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Prefetches amenity names so listing spaces is a fixed number of queries."""
+        return queryset.prefetch_related(
+            Prefetch(
+                "space_amenities",
+                queryset=sharding.select_related(
+                    SpaceAmenity.objects.order_by("id"), "amenity"
+                ),
+            )
+        )
+
     def get_amenities(self, obj):
         """
         Return a list of amenity names for this space.
@@ -219,11 +274,11 @@ class SpaceSerializer(serializers.ModelSerializer):
         """
         if not getattr(obj, "amenities_enabled", False):
             return []
-        return list(
-            SpaceAmenity.objects.filter(space=obj)
-            .select_related("amenity")
-            .values_list("amenity__name", flat=True)
-        )
+        if "space_amenities" in getattr(obj, "_prefetched_objects_cache", {}):
+            return [sa.amenity.name for sa in obj.space_amenities.all()]
+        return list(sharding.values_list(
+            SpaceAmenity.objects.filter(space=obj), "amenity__name", flat=True
+        ))
 
 
 # =========================================================
@@ -276,7 +331,7 @@ class VenueCreateWithSpacesSerializer(serializers.Serializer):
         spaces_data = self.initial_data.get("spaces", [])
 
         try:
-            with transaction.atomic():
+            with transaction.atomic(using=sharding.shard_for_country(venue_data.get("country"))):
                 venue_serializer = VenueSerializer(data=venue_data)
                 venue_serializer.is_valid(raise_exception=True)
 
@@ -348,13 +403,13 @@ class VenueUpdateWithSpacesSerializer(serializers.Serializer):
     def update(self, instance, validated_data):
         request = self.context["request"]
 
-        if instance.owner != request.user:
+        if identity.related(instance, "owner") != request.user:
             raise PermissionDenied("You can only edit your own venue.")
 
         venue_data = validated_data["venue"]
         spaces_data = self.initial_data.get("spaces", [])
 
-        with transaction.atomic():
+        with transaction.atomic(using=sharding.current()):
             for field, value in venue_data.items():
                 setattr(instance, field, value)
             instance.save()
@@ -443,19 +498,7 @@ class BookingSerializer(serializers.ModelSerializer):
                 {"dates": "Booking must be between tomorrow and 7 days ahead."}
             )
 
-        start_dt = tz.localize(datetime.combine(
-            start_date, datetime.min.time()))
-        end_dt = tz.localize(datetime.combine(end_date, datetime.max.time()))
-
-        overlap = Booking.objects.filter(
-            space_id=space_id,
-            status__in=["ACCEPTED", "PENDING"],
-        ).filter(
-            Q(start_datetime__lt=end_dt) &
-            Q(end_datetime__gt=start_dt)
-        )
-
-        if overlap.exists():
+        if not occupancy.is_available(space_id, start_date, end_date):
             raise serializers.ValidationError(
                 {"dates": "This date range is already booked."}
             )
@@ -500,9 +543,14 @@ class ReviewSerializer(serializers.ModelSerializer):
             "created_at",
         ]
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Joins the booking, space and renter the derived fields read from."""
+        return sharding.select_related(queryset, "booking__space", "booking__renter")
+
     def get_venue(self, obj):
         try:
-            return obj.booking.space.venue.id
+            return obj.booking.space.venue_id
         except Exception:
             return None
 
@@ -518,3 +566,109 @@ class ReviewSerializer(serializers.ModelSerializer):
             return obj.booking.renter.name
         except Exception:
             return None
+
+
+# =========================================================
+# ANALYTICS
+# =========================================================
+
+class DateWindowSerializer(serializers.Serializer):
+    """
+    Validates an optional `from` / `to` date window from query parameters.
+    (`from` is a Python keyword, so the fields are attached in get_fields.)
+    """
+    max_days = None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields["from"] = serializers.DateField(required=False)
+        fields["to"] = serializers.DateField(required=False)
+        return fields
+
+    def default_window(self, start, end):
+        return start, end
+
+    def validate(self, data):
+        start, end = self.default_window(data.get("from"), data.get("to"))
+
+        # An open-ended window (end is None) runs from `start` onwards.
+        if end is not None and start > end:
+            raise serializers.ValidationError(
+                {"dates": "`from` must not be after `to`."}
+            )
+        if self.max_days and end is not None and (end - start).days + 1 > self.max_days:
+            raise serializers.ValidationError(
+                {"dates": f"Date range cannot exceed {self.max_days} days."}
+            )
+
+        data["from"], data["to"] = start, end
+        return data
+
+
+class AnalyticsQuerySerializer(DateWindowSerializer):
+    granularity = serializers.ChoiceField(
+        choices=list(analytics.GRANULARITIES), default="day"
+    )
+    max_days = analytics.MAX_RANGE_DAYS
+
+    def default_window(self, start, end):
+        # Default to the last 30 days ending today.
+        end = end or today()
+        start = start or end - timedelta(days=29)
+        return start, end
+
+
+class PopularQuerySerializer(DateWindowSerializer):
+    """Window and size of the venue ranking; defaults to the top 20 of the last 30 days."""
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+    max_days = analytics.MAX_RANGE_DAYS
+
+    def default_window(self, start, end):
+        end = end or today()
+        start = start or end - timedelta(days=29)
+        return start, end
+
+
+class ReservationQuerySerializer(DateWindowSerializer):
+    """
+    Window for a space's reservations: `from` defaults to today and `to` is
+    open-ended. `month` (YYYY-MM) switches to a one-month day bitmap.
+    """
+    month = serializers.RegexField(r"^\d{4}-(0[1-9]|1[0-2])$", required=False)
+
+    def default_window(self, start, end):
+        return start or today(), end
+
+    def validate(self, data):
+        month = data.get("month")
+        if month:
+            year, month_number = map(int, month.split("-"))
+            data["from"] = date(year, month_number, 1)
+            data["to"] = (data["from"] + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+            return data
+        return super().validate(data)
+
+
+# =========================================================
+# BULK HOST OPERATIONS (api/bulk.py)
+# =========================================================
+
+class SpaceBulkItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    is_published = serializers.BooleanField(required=False)
+    price_per_day = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+    def validate_price_per_day(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Price per day must be greater than 0.00.")
+        return value
+
+    def validate(self, data):
+        if len(data) == 1:
+            raise serializers.ValidationError("Give is_published and/or price_per_day.")
+        return data
+
+
+class BookingStatusItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=["ACCEPTED", "REJECTED"])
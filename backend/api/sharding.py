@@ -0,0 +1,476 @@
+"""
+Region sharding of venue data (DATABASE_SHARDS).
+
+    DATABASE_SHARDS = {"shard_sea": ["SG", "MY"], "shard_vn": ["VN"]}
+
+A venue and everything under it (spaces, their amenities, bookings, reviews,
+the occupancy ledger, the analytics and view rollups and the booking
+archive) lives in the database its country maps to; unmapped countries stay
+on "default".
+Users, amenities and id blocks are global and live on "default" only. Tasks
+and tombstones are LOCAL: they go to the database of the transaction that
+writes them, so they commit or roll back with it.
+
+ShardRouter sends each query to:
+- the database the current request or command is pinned to (pinned(); the
+  viewsets pin from the URL or body, see ShardPinMixin in api/views.py);
+- otherwise the instance's database: where it was loaded from, or for a new
+  row its venue's country or its parent row's database (locate());
+- otherwise "default". Unpinned list endpoints run once per database and
+  merge the results (fan_out).
+
+Rows on shards take their ids from blocks allocated on "default" (IdBlock),
+so an id names one venue, space or booking across every database and rows
+keep their ids when `manage.py reshard` moves a country. Joins from sharded
+into global tables cannot run on a shard, so select_related() and
+values_list() here fetch the global side with a second query.
+
+With DATABASE_SHARDS empty (the default) the router stands aside and none of
+this runs a query. locate() results are cached in the "default" cache; with
+a per-process cache, restart the web processes after resharding.
+"""
+import heapq
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+SHARDED_MODELS = {
+    "api.venue", "api.space", "api.spaceamenity", "api.booking", "api.review",
+    "api.archivedbooking", "api.spaceoccupancy", "api.spacedailystat",
+    "api.venuedailyviews", "api.spacedailyviews",
+}
+LOCAL_MODELS = {"api.tombstone", "tasks.task"}
+
+# The foreign key that places a new row of a sharded model (Venue goes by country).
+PARENTS = {
+    "api.space": "venue",
+    "api.spaceamenity": "space",
+    "api.booking": "space",
+    "api.review": "booking",
+    "api.archivedbooking": "space",
+    "api.spaceoccupancy": "space",
+    "api.spacedailystat": "space",
+    "api.venuedailyviews": "venue",
+    "api.spacedailyviews": "space",
+}
+
+# Venue data in insert order, with the lookup from each model to its venue
+# id. Ledger and rollup rows are renumbered by the database they move to.
+MOVED = [
+    ("api.venue", "id", False),
+    ("api.space", "venue_id", False),
+    ("api.spaceamenity", "space__venue_id", False),
+    ("api.booking", "space__venue_id", False),
+    ("api.review", "booking__space__venue_id", False),
+    ("api.archivedbooking", "space__venue_id", False),
+    ("api.spaceoccupancy", "space__venue_id", True),
+    ("api.spacedailystat", "space__venue_id", True),
+    ("api.venuedailyviews", "venue_id", True),
+    ("api.spacedailyviews", "space__venue_id", True),
+]
+
+ID_BLOCK_SIZE = 1000
+# Shard ids start above anything the old single database handed out.
+ID_OFFSET = 10 ** 9
+LOCATE_TTL = 60 * 60
+LOCATE_VERSION_KEY = "shard:locate:version"
+BATCH_SIZE = 100
+COPY_CHUNK_SIZE = 1000
+
+_pinned = ContextVar("shard_pinned", default=None)
+
+
+def shards():
+    return getattr(settings, "DATABASE_SHARDS", None) or {}
+
+
+def enabled():
+    return bool(shards())
+
+
+def databases():
+    """Every database that holds venue data, "default" first."""
+    return [DEFAULT_DB_ALIAS, *[alias for alias in shards() if alias != DEFAULT_DB_ALIAS]]
+
+
+def shard_for_country(country):
+    country = (country or "").strip().upper()
+    for alias, countries in shards().items():
+        if country in {code.upper() for code in countries}:
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+def is_sharded(model):
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def is_local(model):
+    return model._meta.label_lower in LOCAL_MODELS
+
+
+# =========================================================
+# PINNING
+# =========================================================
+
+def pinned_alias():
+    return _pinned.get()
+
+
+def current():
+    """The database sharded and local queries go to when nothing else says."""
+    return _pinned.get() or DEFAULT_DB_ALIAS
+
+
+def pin(alias):
+    """Pins this context to `alias` (None unpins); returns a token for unpin()."""
+    return _pinned.set(alias)
+
+
+def unpin(token):
+    _pinned.reset(token)
+
+
+@contextmanager
+def pinned(alias):
+    token = pin(alias)
+    try:
+        yield alias
+    finally:
+        unpin(token)
+
+
+def fan_out(function):
+    """Calls function() pinned to each database in turn; returns the results."""
+    results = []
+    for alias in databases():
+        with pinned(alias):
+            results.append(function())
+    return results
+
+
+def merge(lists, key, reverse=False):
+    """Merges lists that are each sorted by `key` into one sorted list."""
+    return list(heapq.merge(*lists, key=key, reverse=reverse))
+
+
+# =========================================================
+# LOCATING ROWS
+# =========================================================
+
+def locate(model, pk):
+    """
+    The database holding the `model` row `pk`: "default" when sharding is off
+    or no database has it, else found by probing each database once and
+    caching the answer.
+    """
+    if not enabled():
+        return DEFAULT_DB_ALIAS
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return DEFAULT_DB_ALIAS
+
+    version = cache.get_or_set(LOCATE_VERSION_KEY, 1, timeout=None)
+    key = f"shard:locate:{version}:{model._meta.label_lower}:{pk}"
+    alias = cache.get(key)
+    if alias is None:
+        for candidate in databases():
+            if model._base_manager.using(candidate).filter(pk=pk).exists():
+                alias = candidate
+                break
+        else:
+            return DEFAULT_DB_ALIAS
+        cache.set(key, alias, LOCATE_TTL)
+    return alias
+
+
+def forget_locations():
+    """Invalidates every cached locate() answer, after rows have moved."""
+    try:
+        cache.incr(LOCATE_VERSION_KEY)
+    except ValueError:
+        cache.set(LOCATE_VERSION_KEY, 2, timeout=None)
+
+
+def instance_db(instance):
+    """The database a sharded instance lives in, or will be saved to if new."""
+    if not instance._state.adding and instance._state.db is not None:
+        return instance._state.db
+    label = instance._meta.label_lower
+    if label == "api.venue":
+        return shard_for_country(instance.country)
+
+    field = instance._meta.get_field(PARENTS[label])
+    parent = field.get_cached_value(instance, None) if field.is_cached(instance) else None
+    if parent is not None:
+        return instance_db(parent)
+    if _pinned.get() is not None:
+        return _pinned.get()
+    return locate(field.related_model, getattr(instance, field.attname))
+
+
+# =========================================================
+# IDS
+# =========================================================
+
+_ids_lock = threading.Lock()
+_ids = {"next": 0, "end": 0}
+
+
+def _reset_ids():
+    _ids["next"] = _ids["end"] = 0
+
+
+# A forked worker must not hand out its parent's ids.
+os.register_at_fork(after_in_child=_reset_ids)
+
+
+def allocate_id():
+    """The next id from this process's block, taking a new block when it runs out."""
+    IdBlock = apps.get_model("api", "IdBlock")
+    with _ids_lock:
+        if _ids["next"] >= _ids["end"]:
+            block = IdBlock.objects.using(DEFAULT_DB_ALIAS).create()
+            _ids["next"] = ID_OFFSET + (block.pk - 1) * ID_BLOCK_SIZE
+            _ids["end"] = _ids["next"] + ID_BLOCK_SIZE
+        _ids["next"] += 1
+        return _ids["next"] - 1
+
+
+# =========================================================
+# JOINS INTO GLOBAL TABLES
+# =========================================================
+
+def global_split(model, lookup):
+    """
+    For a lookup that crosses from sharded into global tables, returns
+    (relation path, rest, global model), e.g. ("booking__renter", "name",
+    User) for Review "booking__renter__name"; otherwise None.
+    """
+    parts = lookup.split("__")
+    for index, part in enumerate(parts):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        if not field.is_relation or field.related_model is None or part != field.name:
+            return None
+        model = field.related_model
+        if not is_sharded(model) and not is_local(model):
+            return "__".join(parts[:index + 1]), "__".join(parts[index + 1:]), model
+    return None
+
+
+def select_related(queryset, *lookups):
+    """queryset.select_related(*lookups), prefetching the relations into global tables."""
+    if not enabled():
+        return queryset.select_related(*lookups)
+    joined, prefetched = [], []
+    for lookup in lookups:
+        split = global_split(queryset.model, lookup)
+        if split is None:
+            joined.append(lookup)
+            continue
+        head = split[0].rpartition("__")[0]
+        if head:
+            joined.append(head)
+        prefetched.append(split[0])
+    if joined:
+        queryset = queryset.select_related(*joined)
+    return queryset.prefetch_related(*prefetched) if prefetched else queryset
+
+
+def local_lookups(model, lookups):
+    """The lookups with each one into a global table replaced by its foreign key column."""
+    if not enabled():
+        return list(lookups)
+    result = []
+    for lookup in lookups:
+        split = global_split(model, lookup)
+        result.append(lookup if split is None else f"{split[0]}_id")
+    return result
+
+
+def join_global(model, lookups, rows):
+    """
+    Fills in the values of the row tuples (fetched with local_lookups()) for
+    the lookups into global tables, one query per such lookup.
+    """
+    if not enabled():
+        return rows
+    joins = []
+    for index, lookup in enumerate(lookups):
+        split = global_split(model, lookup)
+        if split is not None:
+            joins.append((index, split[2], split[1] or "pk"))
+    if not joins:
+        return rows
+
+    rows = [list(row) for row in rows]
+    for index, target, field in joins:
+        ids = {row[index] for row in rows} - {None}
+        values = dict(
+            target._base_manager.using(DEFAULT_DB_ALIAS)
+            .filter(pk__in=ids).values_list("pk", field)
+        ) if ids else {}
+        for row in rows:
+            row[index] = values.get(row[index])
+    return [tuple(row) for row in rows]
+
+
+def values_list(queryset, *lookups, flat=False):
+    """queryset.values_list(*lookups), evaluated, with lookups into global tables allowed."""
+    if not enabled():
+        return queryset.values_list(*lookups, flat=flat)
+    rows = join_global(
+        queryset.model, lookups, queryset.values_list(*local_lookups(queryset.model, lookups))
+    )
+    return [row[0] for row in rows] if flat else list(rows)
+
+
+def delete_owned(user):
+    """
+    Deletes the user's venues and bookings on the shards: a shard has no
+    foreign key to the user table, so deleting the user does not cascade there.
+    """
+    if not enabled():
+        return
+    Venue = apps.get_model("api", "Venue")
+    Booking = apps.get_model("api", "Booking")
+    ArchivedBooking = apps.get_model("api", "ArchivedBooking")
+    for alias in databases():
+        if alias == DEFAULT_DB_ALIAS:
+            continue
+        with pinned(alias), transaction.atomic(using=alias):
+            for model, field in ((Venue, "owner"), (Booking, "renter"), (ArchivedBooking, "renter")):
+                model.objects.using(alias).filter(**{field: user}).delete()
+
+
+# =========================================================
+# RESHARDING
+# =========================================================
+
+@contextmanager
+def preserved_timestamps(models):
+    """Lets rows be copied with their created_at/updated_at instead of fresh ones."""
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for model in models for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def copy_rows(model, queryset, target, renumber):
+    fields = [
+        field.attname for field in model._meta.concrete_fields
+        if not (renumber and field.primary_key)
+    ]
+    rows = queryset.order_by("pk").values(*fields).iterator(chunk_size=COPY_CHUNK_SIZE)
+    chunk = []
+    for row in rows:
+        chunk.append(model(**row))
+        if len(chunk) >= COPY_CHUNK_SIZE:
+            model._base_manager.using(target).bulk_create(chunk)
+            chunk = []
+    if chunk:
+        model._base_manager.using(target).bulk_create(chunk)
+
+
+def move_batch(country, source, target, batch_size=BATCH_SIZE):
+    """
+    Moves up to `batch_size` of the country's venues on `source`, with
+    everything under them, to `target`; returns how many venues moved.
+
+    The venues and their spaces stay locked on `source` for the batch, so no
+    booking can land on them mid-move. The copy commits before the source
+    rows are deleted: a run that dies in between leaves venues on both
+    databases, and the next run deletes those from `source` without copying.
+    """
+    Venue = apps.get_model("api", "Venue")
+    Space = apps.get_model("api", "Space")
+    moved = [(apps.get_model(label), lookup, renumber) for label, lookup, renumber in MOVED]
+
+    with transaction.atomic(using=source):
+        ids = list(
+            Venue._base_manager.using(source).select_for_update()
+            .filter(country__iexact=country).order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        list(Space._base_manager.using(source).select_for_update()
+             .filter(venue_id__in=ids).values_list("id", flat=True))
+
+        copied = set(
+            Venue._base_manager.using(target).filter(id__in=ids).values_list("id", flat=True)
+        )
+        pending = [venue_id for venue_id in ids if venue_id not in copied]
+        if pending:
+            with transaction.atomic(using=target), preserved_timestamps([m for m, _, _ in moved]):
+                for model, lookup, renumber in moved:
+                    queryset = model._base_manager.using(source).filter(**{f"{lookup}__in": pending})
+                    copy_rows(model, queryset, target, renumber)
+
+        for model, lookup, _ in reversed(moved):
+            rows = model._base_manager.using(source).filter(**{f"{lookup}__in": ids})
+            rows._raw_delete(source)
+    forget_locations()
+    return len(ids)
+
+
+# =========================================================
+# ROUTER
+# =========================================================
+
+class ShardRouter:
+    """Routes sharded and local models as described above; stands aside when sharding is off."""
+
+    def db_for_read(self, model, **hints):
+        if not enabled():
+            return None
+        instance = hints.get("instance")
+        if is_sharded(model):
+            # A related manager passes its source row, which may be global.
+            if instance is not None and is_sharded(type(instance)):
+                return instance_db(instance)
+            return current()
+        if is_local(model):
+            if isinstance(instance, model) and instance._state.db is not None:
+                return instance._state.db
+            return current()
+        return DEFAULT_DB_ALIAS
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not enabled():
+            return None
+        if not (is_sharded(type(obj1)) and is_sharded(type(obj2))):
+            return True
+        if obj1._state.adding or obj2._state.adding:
+            return True
+        return obj1._state.db == obj2._state.db
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db not in shards():
+            return None
+        if model_name is None:
+            # Data migrations of the api app run on every database.
+            return app_label == "api"
+        label = f"{app_label}.{model_name}"
+        return label in SHARDED_MODELS or label in LOCAL_MODELS
@@ -0,0 +1,97 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import identity, sharding
+from .events import publish_reservation_change
+from .models import (
+    Amenity, ArchivedBooking, Booking, Review, Space, SpaceAmenity, Tombstone, User, Venue,
+)
+from .occupancy import apply_occupancy_change
+from .tasks import apply_booking_rollup
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, created, raw=False, **kwargs):
+    """
+    Keeps side tables in step with every Booking write (API, admin or shell).
+    Runs inside the caller's transaction (on the booking's database), so a
+    failure rolls the booking back too. The ledger is updated inline; the
+    analytics rollup is deferred to a task enqueued in the same transaction,
+    and availability streams hear of the change once it commits.
+    """
+    if raw:
+        return
+
+    before = None if created else getattr(instance, "_loaded", None)
+    after = instance.snapshot()
+    with sharding.pinned(instance._state.db):
+        # The ledger goes first: a date conflict aborts before any other work.
+        apply_occupancy_change(instance.pk, before, after)
+        if before != after:
+            apply_booking_rollup.enqueue(before=before, after=after)
+            publish_reservation_change(instance, before, after)
+    instance._loaded = after
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance, **kwargs):
+    # Ledger rows cascade with the booking; the rollup and streams need telling.
+    before = getattr(instance, "_loaded", instance.snapshot())
+    with sharding.pinned(instance._state.db):
+        apply_booking_rollup.enqueue(before=before)
+        publish_reservation_change(instance, before, None)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Venue)
+@receiver(post_delete, sender=Space)
+@receiver(post_delete, sender=Amenity)
+@receiver(post_delete, sender=SpaceAmenity)
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=ArchivedBooking)
+@receiver(post_delete, sender=Review)
+def record_tombstone(sender, instance, **kwargs):
+    """
+    Feeds deletions, cascades included, to the delta-sync feeds (api/sync.py)
+    and the change export (api/export.py): one sender per exported table.
+    """
+    Tombstone.objects.using(instance._state.db).create(
+        resource=sender._meta.model_name, object_id=instance.pk
+    )
+
+
+@receiver(post_save, sender=Space)
+@receiver(post_delete, sender=Space)
+def space_changed(sender, instance, raw=False, **kwargs):
+    # Venue rows carry space counts, so the venue feed must see space changes.
+    if not raw:
+        Venue.objects.using(instance._state.db).filter(pk=instance.venue_id).update(
+            changed_at=timezone.now()
+        )
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed(sender, instance, raw=False, **kwargs):
+    # Venue rows carry the average rating.
+    if not raw:
+        Venue.objects.using(instance._state.db).filter(spaces__bookings=instance.booking_id).update(
+            changed_at=timezone.now()
+        )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Venue)
+@receiver(post_save, sender=Space)
+def identity_saved(sender, instance, raw=False, **kwargs):
+    # A row saved from another instance replaces the request's mapped copy.
+    if not raw and identity.peek(sender, instance.pk) is not None:
+        identity.remember(instance)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Venue)
+@receiver(post_delete, sender=Space)
+def identity_deleted(sender, instance, **kwargs):
+    identity.forget(instance)
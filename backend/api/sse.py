@@ -0,0 +1,207 @@
+"""
+Server-Sent Events streams of reservation changes, served at the ASGI layer:
+
+    GET /api/events/spaces/<id>/?token=<jwt>
+    GET /api/events/venues/<id>/?token=<jwt>
+
+The token may also come as an `Authorization: Bearer` header (EventSource
+cannot set headers, hence the query parameter). A stream opens with a
+`snapshot` event holding the reserved spans from today on, in the shape of
+GET /api/bookings/<space>/reservations/ (keyed by space id for a venue),
+then sends a `reservations` event per committed booking change (see
+api/events.py) and a comment line every SSE_HEARTBEAT_SECONDS. Deltas are
+idempotent, so one that races the snapshot is harmless to reapply. When a
+stream falls behind, it gets a fresh snapshot instead of the backlog.
+
+The streams bypass Django's request handling: an idle connection is two
+small asyncio tasks and a queue, with no thread and no database connection
+held. The database is touched only to authenticate and take a snapshot,
+on the shared executor. SSE_MAX_CONNECTIONS caps open streams per process.
+"""
+import asyncio
+import re
+from urllib.parse import parse_qs
+
+import orjson
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from . import occupancy, sharding
+from .events import RESYNC, get_broker
+from .jwt_utils import decode_token
+from .models import Space, User, Venue
+from .utils.booking_days import today
+
+STREAM_PATH = re.compile(r"^/api/events/(?P<kind>spaces|venues)/(?P<pk>\d+)/$")
+
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 3000
+MAX_CONNECTIONS = 10000
+
+
+def load_snapshot(kind, pk, user_id):
+    """Returns (status, snapshot); runs on a worker thread."""
+    try:
+        if user_id is None or not User.objects.filter(id=user_id).exists():
+            return 401, None
+        with sharding.pinned(sharding.locate(Space if kind == "spaces" else Venue, pk)):
+            return _snapshot(kind, pk)
+    finally:
+        connections.close_all()
+
+
+def _snapshot(kind, pk):
+    """The snapshot of a space or venue stream, on the pinned database."""
+    if kind == "spaces":
+        if not Space.objects.filter(pk=pk).exists():
+            return 404, None
+        dates = occupancy.reserved_dates(pk, today())
+        return 200, {"space": pk, "reservations": occupancy.merge_spans(dates)}
+
+    if not Venue.objects.filter(pk=pk, is_active=True).exists():
+        return 404, None
+    dates = {}
+    for space_id, day in (
+        occupancy.in_force().filter(space__venue_id=pk, date__gte=today())
+        .order_by("space_id", "date")
+        .values_list("space_id", "date")
+    ):
+        dates.setdefault(space_id, []).append(day)
+    return 200, {
+        "venue": pk,
+        "reservations": {
+            str(space_id): occupancy.merge_spans(days) for space_id, days in dates.items()
+        },
+    }
+
+
+def encode(event, data):
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+class EventStreamApp:
+    """ASGI middleware: serves STREAM_PATH itself and passes everything else on."""
+
+    def __init__(self, app):
+        self.app = app
+        self.open_streams = 0
+
+    async def __call__(self, scope, receive, send):
+        match = STREAM_PATH.match(scope.get("path", "")) if scope["type"] == "http" else None
+        if match is None:
+            return await self.app(scope, receive, send)
+
+        if scope["method"] != "GET":
+            return await self.reject(send, 405, {"allow": "GET"})
+        if self.open_streams >= getattr(settings, "SSE_MAX_CONNECTIONS", MAX_CONNECTIONS):
+            return await self.reject(send, 503, {"retry-after": str(RETRY_MS // 1000)})
+
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1")
+                   for name, value in scope.get("headers", [])}
+        payload = decode_token(self.token(scope, headers)) or {}
+        kind, pk = match["kind"], int(match["pk"])
+        channel = f"{kind[:-1]}:{pk}"
+
+        broker = get_broker()
+        if broker is None:
+            return await self.reject(send, 404, detail="Event streams are disabled.")
+
+        self.open_streams += 1
+        # Subscribe before the snapshot so no change can fall between them.
+        subscription = broker.subscribe([channel])
+        try:
+            status, snapshot = await self.snapshot(kind, pk, payload.get("user_id"))
+            if status != 200:
+                return await self.reject(send, status, cors=self.cors(headers))
+
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": self.encode_headers({
+                    "content-type": "text/event-stream",
+                    "cache-control": "no-cache",
+                    "x-accel-buffering": "no",
+                    **self.cors(headers),
+                }),
+            })
+            retry = getattr(settings, "SSE_RETRY_MS", RETRY_MS)
+            await send({
+                "type": "http.response.body",
+                "body": b"retry: %d\n\n" % retry + encode("snapshot", snapshot),
+                "more_body": True,
+            })
+
+            stream = asyncio.ensure_future(self.stream(subscription, send, kind, pk, payload))
+            disconnect = asyncio.ensure_future(self.wait_for_disconnect(receive))
+            done, pending = await asyncio.wait(
+                {stream, disconnect}, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in pending:
+                task.cancel()
+            for task in done:
+                task.result()
+        finally:
+            subscription.close()
+            self.open_streams -= 1
+
+    async def stream(self, subscription, send, kind, pk, payload):
+        heartbeat = getattr(settings, "SSE_HEARTBEAT_SECONDS", HEARTBEAT_SECONDS)
+        while True:
+            event = await subscription.get(timeout=heartbeat)
+            if event is None:
+                body = b": keepalive\n\n"
+            elif event is RESYNC:
+                status, snapshot = await self.snapshot(kind, pk, payload.get("user_id"))
+                if status != 200:
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+                    return
+                body = encode("snapshot", snapshot)
+            else:
+                body = encode("reservations", event)
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+
+    @staticmethod
+    async def wait_for_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    @staticmethod
+    async def snapshot(kind, pk, user_id):
+        # Not thread_sensitive: a per-request thread would live as long as the stream.
+        return await sync_to_async(load_snapshot, thread_sensitive=False)(kind, pk, user_id)
+
+    @staticmethod
+    def token(scope, headers):
+        auth = headers.get("authorization", "")
+        if auth.startswith("Bearer "):
+            return auth.split(" ", 1)[1].strip()
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        return query.get("token", [""])[0]
+
+    @staticmethod
+    def cors(headers):
+        origin = headers.get("origin")
+        if origin and origin in getattr(settings, "CORS_ALLOWED_ORIGINS", []):
+            return {"access-control-allow-origin": origin, "vary": "Origin"}
+        return {}
+
+    @staticmethod
+    def encode_headers(headers):
+        return [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+
+    async def reject(self, send, status, headers=None, cors=None, detail=None):
+        detail = detail or {
+            401: "Authentication credentials were not provided or are invalid.",
+            404: "Not found.",
+            405: "Method not allowed.",
+            503: "Too many open event streams; try again shortly.",
+        }.get(status, "")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": self.encode_headers({
+                "content-type": "application/json", **(headers or {}), **(cors or {}),
+            }),
+        })
+        await send({"type": "http.response.body", "body": orjson.dumps({"detail": detail})})
@@ -0,0 +1,121 @@
+"""
+Streaming list responses with constant memory.
+
+Rows are read in keyset-paginated batches on (-created_at, -id), so each batch
+is one indexed query and no driver ever buffers the full result; every batch
+is projected (api/projections.py), rendered and optionally gzipped before the
+next one is read. Peak memory depends on the batch size, not the result size.
+"""
+import zlib
+
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+
+from . import sharding
+from .renderers import ORJSONRenderer
+
+FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+BATCH_SIZE = 500
+
+_renderer = ORJSONRenderer()
+
+
+def keyset_batches(projection, queryset, batch_size=BATCH_SIZE):
+    """Yields lists of row tuples, newest first."""
+    created_index = projection.lookups.index("created_at")
+    id_index = projection.lookups.index("id")
+    rows = projection.rows(queryset.order_by("-created_at", "-id"))
+
+    last = None
+    while True:
+        page = rows
+        if last is not None:
+            page = page.filter(
+                Q(created_at__lt=last[0]) | Q(created_at=last[0], id__lt=last[1])
+            )
+        batch = list(page[:batch_size])
+        if batch:
+            yield batch
+        if len(batch) < batch_size:
+            return
+        last = (batch[-1][created_index], batch[-1][id_index])
+
+
+def render_chunks(projection, queryset, fmt, batch_size=BATCH_SIZE, on_batch=None):
+    """
+    Yields the encoded body, one chunk per batch: a JSON array or NDJSON
+    lines. `on_batch`, if given, is called with each batch's items as it is sent.
+    """
+    plan = projection.compile()
+    first = True
+
+    if fmt == "json":
+        yield b"["
+    for batch in keyset_batches(projection, queryset, batch_size):
+        items = projection.emit(batch, plan)
+        if on_batch is not None:
+            on_batch(items)
+        items = [_renderer.render(item) for item in items]
+        if fmt == "json":
+            chunk = b",".join(items)
+            yield chunk if first else b"," + chunk
+        else:
+            yield b"\n".join(items) + b"\n"
+        first = False
+    if fmt == "json":
+        yield b"]"
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def accepts_gzip(header):
+    """
+    Whether an Accept-Encoding header allows gzip: listed (or covered by
+    `*`) with a non-zero q-value, e.g. not for "gzip;q=0" or "*;q=0".
+    """
+    qvalues = {}
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding] = q
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qvalues:
+            return qvalues[coding] > 0
+    return False
+
+
+def streaming_list_response(request, projection, queryset, fmt, on_batch=None):
+    # The body is read after the view returns and ShardPinMixin has unpinned
+    # the request, so bind the rows to the database pinned now.
+    chunks = render_chunks(projection, queryset.using(sharding.current()), fmt, on_batch=on_batch)
+
+    gzip = accepts_gzip(request.headers.get("Accept-Encoding", ""))
+    if gzip:
+        chunks = gzip_chunks(chunks)
+
+    response = StreamingHttpResponse(chunks, content_type=FORMATS[fmt])
+    response["Vary"] = "Accept-Encoding"
+    if gzip:
+        response["Content-Encoding"] = "gzip"
+    return response
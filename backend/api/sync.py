@@ -0,0 +1,160 @@
+"""
+Delta-sync change feeds for list endpoints (`?updated_since=<watermark>`).
+
+A feed page holds the rows changed after the watermark (serialized like the
+list endpoint) and the ids of rows deleted or archived since, ordered on the
+indexed (<change field>, id) key of the resource table, by default
+(updated_at, id) (venues use changed_at, which also moves when their spaces
+or reviews change), and the (updated_at, id) key of the Tombstone table. The response carries the watermark to send next; a client that starts
+from an ISO datetime and keeps following the watermark sees every change
+exactly once, in time proportional to what changed.
+
+Changes younger than SYNC_SETTLE_SECONDS (setting, default 2) are left for
+the next page, so rows saved by a transaction that commits a moment later
+are not skipped.
+
+Tombstones are kept for SYNC_TOMBSTONE_DAYS (setting, default 30) and then
+deleted by `manage.py prune_tombstones`. A watermark older than that is
+rejected, since deletions before it may be gone: the client must sync again
+from scratch. An ISO datetime is always accepted, as a fresh start.
+"""
+import base64
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import BooleanField, ExpressionWrapper, Q, Value
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Tombstone
+
+PAGE_SIZE = 500
+SETTLE_SECONDS = 2
+TOMBSTONE_DAYS = 30
+
+# Within one updated_at, live rows sort before tombstones.
+ROW, TOMBSTONE = 0, 1
+# Id part of a key that means "after every entry at this updated_at".
+END = 2 ** 63 - 1
+
+
+class InvalidWatermark(ValueError):
+    pass
+
+
+def format_watermark(key):
+    updated_at, kind, pk = key
+    raw = f"{updated_at.isoformat()}|{kind}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def parse_watermark(value):
+    """
+    Accepts a watermark returned by a previous page, or an ISO 8601 datetime
+    (everything updated strictly after it).
+    """
+    updated_at = parse_datetime(value)
+    if updated_at is not None:
+        return (_aware(updated_at), TOMBSTONE, END)
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+        updated_at, kind, pk = raw.split("|")
+        key = (_aware(parse_datetime(updated_at)), int(kind), int(pk))
+    except (ValueError, TypeError) as e:
+        raise InvalidWatermark("Must be an ISO 8601 datetime or a watermark.") from e
+    if key[0] < tombstone_cutoff():
+        raise InvalidWatermark("This watermark has expired; sync again from an ISO 8601 datetime.")
+    return key
+
+
+def tombstone_cutoff():
+    days = getattr(settings, "SYNC_TOMBSTONE_DAYS", TOMBSTONE_DAYS)
+    return timezone.now() - timedelta(days=days)
+
+
+def prune_tombstones(before, using, batch_size=1000):
+    """Deletes up to `batch_size` tombstones on `using` older than `before`; returns how many."""
+    ids = list(
+        Tombstone.objects.using(using).filter(updated_at__lt=before)
+        .order_by("id").values_list("id", flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+    Tombstone.objects.using(using).filter(id__in=ids).delete()
+    return len(ids)
+
+
+def _aware(value):
+    if value is None:
+        raise ValueError
+    if timezone.is_naive(value):
+        return timezone.make_aware(value)
+    return value
+
+
+def after(key, kind, field="updated_at"):
+    """Filter for entries of `kind` whose (`field`, id) sorts after `key`."""
+    updated_at, key_kind, pk = key
+    later = Q(**{f"{field}__gt": updated_at})
+    if kind > key_kind:
+        return later | Q(**{field: updated_at})
+    if kind == key_kind and pk != END:
+        return later | Q(**{field: updated_at, "id__gt": pk})
+    return later
+
+
+def changes(resource, projection, queryset, since, archived=None, field="updated_at",
+            page_size=PAGE_SIZE):
+    """
+    One feed page for `resource`, keyed on its `field`. `queryset` must
+    include archived rows; those matching the `archived` Q are reported as
+    deleted.
+    """
+    settle = getattr(settings, "SYNC_SETTLE_SECONDS", SETTLE_SECONDS)
+    until = timezone.now() - timedelta(seconds=settle)
+
+    keys = list(
+        queryset.filter(after(since, ROW, field), **{f"{field}__lte": until})
+        .annotate(
+            sync_archived=ExpressionWrapper(archived, output_field=BooleanField())
+            if archived is not None else Value(False)
+        )
+        .order_by(field, "id")
+        .values_list(field, "id", "sync_archived")[:page_size]
+    )
+    tombstones = list(
+        Tombstone.objects.filter(after(since, TOMBSTONE), resource=resource, updated_at__lte=until)
+        .order_by("updated_at", "id")
+        .values_list("updated_at", "id", "object_id")[:page_size]
+    )
+    entries = sorted(
+        [((updated_at, ROW, pk), pk, "archived" if is_archived else None)
+         for updated_at, pk, is_archived in keys]
+        + [((updated_at, TOMBSTONE, pk), object_id, "deleted")
+           for updated_at, pk, object_id in tombstones],
+        key=lambda entry: entry[0],
+    )
+    has_more = len(entries) > page_size or page_size in (len(keys), len(tombstones))
+    entries = entries[:page_size]
+    if has_more:
+        watermark = entries[-1][0]
+    else:
+        # Nothing else is visible up to `until`, so later pages can start there.
+        watermark = max(since, (until, TOMBSTONE, END))
+
+    live_ids = [object_id for _, object_id, reason in entries if reason is None]
+    results = []
+    if live_ids:
+        results = projection.data(
+            queryset.filter(id__in=live_ids).order_by(field, "id")
+        )
+
+    return {
+        "results": results,
+        "deleted": [
+            {"id": object_id, "reason": reason}
+            for _, object_id, reason in entries if reason is not None
+        ],
+        "watermark": format_watermark(watermark),
+        "has_more": has_more,
+    }
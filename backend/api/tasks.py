@@ -0,0 +1,60 @@
+"""
+Deferred work for the api app, run by `manage.py run_workers` (see tasks/queue.py).
+"""
+from django.core.mail import send_mail
+from django.utils import timezone
+
+from tasks.queue import task
+
+from . import analytics, sharding
+from .models import Booking, Space, Venue
+from .utils.booking_days import local_date
+
+
+@task(queue="analytics")
+def apply_booking_rollup(before=None, after=None):
+    """Recomputes the SpaceDailyStat rows one booking change touched."""
+    if before == after:
+        return
+    affected = analytics.affected_days(
+        analytics.snapshot_from_payload(before),
+        analytics.snapshot_from_payload(after),
+    )
+    for space_id, days in affected.items():
+        with sharding.pinned(sharding.locate(Space, space_id)):
+            analytics.refresh_days(space_id, days)
+
+
+@task(queue="notifications", max_attempts=3)
+def notify_host_of_booking(booking_id):
+    """Emails the venue owner about a confirmed booking."""
+    with sharding.pinned(sharding.locate(Booking, booking_id)):
+        booking = (
+            sharding.select_related(Booking.objects.all(), "space__venue__owner", "renter")
+            .filter(pk=booking_id)
+            .first()
+        )
+    if booking is None:
+        return
+
+    venue = booking.space.venue
+    start = local_date(booking.start_datetime).isoformat()
+    end = local_date(booking.end_datetime).isoformat()
+    send_mail(
+        subject=f"New booking for {venue.name}",
+        message=(
+            f"{booking.renter.name} booked {booking.space.name} "
+            f"from {start} to {end} for {booking.total_price} {booking.currency}."
+        ),
+        from_email=None,
+        recipient_list=[venue.owner.email],
+    )
+
+
+@task(queue="default")
+def clean_up_archived_venue(venue_id):
+    """Unpublishes the spaces of a venue that is still archived."""
+    with sharding.pinned(sharding.locate(Venue, venue_id)):
+        Space.objects.filter(venue_id=venue_id, venue__is_active=False).update(
+            is_published=False, updated_at=timezone.now()
+        )
@@ -0,0 +1,1782 @@
+"""
+Query-budget regression harness.
+
+Every route in core/urls.py is exercised at two data sizes. A route fails if
+its query count grows with the amount of related data (an N+1), if it exceeds
+the budget declared for it below, if it runs the same SELECT twice in one
+request, or if a GET runs any query while a serializer is inside
+`to_representation` (a lazy relationship load). Lazy loads are reported with
+the stack trace of the code that triggered them; on write routes they only
+count towards the budget, since a single freshly saved instance has nothing
+prefetched.
+
+New routes must be added to ENDPOINTS; test_every_route_has_a_budget fails
+until they are.
+"""
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+import traceback
+from collections import Counter, namedtuple
+from concurrent.futures import Future
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.forms import model_to_dict, modelform_factory
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from asgiref.sync import sync_to_async
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError as DRFValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import (
+    analytics, archive, counters, export, holds, idempotency, middleware, occupancy, sharding,
+    streaming, sync, throttling,
+)
+from .admin import ESTIMATE_SQL, BookingAdminForm, EstimatedCountPaginator, IdFilter
+from .serializers import (
+    ReservationQuerySerializer, ReviewSerializer, SpaceSerializer, UserReadSerializer,
+    VenueSerializer,
+)
+from .events import RESYNC, LocalBroker
+from .expand import VENUE_EXPANSIONS, expand_venue, parse_expand
+from .jwt_utils import generate_token
+from .projections import review_projection, space_projection, user_projection, venue_projection
+from .renderers import ORJSONRenderer
+from .models import (
+    Amenity, ArchivedBooking, Booking, Review, Space, SpaceAmenity, SpaceDailyStat,
+    SpaceDailyViews, SpaceOccupancy, Tombstone, User, Venue, VenueDailyViews,
+)
+from .sse import EventStreamApp
+from .tasks import apply_booking_rollup, notify_host_of_booking
+from .throttling import TokenBucketThrottle
+from .utils import cache_lock
+from .utils.phone_format import (
+    build_prefix_trie, deformat_phone_number, match_country, normalize_phone_numbers,
+)
+from .utils.booking_days import day_bounds, today
+from .views import VenueViewSet
+from tasks.models import Task
+from tasks.queue import run_pending
+
+SIZES = (5, 50)
+# Delta-sync feeds are measured from the epoch, so every fixture row is a change.
+SINCE = "2000-01-01T00:00:00Z"
+
+# route: name of the URL pattern, or its path when the pattern is unnamed.
+# user: which fixture user authenticates ("host", "renter", "spare" or None).
+Endpoint = namedtuple("Endpoint", "route method path body user budget")
+
+ENDPOINTS = [
+    Endpoint("api/calling-codes/", "get", lambda d: "/api/calling-codes/", None, None, 0),
+    Endpoint("api/amenities/", "get", lambda d: "/api/amenities/?q=a", None, None, 1),
+    Endpoint("register", "post", lambda d: "/api/auth/register/",
+             lambda d: {"name": "new", "email": "new@example.com", "country": "TH",
+                        "phone": "0899999999", "password": "pw"}, None, 3),
+    Endpoint("login", "post", lambda d: "/api/auth/login/",
+             lambda d: {"email": d["host"].email, "password": "pw"}, None, 1),
+    Endpoint("me", "get", lambda d: "/api/auth/me/", None, "host", 1),
+    Endpoint("user-list", "get", lambda d: "/api/users/", None, None, 1),
+    Endpoint("user-detail", "get", lambda d: f"/api/users/{d['host'].id}/", None, None, 1),
+    Endpoint("user-detail", "patch", lambda d: f"/api/users/{d['spare'].id}/",
+             lambda d: {"name": "renamed"}, "spare", 4),
+    Endpoint("user-detail", "delete", lambda d: f"/api/users/{d['spare'].id}/",
+             None, "spare", 14),
+    Endpoint("venue-list", "get", lambda d: "/api/venues/", None, None, 1),
+    Endpoint("venue-list", "get", lambda d: "/api/venues/?stream=json", None, None, 1),
+    Endpoint("venue-list", "get", lambda d: f"/api/venues/?updated_since={SINCE}", None, None, 3),
+    Endpoint("venue-list", "post", lambda d: "/api/venues/",
+             lambda d: {"name": "Fresh", "venue_type": "GRID", "address": "1 Road",
+                        "city": "Bangkok", "province": "Bangkok", "country": "TH"},
+             "host", 5),
+    Endpoint("venue-detail", "get", lambda d: f"/api/venues/{d['venue'].id}/", None, None, 1),
+    Endpoint("venue-detail", "get",
+             lambda d: f"/api/venues/{d['venue'].id}/?expand=spaces,spaces.amenities,reservations,reviews",
+             None, None, 5),
+    Endpoint("venue-detail", "get", lambda d: f"/api/venues/{d['venue'].id}/?expand=spaces",
+             None, None, 2),
+    Endpoint("venue-detail", "patch", lambda d: f"/api/venues/{d['venue'].id}/",
+             lambda d: {"name": "Renamed", "venue_type": "GRID", "address": "1 Road",
+                        "city": "Bangkok", "province": "Bangkok", "country": "TH"},
+             "host", 3),
+    Endpoint("venue-detail", "delete", lambda d: f"/api/venues/{d['small_venue'].id}/",
+             None, "host", 16),
+    Endpoint("venue-create-with-spaces", "post", lambda d: "/api/venues/create-with-spaces/",
+             lambda d: {"venue": {"name": "Combo", "venue_type": "GRID", "address": "1 Road",
+                                  "city": "Bangkok", "province": "Bangkok", "country": "TH"},
+                        "spaces": [{"name": "A", "price_per_day": "10.00",
+                                    "have_amenity": True, "amenities": ["Wi-Fi"]},
+                                   {"name": "B", "price_per_day": "10.00"}]},
+             "host", 12),
+    Endpoint("venue-list-spaces", "get", lambda d: f"/api/venues/{d['venue'].id}/spaces/",
+             None, None, 3),
+    Endpoint("venue-soft-delete", "patch", lambda d: f"/api/venues/{d['small_venue'].id}/soft-delete/",
+             None, "host", 8),
+    Endpoint("venue-update-with-spaces", "patch",
+             lambda d: f"/api/venues/{d['small_venue'].id}/update-with-spaces/",
+             lambda d: {"venue": {"name": "Small", "venue_type": "GRID", "address": "1 Road",
+                                  "city": "Bangkok", "province": "Bangkok", "country": "TH"},
+                        "spaces": [{"id": d["small_space"].id, "name": "Only",
+                                    "price_per_day": "10.00"}]},
+             "host", 9),
+    Endpoint("venue-venue-analytics", "get",
+             lambda d: f"/api/venues/{d['venue'].id}/analytics/?granularity=week",
+             None, "host", 7),
+    Endpoint("venue-popular", "get", lambda d: "/api/venues/popular/", None, None, 2),
+    Endpoint("space-list", "get", lambda d: "/api/spaces/", None, None, 2),
+    Endpoint("space-list", "get", lambda d: f"/api/spaces/?updated_since={SINCE}", None, None, 4),
+    Endpoint("space-detail", "get", lambda d: f"/api/spaces/{d['space'].id}/", None, None, 2),
+    Endpoint("space-detail", "patch", lambda d: f"/api/spaces/{d['space'].id}/",
+             lambda d: {"name": "Renamed"}, "host", 7),
+    Endpoint("space-detail", "delete", lambda d: f"/api/spaces/{d['small_space'].id}/",
+             None, "host", 13),
+    Endpoint("booking-list-reservations", "get",
+             lambda d: f"/api/bookings/{d['space'].id}/reservations/", None, "renter", 3),
+    Endpoint("booking-list-reservations", "get",
+             lambda d: f"/api/bookings/{d['space'].id}/reservations/?from=2000-01-01",
+             None, "renter", 3),
+    Endpoint("space-bulk-update", "post", lambda d: "/api/spaces/bulk/",
+             lambda d: {"items": [{"id": d["space"].id, "is_published": False},
+                                  {"id": d["free_space"].id, "price_per_day": "12.50"}]},
+             "host", 6),
+    Endpoint("booking-bulk-status", "post", lambda d: "/api/bookings/bulk-status/",
+             lambda d: {"items": [{"id": d["pending"].id, "status": "REJECTED"}]},
+             "host", 7),
+    Endpoint("booking-list-reservations", "get",
+             lambda d: f"/api/bookings/{d['space'].id}/reservations/?month={today():%Y-%m}",
+             None, "renter", 3),
+    Endpoint("booking-confirm-booking", "post",
+             lambda d: f"/api/bookings/{d['free_space'].id}/confirm/",
+             lambda d: {"StartDate": str(today() + timedelta(days=1)),
+                        "EndDate": str(today() + timedelta(days=2)),
+                        "totalCost": "20.00"},
+             "renter", 14),
+    Endpoint("review-list", "get", lambda d: "/api/reviews/", None, None, 1),
+    Endpoint("review-list", "get", lambda d: f"/api/reviews/?venue={d['venue'].id}", None, None, 1),
+    Endpoint("review-list", "get", lambda d: "/api/reviews/?stream=ndjson", None, None, 1),
+    Endpoint("review-list", "get", lambda d: f"/api/reviews/?updated_since={SINCE}", None, None, 3),
+    Endpoint("review-list", "post", lambda d: "/api/reviews/",
+             lambda d: {"venue": d["venue"].id, "rating": 4, "comment": "ok"}, "renter", 7),
+    Endpoint("review-detail", "get", lambda d: f"/api/reviews/{d['review'].id}/", None, None, 1),
+    Endpoint("batch", "post", lambda d: "/api/batch/",
+             lambda d: [{"method": "GET", "path": f"/api/spaces/{d['space'].id}/"},
+                        {"method": "GET", "path": f"/api/reviews/?venue={d['venue'].id}"}],
+             "renter", 4),
+    Endpoint("api-root", "get", lambda d: "/api/", None, None, 0),
+]
+
+
+def api_routes(patterns=None, prefix=""):
+    """Yields the route key of every non-admin URL pattern."""
+    for pattern in patterns if patterns is not None else get_resolver().url_patterns:
+        if isinstance(pattern, URLResolver):
+            if str(pattern.pattern).startswith("admin/"):
+                continue
+            yield from api_routes(pattern.url_patterns, prefix + str(pattern.pattern))
+        elif isinstance(pattern, URLPattern):
+            yield pattern.name or prefix + str(pattern.pattern)
+
+
+def build_dataset(size):
+    """
+    A host with one large venue (`size` spaces, the first carrying `size`
+    reviewed bookings), `size` further venues, and `size` spare users.
+    """
+    password = make_password("pw")
+    users = User.objects.bulk_create(
+        User(name=f"user{i}", email=f"user{i}@example.com",
+             phone=f"+66800{i:06d}", password_hash=password)
+        for i in range(size + 3)
+    )
+    host, renter, spare = users[:3]
+
+    venue = Venue.objects.create(
+        name="Main", owner=host, venue_type="GRID", address="1 Road",
+        city="Bangkok", province="Bangkok", country="TH",
+    )
+    wifi, parking = Amenity.objects.bulk_create(
+        [Amenity(name="Wi-Fi"), Amenity(name="Parking")]
+    )
+    spaces = Space.objects.bulk_create(
+        Space(venue=venue, name=f"space{i}", price_per_day=Decimal("10.00"),
+              is_published=bool(i % 2), amenities_enabled=True)
+        for i in range(size)
+    )
+    SpaceAmenity.objects.bulk_create(
+        SpaceAmenity(space=space, amenity=amenity)
+        for space in spaces for amenity in (wifi, parking)
+    )
+    free_space = Space.objects.create(venue=venue, name="free", price_per_day=Decimal("10.00"))
+
+    for i in range(size):
+        Venue.objects.create(
+            name=f"Other{i}", owner=host, venue_type="WHOLE", address="1 Road",
+            city="Bangkok", province="Bangkok", country="TH",
+        )
+    small_venue = Venue.objects.create(
+        name="Small", owner=host, venue_type="GRID", address="1 Road",
+        city="Bangkok", province="Bangkok", country="TH",
+    )
+    small_space = Space.objects.create(venue=small_venue, name="Only", price_per_day=Decimal("10.00"))
+
+    first_day = today() - timedelta(days=size + 10)
+    reviews = []
+    for i in range(size + 1):
+        start, end = day_bounds(first_day + timedelta(days=i), first_day + timedelta(days=i))
+        booking = Booking.objects.create(
+            space=spaces[0], renter=renter, start_datetime=start,
+            end_datetime=end, total_price=Decimal("10.00"), status="ACCEPTED",
+        )
+        if i < size:  # leave the last booking unreviewed for review-list POST
+            reviews.append(Review(booking=booking, rating=1 + i % 5, comment="fine"))
+    reviews = Review.objects.bulk_create(reviews)
+
+    start, end = day_bounds(today() + timedelta(days=30), today() + timedelta(days=31))
+    pending = Booking.objects.create(
+        space=spaces[0], renter=renter, start_datetime=start,
+        end_datetime=end, total_price=Decimal("20.00"), status="PENDING",
+    )
+
+    return {
+        "host": host, "renter": renter, "spare": spare,
+        "venue": venue, "space": spaces[0], "free_space": free_space,
+        "small_venue": small_venue, "small_space": small_space,
+        "review": reviews[0], "pending": pending,
+    }
+
+
+class LazyLoadRecorder:
+    """
+    Records every query executed while a Serializer is inside
+    `to_representation`, with the stack that issued it.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.loads = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(self.local, "depth", 0):
+            self.loads.append((sql, "".join(traceback.format_stack(limit=25))))
+        return execute(sql, params, many, context)
+
+    def patch(self):
+        original = serializers.Serializer.to_representation
+        recorder = self
+
+        def to_representation(serializer, instance):
+            recorder.local.depth = getattr(recorder.local, "depth", 0) + 1
+            try:
+                return original(serializer, instance)
+            finally:
+                recorder.local.depth -= 1
+
+        return mock.patch.object(serializers.Serializer, "to_representation", to_representation)
+
+    def report(self):
+        return "\n\n".join(f"{sql}\n{stack}" for sql, stack in self.loads)
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    SYNC_SETTLE_SECONDS=-60,  # let delta-sync feeds see rows created just now
+)
+class QueryBudgetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()  # throttle buckets
+
+    def request(self, endpoint, data):
+        client = APIClient()
+        if endpoint.user:
+            client.credentials(
+                HTTP_AUTHORIZATION="Bearer " + generate_token(data[endpoint.user].id)
+            )
+        body = endpoint.body(data) if endpoint.body else None
+        response = getattr(client, endpoint.method)(endpoint.path(data), body, format="json")
+        if response.streaming:
+            # Streamed bodies run their queries while being consumed.
+            b"".join(response.streaming_content)
+        return response
+
+    def measure(self, endpoint, size):
+        """Returns (queries, response status, lazy loads) at one data size."""
+        recorder = LazyLoadRecorder()
+        with transaction.atomic():
+            data = build_dataset(size)
+            with CaptureQueriesContext(connection) as queries, \
+                    recorder.patch(), connection.execute_wrapper(recorder):
+                response = self.request(endpoint, data)
+            transaction.set_rollback(True)
+        return queries.captured_queries, response.status_code, recorder
+
+    def test_every_route_has_a_budget(self):
+        covered = {endpoint.route for endpoint in ENDPOINTS}
+        missing = sorted(set(api_routes()) - covered)
+        self.assertEqual(missing, [], "Routes without a declared query budget")
+
+    def test_query_counts_are_bounded(self):
+        for endpoint in ENDPOINTS:
+            label = f"{endpoint.method.upper()} {endpoint.route}"
+            with self.subTest(label):
+                counts = {}
+                for size in SIZES:
+                    queries, status_code, recorder = self.measure(endpoint, size)
+                    self.assertLess(status_code, 400, f"{label} returned {status_code}")
+                    # Rows are loaded once per request (api/identity.py).
+                    selects = Counter(q["sql"] for q in queries if q["sql"].startswith("SELECT"))
+                    repeated = [sql for sql, n in selects.items() if n > 1]
+                    self.assertEqual(repeated, [], f"{label} ran the same SELECT twice")
+                    if endpoint.method == "get" and recorder.loads:
+                        self.fail(
+                            f"{label}: {len(recorder.loads)} queries during "
+                            f"to_representation at size {size}:\n{recorder.report()}"
+                        )
+                    counts[size] = (len(queries), recorder)
+
+                (small, _), (large, recorder) = (counts[size] for size in SIZES)
+                self.assertEqual(
+                    large, small,
+                    f"{label}: query count grows with data size "
+                    f"({small} -> {large}); lazy loads:\n{recorder.report()}",
+                )
+                self.assertLessEqual(
+                    large, endpoint.budget,
+                    f"{label}: {large} queries exceeds budget of {endpoint.budget}; "
+                    f"lazy loads:\n{recorder.report()}",
+                )
+
+
+class OccupancyLedgerTests(TransactionTestCase):
+    """Runs in autocommit, like an admin or shell save outside any transaction."""
+
+    def setUp(self):
+        self.data = build_dataset(2)
+        self.pending = self.data["pending"]
+        self.cancelled = Booking.objects.create(
+            space=self.pending.space, renter=self.data["spare"],
+            start_datetime=self.pending.start_datetime, end_datetime=self.pending.end_datetime,
+            total_price=Decimal("20.00"), status="CANCELLED",
+        )
+
+    def test_reactivating_over_taken_dates_keeps_the_row_and_the_ledger(self):
+        ledger = list(SpaceOccupancy.objects.order_by("date").values_list("date", "booking_id"))
+        self.assertTrue(SpaceOccupancy.objects.filter(booking=self.pending).exists())
+
+        self.cancelled.status = "ACCEPTED"
+        with self.assertRaises(occupancy.DatesUnavailable):
+            self.cancelled.save()
+
+        self.cancelled.refresh_from_db()
+        self.assertEqual(self.cancelled.status, "CANCELLED")
+        self.assertEqual(
+            list(SpaceOccupancy.objects.order_by("date").values_list("date", "booking_id")),
+            ledger,
+        )
+
+    def test_admin_form_reports_taken_dates(self):
+        Form = modelform_factory(Booking, form=BookingAdminForm, fields="__all__")
+        data = {
+            **model_to_dict(self.cancelled), "status": "ACCEPTED",
+            "start_datetime": self.cancelled.start_datetime,
+            "end_datetime": self.cancelled.end_datetime,
+        }
+        form = Form(data=data, instance=self.cancelled)
+        self.assertFalse(form.is_valid())
+        self.assertIn("already booked", str(form.non_field_errors()))
+
+        self.assertTrue(Form(data={**data, "status": "CANCELLED"}, instance=self.cancelled).is_valid())
+
+
+class ReservationWindowTests(SimpleTestCase):
+
+    def test_spans_join_adjacent_and_overlapping_days_of_any_booking(self):
+        days = [date(2024, 1, d) for d in (1, 2, 2, 3, 5, 7, 8)]
+        self.assertEqual(occupancy.merge_spans(days), [
+            {"start": "2024-01-01", "end": "2024-01-03"},
+            {"start": "2024-01-05", "end": "2024-01-05"},
+            {"start": "2024-01-07", "end": "2024-01-08"},
+        ])
+        self.assertEqual(
+            occupancy.merge_spans([date(2024, 1, 31), date(2024, 2, 1)]),
+            [{"start": "2024-01-31", "end": "2024-02-01"}],
+        )
+        self.assertEqual(occupancy.merge_spans([]), [])
+
+    def test_bitmap_covers_the_window_and_ignores_days_outside_it(self):
+        start, end = date(2024, 2, 1), date(2024, 2, 29)
+        days = [date(2024, 1, 31), date(2024, 2, 1), date(2024, 2, 29), date(2024, 3, 1)]
+        bitmap = occupancy.day_bitmap(days, start, end)
+        self.assertEqual(len(bitmap), 29)
+        self.assertEqual(bitmap, "1" + "0" * 27 + "1")
+        self.assertEqual(occupancy.day_bitmap([], start, start), "0")
+        self.assertEqual(occupancy.day_bitmap([], end, start), "")
+
+    def test_month_query_spans_the_whole_calendar_month(self):
+        for month, last in (("2024-02", 29), ("2023-02", 28), ("2024-12", 31), ("2024-04", 30)):
+            query = ReservationQuerySerializer(data={"month": month})
+            self.assertTrue(query.is_valid(), query.errors)
+            year, number = map(int, month.split("-"))
+            self.assertEqual((query.validated_data["from"], query.validated_data["to"]),
+                             (date(year, number, 1), date(year, number, last)))
+        self.assertFalse(ReservationQuerySerializer(data={"month": "2024-13"}).is_valid())
+
+
+class PhoneFormatTests(SimpleTestCase):
+
+    def test_longest_prefix_picks_the_country_sharing_a_calling_code(self):
+        for phone, country in (
+            ("+18095551234", "DO"), ("+12125551234", "US"), ("+14165551234", "CA"),
+            ("+77012345678", "KZ"), ("+74951234567", "RU"),
+            ("+441481234567", "GG"), ("+442071234567", "UK"),
+            ("+66812345678", "TH"), ("+999123456789", None), ("", None),
+        ):
+            with self.subTest(phone):
+                self.assertEqual(match_country(phone), country)
+
+    def test_the_first_country_listed_keeps_a_shared_prefix(self):
+        trie = build_prefix_trie({
+            "AA": {"code": "+1"}, "BB": {"code": "+1"}, "CC": {"code": "+1", "area_codes": ["2"]},
+        })
+        self.assertEqual(trie["1"][None], "AA")
+        self.assertEqual(trie["1"]["2"][None], "CC")
+
+    def test_deformat_restores_the_trunk_zero(self):
+        self.assertEqual(deformat_phone_number(mock.Mock(phone="+441481234567")),
+                         {"country": "GG", "phone": "01481234567"})
+        self.assertEqual(deformat_phone_number(mock.Mock(phone="+18095551234")),
+                         {"country": "DO", "phone": "8095551234"})
+
+    def test_normalize_phone_numbers_reports_each_failure(self):
+        normalized, errors = normalize_phone_numbers([
+            "0044 (0)20 7123 4567", "+66 081 234 5678", "081-234-5678", "+1 809 555 1234",
+            "abc", "+999123456789", "12",
+        ], "TH")
+        self.assertEqual(normalized, {
+            "0044 (0)20 7123 4567": "+442071234567",
+            "+66 081 234 5678": "+66812345678",
+            "081-234-5678": "+66812345678",
+            "+1 809 555 1234": "+18095551234",
+        })
+        self.assertEqual(errors, {
+            "abc": "Phone number must contain digits only.",
+            "+999123456789": "Could not match phone number to any country prefix.",
+            "12": "Phone number length is invalid.",
+        })
+        self.assertEqual(normalize_phone_numbers(["0812345678"]),
+                         ({}, {"0812345678": "Phone number has no country code."}))
+
+
+class RendererTests(TestCase):
+
+    def test_orjson_output_is_byte_identical_to_drf(self):
+        data = build_dataset(2)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Bearer " + generate_token(data["host"].id))
+        payloads = [
+            client.get(path).data for path in (
+                "/api/venues/", f"/api/venues/{data['venue'].id}/?expand=spaces,reviews",
+                "/api/spaces/", "/api/reviews/", "/api/users/",
+                f"/api/venues/{data['venue'].id}/analytics/",
+            )
+        ]
+        payloads.append({
+            "text": "Bangkok \u0e01\u0e23\u0e38\u0e07\u0e40\u0e17\u0e1e \u2028\u2029 \"q\" \\ \n",
+            "numbers": [0, -1, 2 ** 63 - 1, 0.5, 0.1, -0.0, 0.0001, 123456789.125],
+            "decimal": Decimal("10.50"), "when": timezone.now(), "day": today(),
+            "empty": [{}, [], None, True, False],
+        })
+        for payload in payloads:
+            with self.subTest(payload=str(payload)[:60]):
+                self.assertEqual(ORJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+    def test_floats_match_drf_in_value_and_non_finite_ones_are_rejected(self):
+        for value in (1e16, 1.5e300, 1e-05):
+            self.assertEqual(json.loads(ORJSONRenderer().render({"x": value})), {"x": value})
+        for value in (float("nan"), float("inf"), float("-inf")):
+            for renderer in (ORJSONRenderer(), JSONRenderer()):
+                with self.assertRaises(ValueError):
+                    renderer.render({"rows": [{"rate": value, "note": None}]})
+
+
+class ProjectionTests(TestCase):
+
+    def test_projected_lists_equal_the_serializer_output(self):
+        data = build_dataset(3)
+        # Nulls, disabled amenities, an archived venue and a review without a comment.
+        Space.objects.filter(pk=data["free_space"].pk).update(amenities_enabled=False)
+        Venue.objects.filter(pk=data["small_venue"].pk).update(is_active=False, description="\u0e01")
+        Review.objects.filter(pk=data["review"].pk).update(comment="")
+        cases = [
+            ("venues", VenueSerializer, venue_projection,
+             VenueSerializer.setup_eager_loading(Venue.objects.order_by("-created_at"))),
+            ("spaces", SpaceSerializer, space_projection,
+             SpaceSerializer.setup_eager_loading(Space.objects.order_by("-created_at"))),
+            ("reviews", ReviewSerializer, review_projection,
+             ReviewSerializer.setup_eager_loading(Review.objects.order_by("-created_at"))),
+            ("users", UserReadSerializer, user_projection, User.objects.order_by("-created_at")),
+        ]
+        renderer = JSONRenderer()
+        for label, serializer_class, projection, queryset in cases:
+            with self.subTest(label):
+                expected = serializer_class(queryset, many=True).data
+                projected = projection.data(queryset)
+                self.assertGreater(len(projected), 2)
+                self.assertEqual(projected, [dict(item) for item in expected])
+                self.assertEqual(renderer.render(projected), renderer.render(expected))
+
+    def test_list_endpoints_serve_the_projection(self):
+        data = build_dataset(2)
+        client = APIClient()
+        for path, serializer_class, queryset in (
+            ("/api/venues/", VenueSerializer, VenueSerializer.setup_eager_loading(
+                Venue.objects.filter(is_active=True).order_by("-created_at"))),
+            ("/api/spaces/", SpaceSerializer, SpaceSerializer.setup_eager_loading(
+                Space.objects.order_by("-created_at"))),
+            (f"/api/reviews/?venue={data['venue'].id}", ReviewSerializer,
+             ReviewSerializer.setup_eager_loading(Review.objects.order_by("-created_at"))),
+            ("/api/users/", UserReadSerializer, User.objects.order_by("-created_at")),
+        ):
+            with self.subTest(path):
+                response = client.get(path)
+                self.assertEqual(response.content,
+                                 JSONRenderer().render(serializer_class(queryset, many=True).data))
+
+
+class StreamingTests(TestCase):
+
+    def setUp(self):
+        self.data = build_dataset(3)
+        self.client = APIClient()
+        self.expected = self.client.get("/api/reviews/").json()
+
+    def body(self, response):
+        body = b"".join(response.streaming_content)
+        if response.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return body
+
+    def test_json_and_ndjson_streams_carry_the_list(self):
+        response = self.client.get("/api/reviews/?stream=json")
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(json.loads(self.body(response)), self.expected)
+
+        response = self.client.get("/api/reviews/?stream=ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = self.body(response).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.expected)
+
+    def test_gzip_follows_the_accept_encoding_qvalues(self):
+        for header, compressed in (("gzip", True), ("deflate, gzip;q=0.5", True),
+                                   ("gzip;q=0", False), ("br, *;q=0.1", True),
+                                   ("*;q=0", False), ("identity", False), ("", False)):
+            with self.subTest(header):
+                response = self.client.get("/api/reviews/?stream=json",
+                                           HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(response.get("Content-Encoding") == "gzip", compressed)
+                self.assertEqual(json.loads(self.body(response)), self.expected)
+
+    def test_batches_page_through_rows_sharing_a_timestamp(self):
+        Review.objects.update(created_at=timezone.now())
+        queryset = ReviewSerializer.setup_eager_loading(Review.objects.all())
+        body = b"".join(streaming.render_chunks(review_projection, queryset, "json", batch_size=2))
+        self.assertEqual(
+            [item["id"] for item in json.loads(body)],
+            sorted(Review.objects.values_list("id", flat=True), reverse=True),
+        )
+        self.assertEqual(b"".join(streaming.render_chunks(
+            review_projection, Review.objects.none(), "ndjson")), b"")
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class SyncTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.data = build_dataset(3)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + generate_token(self.data["host"].id))
+
+    def follow(self, resource, since=SINCE):
+        """Every page from `since`: (result ids, deleted entries, next watermark)."""
+        ids, deleted = [], []
+        while True:
+            response = self.client.get(f"/api/{resource}/", {"updated_since": since})
+            self.assertEqual(response.status_code, 200, response.content)
+            page = response.json()
+            ids += [item["id"] for item in page["results"]]
+            deleted += page["deleted"]
+            since = page["watermark"]
+            if not page["has_more"]:
+                return ids, deleted, since
+
+    def test_pages_see_every_row_once_across_updated_at_ties(self):
+        Space.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        Tombstone.objects.create(resource="space", object_id=999)
+        Tombstone.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+
+        ids, deleted = [], []
+        since = sync.parse_watermark(SINCE)
+        queryset = SpaceSerializer.setup_eager_loading(Space.objects.all())
+        while True:
+            page = sync.changes("space", space_projection, queryset, since, page_size=2)
+            self.assertLessEqual(len(page["results"]) + len(page["deleted"]), 2)
+            ids += [item["id"] for item in page["results"]]
+            deleted += page["deleted"]
+            since = sync.parse_watermark(page["watermark"])
+            if not page["has_more"]:
+                break
+        self.assertCountEqual(ids, Space.objects.values_list("id", flat=True))
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(deleted, [{"id": 999, "reason": "deleted"}])
+
+        # Nothing changed since, so the next page is empty.
+        page = sync.changes("space", space_projection, queryset, since)
+        self.assertEqual((page["results"], page["deleted"]), ([], []))
+
+    def test_spaces_removed_by_update_with_spaces_are_reported_deleted(self):
+        venue, space, free_space = self.data["venue"], self.data["space"], self.data["free_space"]
+        _, _, spaces_since = self.follow("spaces")
+        _, _, reviews_since = self.follow("reviews")
+        _, _, venues_since = self.follow("venues")
+        updated_at = Venue.objects.get(pk=venue.pk).updated_at
+        kept = list(venue.spaces.exclude(pk=space.pk).values("id", "name", "price_per_day"))
+
+        response = self.client.patch(f"/api/venues/{venue.id}/update-with-spaces/", {
+            "venue": {"name": "Main", "venue_type": "GRID", "address": "1 Road",
+                      "city": "Bangkok", "province": "Bangkok", "country": "TH"},
+            "spaces": [{**row, "price_per_day": str(row["price_per_day"])} for row in kept],
+        }, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertFalse(Space.objects.filter(pk=space.pk).exists())
+
+        ids, deleted, _ = self.follow("spaces", spaces_since)
+        self.assertIn({"id": space.id, "reason": "deleted"}, deleted)
+        self.assertNotIn(space.id, ids)
+        self.assertIn(free_space.id, ids)
+        # The space's reviews went with it.
+        _, deleted, _ = self.follow("reviews", reviews_since)
+        self.assertIn({"id": self.data["review"].id, "reason": "deleted"}, deleted)
+        ids, _, _ = self.follow("venues", venues_since)
+        self.assertEqual(ids, [venue.id])
+        self.assertGreater(Venue.objects.get(pk=venue.pk).updated_at, updated_at)
+
+    def test_space_and_review_changes_move_the_venue_feed_not_updated_at(self):
+        venue = self.data["venue"]
+        _, _, since = self.follow("venues")
+        before = Venue.objects.get(pk=venue.pk)
+
+        Review.objects.get(pk=self.data["review"].pk).delete()
+        free_space = self.data["free_space"]
+        free_space.name = "renamed"
+        free_space.save()
+
+        ids, _, _ = self.follow("venues", since)
+        self.assertEqual(ids, [venue.id])
+        after = Venue.objects.get(pk=venue.pk)
+        self.assertEqual(after.updated_at, before.updated_at)
+        self.assertGreater(after.changed_at, before.changed_at)
+
+    def test_archived_venues_are_reported_deleted(self):
+        small_venue = self.data["small_venue"]
+        _, _, since = self.follow("venues")
+        response = self.client.patch(f"/api/venues/{small_venue.id}/soft-delete/")
+        self.assertEqual(response.status_code, 200, response.content)
+
+        ids, deleted, _ = self.follow("venues", since)
+        self.assertEqual(deleted, [{"id": small_venue.id, "reason": "archived"}])
+        self.assertEqual(ids, [])
+
+    @override_settings(SYNC_TOMBSTONE_DAYS=30)
+    def test_old_tombstones_are_pruned_and_their_watermarks_rejected(self):
+        old = timezone.now() - timedelta(days=31)
+        Tombstone.objects.create(resource="space", object_id=1)
+        Tombstone.objects.create(resource="space", object_id=2)
+        Tombstone.objects.filter(object_id=1).update(updated_at=old)
+
+        out = io.StringIO()
+        call_command("prune_tombstones", stdout=out)
+        self.assertIn("Deleted 1 tombstone(s).", out.getvalue())
+        self.assertEqual(list(Tombstone.objects.values_list("object_id", flat=True)), [2])
+
+        expired = sync.format_watermark((old, sync.ROW, 1))
+        response = self.client.get("/api/spaces/", {"updated_since": expired})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("expired", str(response.json()["updated_since"]))
+        # A datetime is a fresh start, however old.
+        response = self.client.get("/api/spaces/", {"updated_since": old.isoformat()})
+        self.assertEqual(response.status_code, 200)
+
+
+class InlineExecutor:
+    """Runs export_changes' table workers in this process, on the test database."""
+
+    def __init__(self, max_workers=None, initializer=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+@override_settings(SYNC_TOMBSTONE_DAYS=30)
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.data = build_dataset(3)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.output = Path(self.directory.name)
+        for patcher in (
+            mock.patch("api.management.commands.export_changes.ProcessPoolExecutor", InlineExecutor),
+            mock.patch.object(export, "SETTLE_SECONDS", 0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def export(self, *args, **options):
+        call_command("export_changes", *args, output=str(self.output), chunk_size=2,
+                     stdout=io.StringIO(), stderr=io.StringIO(), **options)
+        return json.loads((self.output / export.WATERMARKS_FILE).read_text())
+
+    def rows(self, table):
+        """{run file name: [row ids]} of every file written for `table`."""
+        return {
+            path.name: [json.loads(line)["id"] for line in path.read_text().splitlines()]
+            for path in sorted((self.output / table).glob("dt=*/*.jsonl"))
+        }
+
+    def test_full_export_writes_every_row_once_in_chunks(self):
+        Space.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        watermarks = self.export()
+
+        files = self.rows("api_space")
+        self.assertEqual(len(files), 1)
+        ids, = files.values()
+        self.assertEqual(ids, list(Space.objects.order_by("id").values_list("id", flat=True)))
+        last = Space.objects.order_by("updated_at", "id").last()
+        self.assertEqual(watermarks["api.Space"], [last.updated_at.isoformat(), last.id])
+
+        # Empty tables write no file; excluded ones are never read.
+        tables = {model._meta.db_table for model in export.export_models()}
+        written = {path.name for path in self.output.iterdir() if path.is_dir()}
+        self.assertEqual(written, tables - {"api_archivedbooking", "api_tombstone"})
+        self.assertNotIn("api_spacedailystat", tables)
+        self.assertEqual(list(self.output.glob("**/*.tmp")), [])
+
+    def test_watermarks_export_only_changes_and_every_delete(self):
+        first = self.export()
+        venue, small_venue = self.data["venue"], self.data["small_venue"]
+        small_venue_id, small_space_id = small_venue.id, self.data["small_space"].id
+        amenity_ids = set(SpaceAmenity.objects.filter(space=self.data["space"])
+                          .values_list("id", flat=True))
+        venue.name = "Renamed"
+        venue.save()
+        small_venue.delete()
+        SpaceAmenity.objects.filter(space=self.data["space"]).delete()
+
+        second = self.export(since_watermark=True)
+        self.assertEqual(list(self.rows("api_venue").values())[-1], [venue.id])
+        self.assertEqual(len(self.rows("api_user")), 1)  # no users changed: no new file
+        self.assertEqual(second["api.User"], first["api.User"])
+        self.assertGreater(second["api.Venue"], first["api.Venue"])
+
+        tombstones = [
+            json.loads(line)
+            for path in sorted((self.output / "api_tombstone").glob("dt=*/*.jsonl"))[-1:]
+            for line in path.read_text().splitlines()
+        ]
+        deleted = {(row["resource"], row["object_id"]) for row in tombstones}
+        self.assertEqual(deleted, {
+            ("venue", small_venue_id), ("space", small_space_id),
+            *(("spaceamenity", amenity_id) for amenity_id in amenity_ids),
+        })
+
+    def test_a_failed_table_keeps_its_watermark_and_leaves_no_file(self):
+        first = self.export(models="venue,space")
+        Venue.objects.update(updated_at=timezone.now())
+        Space.objects.update(updated_at=timezone.now())
+
+        real_write = export.JSONLWriter.write
+
+        def write(writer, rows):
+            if "api_space" in writer.fh.name:
+                raise OSError("disk full")
+            real_write(writer, rows)
+
+        with mock.patch.object(export.JSONLWriter, "write", write):
+            with self.assertRaisesMessage(CommandError, "Export failed for: api.Space"):
+                self.export(since_watermark=True, models="venue,space")
+        watermarks = json.loads((self.output / export.WATERMARKS_FILE).read_text())
+        self.assertEqual(watermarks["api.Space"], first["api.Space"])
+        self.assertGreater(watermarks["api.Venue"], first["api.Venue"])
+        self.assertEqual(len(self.rows("api_space")), 1)
+        self.assertEqual(list(self.output.glob("**/*.tmp")), [])
+
+
+class BookingNotificationTests(TestCase):
+
+    def test_host_email_gives_the_bangkok_dates(self):
+        data = build_dataset(2)
+        start, end = day_bounds(date(2025, 3, 1), date(2025, 3, 2))
+        booking = Booking.objects.create(
+            space=data["space"], renter=data["spare"], start_datetime=start,
+            end_datetime=end, total_price=Decimal("40.00"), status="ACCEPTED",
+        )
+
+        notify_host_of_booking(booking_id=booking.id)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [data["venue"].owner.email])
+        self.assertIn("from 2025-03-01 to 2025-03-02", mail.outbox[0].body)
+
+
+class AnalyticsRollupTests(TestCase):
+
+    def setUp(self):
+        self.data = build_dataset(2)
+
+    def rollup(self):
+        """Non-empty rollup rows as {(space_id, date): (booked_days, revenue, booking_count)}."""
+        return {
+            (row.space_id, row.date): (row.booked_days, row.revenue, row.booking_count)
+            for row in SpaceDailyStat.objects.all()
+            if (row.booked_days, row.revenue, row.booking_count) != (0, 0, 0)
+        }
+
+    def recomputed(self):
+        totals = {}
+        live, archived = archive.history()
+        for booking in [*live, *archived]:
+            snapshot = booking.snapshot()
+            for day, (booked, revenue, count) in analytics.booking_contributions(snapshot).items():
+                key = (snapshot["space_id"], day)
+                old = totals.get(key, (0, Decimal("0.00"), 0))
+                totals[key] = (old[0] + booked, old[1] + revenue, old[2] + count)
+        return totals
+
+    def test_rollup_matches_a_recompute_after_creates_updates_and_deletes(self):
+        space, free_space = self.data["space"], self.data["free_space"]
+        start, end = day_bounds(today() + timedelta(days=3), today() + timedelta(days=5))
+        booking = Booking.objects.create(
+            space=free_space, renter=self.data["renter"], start_datetime=start,
+            end_datetime=end, total_price=Decimal("100.00"), status="ACCEPTED",
+        )
+        run_pending()
+        self.assertEqual(self.rollup(), self.recomputed())
+
+        # Moved to another space and repriced; a pending booking is accepted.
+        booking.space = space
+        booking.total_price = Decimal("10.01")
+        booking.save()
+        pending = self.data["pending"]
+        pending.status = "ACCEPTED"
+        pending.save()
+        run_pending()
+        self.assertEqual(self.rollup(), self.recomputed())
+
+        booking.delete()
+        Booking.objects.filter(space=space).first().delete()
+        run_pending()
+        self.assertEqual(self.rollup(), self.recomputed())
+
+        call_command("backfill_analytics", stdout=io.StringIO())
+        self.assertEqual(self.rollup(), self.recomputed())
+
+    def test_rollup_converges_when_tasks_run_out_of_order_or_twice(self):
+        run_pending()
+        start, end = day_bounds(today() + timedelta(days=3), today() + timedelta(days=5))
+        booking = Booking.objects.create(
+            space=self.data["free_space"], renter=self.data["renter"], start_datetime=start,
+            end_datetime=end, total_price=Decimal("30.00"), status="ACCEPTED",
+        )
+        booking.status = "CANCELLED"
+        booking.save()
+        created, cancelled = Task.objects.filter(
+            name=apply_booking_rollup.name, status=Task.QUEUED).order_by("id")
+        # The cancellation's task runs first, then the creation's, then it again.
+        Task.objects.filter(pk=cancelled.pk).update(run_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(run_pending(), 2)
+        self.assertEqual(self.rollup(), self.recomputed())
+        apply_booking_rollup(**created.payload)
+        self.assertEqual(self.rollup(), self.recomputed())
+        self.assertFalse(SpaceDailyStat.objects.filter(
+            space=self.data["free_space"]).exclude(booked_days=0).exists())
+
+    def test_archived_bookings_stay_in_the_rollup(self):
+        space = self.data["space"]
+        old = Booking.objects.filter(space=space, status="ACCEPTED", review__isnull=True).first()
+        Booking.objects.filter(pk=old.pk).update(
+            start_datetime=old.start_datetime - timedelta(days=800),
+            end_datetime=old.end_datetime - timedelta(days=800),
+        )
+        call_command("backfill_analytics", stdout=io.StringIO())
+        self.assertEqual(archive.archive_batch(archive.cutoff()), 1)
+
+        # A new booking on the archived one's days recomputes them.
+        start, end = day_bounds(today() - timedelta(days=800), today() - timedelta(days=799))
+        Booking.objects.create(
+            space=space, renter=self.data["renter"], start_datetime=start,
+            end_datetime=end, total_price=Decimal("20.00"), status="ACCEPTED",
+        )
+        run_pending()
+        self.assertEqual(self.rollup(), self.recomputed())
+
+
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        self.data = build_dataset(2)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.settings = override_settings(
+            PROFILING_ENABLED=True, PROFILING_DIR=self.directory.name,
+            PROFILING_ALLOWED_USER_IDS=[self.data["host"].id],
+        )
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def get(self, user, **headers):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Bearer " + generate_token(user.id))
+        return client.get(f"/api/venues/{self.data['venue'].id}/", **headers)
+
+    def test_allowed_user_gets_a_profile_and_sql_report(self):
+        response = self.get(self.data["host"], HTTP_X_PROFILE="1")
+
+        profile_id = response["X-Profile-Id"]
+        directory = Path(self.directory.name)
+        pstats.Stats(str(directory / f"{profile_id}.pstats"))  # readable
+        report = json.loads((directory / f"{profile_id}.sql.json").read_text())
+        self.assertEqual((report["method"], report["status"]), ("GET", 200))
+        self.assertEqual(report["sql_count"], len(report["queries"]))
+        self.assertTrue(any("explain" in query for query in report["queries"]))
+
+    def test_other_users_and_unmarked_requests_are_not_profiled(self):
+        for response in (self.get(self.data["renter"], HTTP_X_PROFILE="1"),
+                         self.get(self.data["host"])):
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+
+class AdminChangeListTests(TestCase):
+
+    def setUp(self):
+        self.data = build_dataset(3)
+        self.client.force_login(get_user_model().objects.create_superuser(
+            "admin", "admin@example.com", "password"))
+
+    def changelist(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return response.context["cl"]
+
+    def test_id_filter_narrows_to_one_venue_and_keeps_other_parameters(self):
+        venue = self.data["venue"]
+        cl = self.changelist("/admin/api/booking/", venue_id=venue.id, status="ACCEPTED")
+        self.assertCountEqual(
+            [booking.id for booking in cl.result_list],
+            Booking.objects.filter(space__venue=venue, status="ACCEPTED").values_list("id", flat=True),
+        )
+        spec = next(spec for spec in cl.filter_specs if isinstance(spec, IdFilter))
+        choice, = spec.choices(cl)
+        self.assertFalse(choice["selected"])
+        self.assertEqual(choice["query_parts"], [("status", "ACCEPTED")])
+        self.assertNotIn("venue_id", choice["query_string"])
+
+        # Spaces filter on their own venue column.
+        cl = self.changelist("/admin/api/space/", venue_id=self.data["small_venue"].id)
+        self.assertEqual([space.id for space in cl.result_list], [self.data["small_space"].id])
+
+    def test_id_filter_ignores_values_that_are_not_ids(self):
+        cl = self.changelist("/admin/api/booking/", venue_id="abc")
+        self.assertEqual(cl.result_count, Booking.objects.count())
+
+    def test_paginator_counts_small_tables_exactly(self):
+        queryset = User.objects.order_by("id")
+        # SQLite has no estimate, so every list is counted.
+        self.assertEqual(EstimatedCountPaginator(queryset, 10).count, User.objects.count())
+        with mock.patch.dict(ESTIMATE_SQL, {"sqlite": "SELECT 3 WHERE %s IS NOT NULL"}):
+            self.assertEqual(EstimatedCountPaginator(queryset, 10).count, User.objects.count())
+
+    def test_paginator_uses_the_estimate_for_unfiltered_large_tables(self):
+        estimate = {"sqlite": "SELECT 50000 WHERE %s = 'api_user'"}
+        with mock.patch.dict(ESTIMATE_SQL, estimate), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(EstimatedCountPaginator(User.objects.order_by("id"), 10).count, 50000)
+        self.assertNotIn("COUNT(", queries[0]["sql"])
+        self.assertEqual(len(queries), 1)
+
+        filtered = User.objects.filter(pk=self.data["host"].pk).order_by("id")
+        with mock.patch.dict(ESTIMATE_SQL, estimate):
+            self.assertEqual(EstimatedCountPaginator(filtered, 10).count, 1)
+
+
+class ExpandTests(TestCase):
+
+    def setUp(self):
+        self.data = build_dataset(3)
+        self.venue = Venue.objects.get(pk=self.data["venue"].pk)
+
+    def test_parse_expand(self):
+        self.assertEqual(parse_expand(None), set())
+        self.assertEqual(parse_expand(" reviews, ,spaces.amenities"),
+                         {"reviews", "spaces", "spaces.amenities"})
+        with self.assertRaises(DRFValidationError) as raised:
+            parse_expand("spaces,bookings,owner")
+        self.assertIn("Unknown expansion(s): bookings, owner.", str(raised.exception.detail["expand"]))
+
+    def test_each_expansion_costs_one_query(self):
+        for expand in VENUE_EXPANSIONS:
+            with self.subTest(expand), self.assertNumQueries(2 if expand == "spaces.amenities" else 1):
+                expand_venue(self.venue, parse_expand(expand))
+        with self.assertNumQueries(0):
+            self.assertEqual(expand_venue(self.venue, set()), {})
+
+    def test_spaces_carry_amenities_only_when_asked(self):
+        spaces = expand_venue(self.venue, parse_expand("spaces"))["spaces"]
+        self.assertCountEqual([space["id"] for space in spaces],
+                              self.venue.spaces.values_list("id", flat=True))
+        self.assertNotIn("amenities", spaces[0])
+
+        spaces = expand_venue(self.venue, parse_expand("spaces.amenities"))["spaces"]
+        by_id = {space["id"]: space for space in spaces}
+        self.assertEqual(
+            by_id[self.data["space"].id],
+            SpaceSerializer(SpaceSerializer.setup_eager_loading(
+                Space.objects.filter(pk=self.data["space"].pk)), many=True).data[0],
+        )
+
+    def test_reservations_are_merged_spans_from_today_on(self):
+        space = self.data["space"]
+        start, end = day_bounds(today() + timedelta(days=32), today() + timedelta(days=33))
+        Booking.objects.create(space=space, renter=self.data["renter"], start_datetime=start,
+                               end_datetime=end, total_price=Decimal("20.00"), status="ACCEPTED")
+        reservations = expand_venue(self.venue, {"reservations"})["reservations"]
+        # The pending hold on days 30-31 and the booking on 32-33 join up;
+        # past bookings are left out.
+        self.assertEqual(reservations, {str(space.id): [{
+            "start": (today() + timedelta(days=30)).isoformat(),
+            "end": (today() + timedelta(days=33)).isoformat(),
+        }]})
+
+    def test_reviews_are_the_most_recent_ones(self):
+        reviews = list(Review.objects.filter(booking__space__venue=self.venue).order_by("id"))
+        for age, review in enumerate(reversed(reviews)):
+            Review.objects.filter(pk=review.pk).update(
+                created_at=timezone.now() - timedelta(days=age))
+        with mock.patch("api.expand.RECENT_REVIEWS", 2):
+            data = expand_venue(self.venue, {"reviews"})
+        self.assertEqual([review["id"] for review in data["reviews"]],
+                         [reviews[-1].id, reviews[-2].id])
+
+    def test_venue_detail_embeds_the_expansions(self):
+        client = APIClient()
+        response = client.get(f"/api/venues/{self.venue.id}/", {"expand": "reviews,reservations"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("reviews", response.data)
+        self.assertIn("reservations", response.data)
+        self.assertNotIn("spaces", response.data)
+        self.assertEqual(client.get(f"/api/venues/{self.venue.id}/", {"expand": "x"}).status_code, 400)
+
+
+class BatchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.data = build_dataset(3)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + generate_token(self.data["renter"].id))
+
+    def batch(self, items, **extra):
+        response = self.client.post("/api/batch/", items, format="json", **extra)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_results_keep_request_order_and_their_own_status(self):
+        space, venue = self.data["space"], self.data["venue"]
+        results = self.batch([
+            {"id": "space", "method": "GET", "path": f"/api/spaces/{space.id}/"},
+            {"method": "GET", "path": "/api/spaces/999999/"},
+            {"method": "POST", "path": "/api/reviews/", "body": {"venue": venue.id, "rating": 9}},
+            {"method": "POST", "path": "/api/reviews/",
+             "body": {"venue": venue.id, "rating": 4, "comment": "ok"}},
+            {"id": "reviews", "method": "GET", "path": f"/api/reviews/?venue={venue.id}"},
+            {"method": "GET", "path": "/api/nowhere/"},
+        ])
+        self.assertEqual([result["id"] for result in results], ["space", 1, 2, 3, "reviews", 5])
+        self.assertEqual([result["status"] for result in results], [200, 404, 400, 201, 200, 404])
+        self.assertEqual(results[0]["body"]["id"], space.id)
+        self.assertIn("Rating must be between 1 and 5.", str(results[2]["body"]))
+        # The GET after the write sees it.
+        created = results[3]["body"]["id"]
+        self.assertIn(created, [review["id"] for review in results[4]["body"]])
+
+    @override_settings(BATCH_MAX_RESPONSE_BYTES=300)
+    def test_sub_responses_over_the_limit_become_413(self):
+        with mock.patch.object(streaming, "BATCH_SIZE", 1):
+            results = self.batch([
+                {"method": "GET", "path": "/api/reviews/"},
+                {"method": "GET", "path": "/api/reviews/?stream=ndjson"},
+                {"method": "GET", "path": "/api/spaces/999999/"},
+            ])
+        self.assertEqual([result["status"] for result in results], [413, 413, 404])
+        self.assertIn("300 bytes", results[1]["body"]["detail"])
+        # The stream was abandoned before it read every review, one per query.
+        self.assertLess(results[1]["queries"], Review.objects.count())
+
+    @override_settings(LOAD_SHED_MAX_IN_FLIGHT=2, LOAD_SHED_MAX_QUEUE_MS=0)
+    def test_sub_requests_count_towards_load_shedding(self):
+        path = f"/api/spaces/{self.data['space'].id}/"
+        results = self.batch([{"method": "GET", "path": path}] * 2)
+        self.assertEqual([result["status"] for result in results], [200, 200])
+
+        # The batch itself takes the only slot.
+        with override_settings(LOAD_SHED_MAX_IN_FLIGHT=1):
+            results = APIClient().post("/api/batch/", [{"method": "GET", "path": path}],
+                                       format="json").json()
+        self.assertEqual(results[0]["status"], 503)
+        self.assertEqual(results[0]["headers"]["Retry-After"], "5")
+        self.assertEqual(middleware.in_flight.count, 0)
+
+
+@override_settings(THROTTLE_BUCKETS={"login": {"rate": "1/min", "burst": 2}})
+class ThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_login_bucket_empties_after_burst(self):
+        client = APIClient()
+        body = {"email": "nobody@example.com", "password": "x"}
+        statuses = [client.post("/api/auth/login/", body, format="json").status_code
+                    for _ in range(3)]
+        self.assertEqual(statuses, [401, 401, 429])
+
+        response = client.post("/api/auth/login/", body, format="json")
+        self.assertGreater(int(response["Retry-After"]), 0)
+
+    @override_settings(THROTTLE_BUCKETS={"parallel": {"rate": "1/h", "burst": 5}})
+    def test_parallel_requests_cannot_spend_the_same_token(self):
+        class Throttle(TokenBucketThrottle):
+            key_prefix = "test"
+
+            def get_bucket_key(self, request, view):
+                return "client"
+
+        view = mock.Mock(throttle_scope="parallel")
+        real_get = LocMemCache.get
+
+        def slow_get(self, key, *args, **kwargs):
+            # Widens the window between reading a bucket and writing it back.
+            value = real_get(self, key, *args, **kwargs)
+            if key.startswith("throttle:"):
+                time.sleep(0.01)
+            return value
+
+        barrier = threading.Barrier(20)
+        allowed = []
+
+        def request():
+            barrier.wait()
+            allowed.append(Throttle().allow_request(None, view))
+
+        with mock.patch.object(LocMemCache, "get", slow_get), \
+                mock.patch.object(throttling, "LOCK_WAIT_SECONDS", 5):
+            threads = [threading.Thread(target=request) for _ in range(20)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(allowed.count(True), 5)
+        self.assertEqual(len(allowed), 20)
+
+    def test_a_lock_is_only_released_by_its_holder(self):
+        default = caches["default"]
+        token = cache_lock.acquire(default, "lock", timeout=10)
+        self.assertIsNone(cache_lock.acquire(default, "lock", timeout=10))
+        self.assertFalse(cache_lock.release(default, "lock", "someone-else"))
+        self.assertTrue(cache_lock.release(default, "lock", token))
+        self.assertIsNotNone(cache_lock.acquire(default, "lock", timeout=10))
+
+    @override_settings(LOAD_SHED_MAX_QUEUE_MS=100)
+    def test_requests_queued_too_long_are_shed(self):
+        response = APIClient().get("/api/calling-codes/", HTTP_X_REQUEST_START="t=1000000000.0")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "5")
+
+
+class IdempotencyTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.data = build_dataset(2)
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION="Bearer " + generate_token(self.data["renter"].id)
+        )
+        self.url = f"/api/bookings/{self.data['free_space'].id}/confirm/"
+        self.body = {"StartDate": str(today() + timedelta(days=1)),
+                     "EndDate": str(today() + timedelta(days=2)), "totalCost": "20.00"}
+
+    def test_retry_replays_the_first_response(self):
+        first = self.client.post(self.url, self.body, format="json", HTTP_IDEMPOTENCY_KEY="k1")
+        bookings = Booking.objects.count()
+        with self.assertNumQueries(1):  # authentication only
+            retry = self.client.post(self.url, self.body, format="json",
+                                     HTTP_IDEMPOTENCY_KEY="k1")
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Booking.objects.count(), bookings)
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.client.post(self.url, self.body, format="json", HTTP_IDEMPOTENCY_KEY="k2")
+        other = {**self.body, "totalCost": "30.00"}
+        response = self.client.post(self.url, other, format="json", HTTP_IDEMPOTENCY_KEY="k2")
+        self.assertEqual(response.status_code, 422)
+
+    def keys(self, key):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        response_key = f"idempotency:{self.data['renter'].pk}:{self.url}:{digest}"
+        return response_key, response_key + ":lock"
+
+    def test_retry_during_the_first_attempt_waits_for_its_response(self):
+        first = self.client.post(self.url, self.body, format="json", HTTP_IDEMPOTENCY_KEY="k3")
+        response_key, lock_key = self.keys("k3")
+        stored = cache.get(response_key)
+        # Back to the first attempt still running.
+        cache.delete(response_key)
+        token = cache_lock.acquire(cache, lock_key, 60)
+
+        def finish_first(seconds):
+            cache.set(response_key, stored)
+            cache_lock.release(cache, lock_key, token)
+
+        bookings = Booking.objects.count()
+        with mock.patch.object(idempotency.time, "sleep", side_effect=finish_first) as sleep:
+            retry = self.client.post(self.url, self.body, format="json",
+                                     HTTP_IDEMPOTENCY_KEY="k3")
+
+        sleep.assert_called_once()
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Booking.objects.count(), bookings)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_retry_gets_409_while_the_first_attempt_holds_the_lock(self):
+        _, lock_key = self.keys("k4")
+        token = cache_lock.acquire(cache, lock_key, 60)
+        bookings = Booking.objects.count()
+
+        response = self.client.post(self.url, self.body, format="json", HTTP_IDEMPOTENCY_KEY="k4")
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(Booking.objects.count(), bookings)
+        # The holder's lock is untouched; once it lets go the key runs.
+        self.assertEqual(cache.get(lock_key), token)
+        cache_lock.release(cache, lock_key, token)
+        retry = self.client.post(self.url, self.body, format="json", HTTP_IDEMPOTENCY_KEY="k4")
+        self.assertEqual(retry.status_code, 201)
+        self.assertIsNone(cache.get(lock_key))
+
+
+class NormalizePhonesTests(TestCase):
+
+    def test_rewrites_phones_and_skips_failures_and_duplicates(self):
+        phones = ["081-234-5678", "+66812345678", "+66 (0)81 234 5679", "0066 81 234 5679", "abc"]
+        users = [
+            User.objects.create(name=f"user {i}", email=f"user{i}@example.com",
+                                phone=phone, password_hash="x")
+            for i, phone in enumerate(phones)
+        ]
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command("normalize_phones", country="TH", dry_run=True, chunk_size=2,
+                     stdout=out, stderr=err)
+        self.assertIn("Would update 1 phone(s); 1 already normalized; 3 skipped.", out.getvalue())
+        self.assertEqual(User.objects.get(pk=users[2].pk).phone, phones[2])
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command("normalize_phones", country="TH", chunk_size=2, stdout=out, stderr=err)
+        self.assertIn("Updated 1 phone(s); 1 already normalized; 3 skipped.", out.getvalue())
+        self.assertEqual(
+            [user.phone for user in User.objects.filter(pk__in=[u.pk for u in users]).order_by("pk")],
+            ["081-234-5678", "+66812345678", "+66812345679", "0066 81 234 5679", "abc"],
+        )
+        self.assertIn(f"User {users[0].pk}: '+66812345678': Duplicates another user's phone.",
+                      err.getvalue())
+        self.assertIn(f"User {users[4].pk}: 'abc': Phone number must contain digits only.",
+                      err.getvalue())
+
+
+class IndexAdvisorTests(TestCase):
+
+    def test_proposes_indexes_for_unindexed_filters_and_orderings(self):
+        out, err = io.StringIO(), io.StringIO()
+        call_command("index_advisor", rows=8, stdout=out, stderr=err)
+
+        migration = out.getvalue()
+        self.assertIn("migrations.AddIndex(", migration)
+        self.assertIn("fields=['is_active', 'created_at']", migration)
+        self.assertIn("fields=['name']", migration)
+        self.assertIn("GET /api/venues/: filesort on api_venue", err.getvalue())
+
+
+class BulkTests(TestCase):
+
+    def setUp(self):
+        self.data = build_dataset(2)
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION="Bearer " + generate_token(self.data["host"].id)
+        )
+
+    def test_one_bad_item_rejects_the_whole_batch(self):
+        space, other = self.data["space"], Space.objects.create(
+            venue=Venue.objects.create(name="Theirs", owner=self.data["spare"], venue_type="GRID",
+                                       address="1 Road", city="Bangkok", province="Bangkok",
+                                       country="TH"),
+            name="theirs", price_per_day=Decimal("10.00"),
+        )
+        response = self.client.post("/api/spaces/bulk/", {"items": [
+            {"id": space.id, "price_per_day": "99.00"},
+            {"id": other.id, "is_published": True},
+            {"id": space.id, "price_per_day": "0"},
+        ]}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([r["result"] for r in response.data["results"]],
+                         ["skipped", "error", "error"])
+        space.refresh_from_db()
+        self.assertEqual(space.price_per_day, Decimal("10.00"))
+
+    def test_rejecting_a_pending_booking_releases_its_dates(self):
+        pending = self.data["pending"]
+        self.assertTrue(SpaceOccupancy.objects.filter(booking=pending).exists())
+
+        response = self.client.post("/api/bookings/bulk-status/", {"items": [
+            {"id": pending.id, "status": "REJECTED"},
+        ]}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"], [{"id": pending.id, "result": "updated"}])
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, "REJECTED")
+        self.assertFalse(SpaceOccupancy.objects.filter(booking=pending).exists())
+
+        again = self.client.post("/api/bookings/bulk-status/", {"items": [
+            {"id": pending.id, "status": "ACCEPTED"},
+        ]}, format="json")
+        self.assertEqual(again.status_code, 400)
+
+    def test_malformed_ids_are_item_errors(self):
+        space = self.data["space"]
+        response = self.client.post("/api/spaces/bulk/", {"items": [
+            {"id": [1], "is_published": False},
+            {"id": {"a": 1}, "is_published": False},
+            {"id": space.id, "is_published": False},
+        ]}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([r["result"] for r in response.data["results"]],
+                         ["error", "error", "skipped"])
+        self.assertIn("id", response.data["results"][0]["errors"])
+
+
+class HoldExpiryTests(TestCase):
+
+    def setUp(self):
+        self.data = build_dataset(2)
+        self.pending = self.data["pending"]
+        self.days = list(SpaceOccupancy.objects.filter(booking=self.pending)
+                         .values_list("date", flat=True))
+        Booking.objects.filter(pk=self.pending.pk).update(
+            hold_expires_at=timezone.now() - timedelta(minutes=1)
+        )
+
+    def test_expired_hold_is_ignored_and_yields_to_a_new_booking(self):
+        space = self.data["space"]
+        self.assertFalse(set(self.days) & set(occupancy.reserved_dates(space.id, today())))
+
+        Booking.objects.create(
+            space=space, renter=self.data["spare"],
+            start_datetime=self.pending.start_datetime, end_datetime=self.pending.end_datetime,
+            total_price=Decimal("20.00"), status="PENDING",
+        )
+        self.pending.refresh_from_db()
+        self.assertEqual(self.pending.status, "EXPIRED")
+        self.assertFalse(SpaceOccupancy.objects.filter(booking=self.pending).exists())
+
+    def test_bulk_status_does_not_accept_an_expired_hold(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Bearer " + generate_token(self.data["host"].id))
+        response = client.post("/api/bookings/bulk-status/", {"items": [
+            {"id": self.pending.id, "status": "ACCEPTED"},
+        ]}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("EXPIRED", str(response.data["results"][0]["errors"]["status"]))
+        self.pending.refresh_from_db()
+        self.assertEqual(self.pending.status, "EXPIRED")
+        self.assertFalse(SpaceOccupancy.objects.filter(booking=self.pending).exists())
+
+    def test_sweep_expires_holds_in_batches(self):
+        live = Booking.objects.filter(status="PENDING").exclude(pk=self.pending.pk)
+        self.assertEqual(holds.sweep(batch_size=10), 1)
+        self.assertEqual(holds.sweep(batch_size=10), 0)
+
+        self.pending.refresh_from_db()
+        self.assertEqual(self.pending.status, "EXPIRED")
+        self.assertFalse(SpaceOccupancy.objects.filter(booking=self.pending).exists())
+        self.assertTrue(all(b.hold_expires_at > timezone.now() for b in live))
+
+
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        self.data = build_dataset(2)
+        start = timezone.now() - timedelta(days=400)
+        self.old = Booking.objects.create(
+            space=self.data["space"], renter=self.data["spare"],
+            start_datetime=start, end_datetime=start + timedelta(days=1),
+            total_price=Decimal("20.00"), status="ACCEPTED",
+        )
+
+    def test_old_bookings_move_to_the_archive_in_batches(self):
+        live = Booking.objects.count()
+        self.assertEqual(archive.archive_batch(archive.cutoff(), batch_size=10), 1)
+        self.assertEqual(archive.archive_batch(archive.cutoff(), batch_size=10), 0)
+
+        self.assertEqual(Booking.objects.count(), live - 1)
+        self.assertFalse(SpaceOccupancy.objects.filter(booking_id=self.old.id).exists())
+        archived = ArchivedBooking.objects.get(pk=self.old.id)
+        self.assertEqual(archived.snapshot(), self.old.snapshot())
+        self.assertEqual(archived.created_at, self.old.created_at)
+
+    def test_reviewing_an_archived_booking_restores_it(self):
+        archive.archive_batch(archive.cutoff())
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Bearer " + generate_token(self.data["spare"].id))
+
+        response = client.post("/api/reviews/", {"venue": self.data["venue"].id, "rating": 4},
+                               format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Review.objects.get(pk=response.data["id"]).booking_id, self.old.id)
+        self.assertFalse(ArchivedBooking.objects.exists())
+
+    def test_a_second_restore_of_the_same_booking_returns_the_live_one(self):
+        archive.archive_batch(archive.cutoff())
+        first, second = ArchivedBooking.objects.get(), ArchivedBooking.objects.get()
+
+        restored = archive.restore(first)
+        # The other request read the archived row before this one moved it.
+        self.assertEqual(archive.restore(second), restored)
+        self.assertEqual(Booking.objects.filter(pk=self.old.id).count(), 1)
+
+    def test_reviewing_a_booking_reviewed_meanwhile_is_a_400(self):
+        archive.archive_batch(archive.cutoff())
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Bearer " + generate_token(self.data["spare"].id))
+        real_restore = archive.restore
+
+        def restore(archived):
+            booking = real_restore(archived)
+            # Another request reviews the restored booking before this one does.
+            Review.objects.create(booking=booking, rating=5)
+            return booking
+
+        with mock.patch("api.archive.restore", restore):
+            response = client.post("/api/reviews/", {"venue": self.data["venue"].id, "rating": 4},
+                                   format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Review.objects.get(booking_id=self.old.id).rating, 5)
+
+
+class ViewCounterTests(TestCase):
+
+    def setUp(self):
+        counters.discard()
+        self.data = build_dataset(2)
+        self.client = APIClient()
+
+    def test_views_are_buffered_then_added_by_each_flush(self):
+        venue, space = self.data["venue"], self.data["space"]
+        with self.assertNumQueries(1):
+            self.client.get(f"/api/venues/{venue.id}/")
+        self.client.get(f"/api/venues/{venue.id}/")
+        self.client.get(f"/api/spaces/{space.id}/")
+        venues = self.client.get("/api/venues/").data
+        self.assertFalse(VenueDailyViews.objects.exists())
+
+        self.assertEqual(counters.flush(), len(venues) + 1)
+        self.client.get(f"/api/venues/{venue.id}/")
+        counters.flush()
+
+        row = VenueDailyViews.objects.get(venue=venue, date=today())
+        self.assertEqual((row.views, row.impressions), (3, 1))
+        self.assertEqual(SpaceDailyViews.objects.get(space=space).views, 1)
+        self.assertEqual(VenueDailyViews.objects.count(), len(venues))
+
+        popular = self.client.get("/api/venues/popular/").data
+        self.assertEqual(popular[0]["id"], venue.id)
+        self.assertEqual((popular[0]["views"], popular[0]["impressions"]), (3, 1))
+
+    def test_counts_survive_a_failed_flush(self):
+        venue = self.data["venue"]
+        self.client.get(f"/api/venues/{venue.id}/")
+        with mock.patch.object(counters, "upsert", side_effect=RuntimeError), \
+                self.assertLogs("api.counters", "ERROR"):
+            self.assertEqual(counters.flush(), 0)
+
+        counters.flush()
+        self.assertEqual(VenueDailyViews.objects.get(venue=venue).views, 1)
+
+    def test_counts_survive_a_failed_lookup_of_their_database(self):
+        venue = self.data["venue"]
+        self.client.get(f"/api/venues/{venue.id}/")
+        with mock.patch.object(sharding, "locate", side_effect=RuntimeError), \
+                self.assertLogs("api.counters", "ERROR"):
+            self.assertEqual(counters.flush(), 0)
+
+        self.assertEqual(counters.flush(), 1)
+        self.assertEqual(VenueDailyViews.objects.get(venue=venue).views, 1)
+
+    def test_a_graceful_exit_flushes_the_buffer(self):
+        venue = self.data["venue"]
+        self.client.get(f"/api/venues/{venue.id}/")
+        with override_settings(VIEW_COUNTER_FLUSH_SECONDS=10):
+            counters._flush_at_exit()
+        self.assertEqual(VenueDailyViews.objects.get(venue=venue).views, 1)
+
+    def test_paginated_and_streamed_lists_count_impressions(self):
+        venue_ids = list(Venue.objects.filter(is_active=True)
+                         .order_by("-created_at").values_list("id", flat=True))
+
+        class OnePerPage(PageNumberPagination):
+            page_size = 1
+
+        with mock.patch.object(VenueViewSet, "pagination_class", OnePerPage):
+            page = self.client.get("/api/venues/").data["results"]
+        response = self.client.get("/api/venues/?stream=ndjson")
+        b"".join(response.streaming_content)
+        counters.flush()
+
+        impressions = dict(VenueDailyViews.objects.values_list("venue_id", "impressions"))
+        self.assertEqual(impressions, {
+            venue_id: 2 if venue_id == page[0]["id"] else 1 for venue_id in venue_ids
+        })
+
+
+@override_settings(DATABASE_SHARDS={"shard_test": ["SG"]}, TASK_DATABASES=["default", "shard_test"])
+class ShardTests(TestCase):
+    databases = {"default", "shard_test"}
+
+    def setUp(self):
+        cache.clear()
+        counters.discard()
+        self.host = User.objects.create(name="host", email="host@example.com",
+                                        phone="+66800000001", password_hash="x")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + generate_token(self.host.id))
+
+    def create_venue(self, name, country):
+        response = self.client.post("/api/venues/create-with-spaces/", {
+            "venue": {"name": name, "venue_type": "GRID", "address": "1 Road", "city": "City",
+                      "province": "Province", "country": country},
+            "spaces": [{"name": "Hall", "price_per_day": "10.00", "have_amenity": True,
+                        "amenities": ["Wi-Fi"]}],
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response.data["venue_id"], response.data["space_ids"][0]
+
+    def book(self, space_id):
+        tomorrow = str(today() + timedelta(days=1))
+        response = self.client.post(f"/api/bookings/{space_id}/confirm/", {
+            "StartDate": tomorrow, "EndDate": tomorrow, "totalCost": "10.00",
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response.data["booking_id"]
+
+    def test_venue_data_lives_on_its_country_shard_and_lists_merge(self):
+        th_venue, _ = self.create_venue("Bangkok", "TH")
+        sg_venue, sg_space = self.create_venue("Singapore", "SG")
+        booking_id = self.book(sg_space)
+
+        self.assertEqual(set(Venue.objects.using("shard_test").values_list("id", flat=True)),
+                         {sg_venue})
+        self.assertEqual(set(Venue.objects.using("default").values_list("id", flat=True)),
+                         {th_venue})
+        self.assertTrue(Booking.objects.using("shard_test").filter(pk=booking_id).exists())
+        self.assertTrue(SpaceOccupancy.objects.using("shard_test")
+                        .filter(booking_id=booking_id).exists())
+        self.assertFalse(Amenity.objects.using("shard_test").exists())
+
+        venues = self.client.get("/api/venues/")
+        self.assertEqual([venue["id"] for venue in venues.data], [sg_venue, th_venue])
+        counters.flush()
+        self.assertEqual(list(VenueDailyViews.objects.using("shard_test")
+                              .values_list("venue_id", "impressions")), [(sg_venue, 1)])
+        spaces = self.client.get("/api/spaces/")
+        self.assertEqual([space["amenities"] for space in spaces.data], [["Wi-Fi"], ["Wi-Fi"]])
+        self.assertEqual(self.client.get(f"/api/spaces/{sg_space}/").data["amenities"], ["Wi-Fi"])
+        self.assertEqual(self.client.get("/api/venues/?stream=json").status_code, 400)
+
+        review = self.client.post("/api/reviews/", {"venue": sg_venue, "rating": 5}, format="json")
+        self.assertEqual(review.status_code, 201)
+        reviews = self.client.get(f"/api/reviews/?venue={sg_venue}")
+        self.assertEqual([r["reviewer_name"] for r in reviews.data], ["host"])
+
+    def test_a_pinned_stream_reads_its_shard(self):
+        sg_venue, sg_space = self.create_venue("Singapore", "SG")
+        self.book(sg_space)
+        self.assertEqual(self.client.post("/api/reviews/", {"venue": sg_venue, "rating": 5},
+                                          format="json").status_code, 201)
+
+        response = self.client.get(f"/api/reviews/?venue={sg_venue}&stream=json")
+
+        self.assertEqual(response.status_code, 200)
+        body = json.loads(b"".join(response.streaming_content))
+        self.assertEqual([review["reviewer_name"] for review in body], ["host"])
+
+    def test_reshard_moves_a_country_keeping_ids(self):
+        sg_venue, sg_space = self.create_venue("Singapore", "SG")
+        booking_id = self.book(sg_space)
+
+        with override_settings(DATABASE_SHARDS={"shard_test": []}):
+            call_command("reshard", "SG", to="default", batch_size=1, stdout=io.StringIO())
+
+        self.assertFalse(Venue.objects.using("shard_test").exists())
+        self.assertFalse(SpaceOccupancy.objects.using("shard_test").exists())
+        self.assertEqual(Booking.objects.using("default").get(pk=booking_id).space_id, sg_space)
+        self.assertTrue(SpaceOccupancy.objects.using("default")
+                        .filter(booking_id=booking_id).exists())
+        self.assertEqual(self.client.get(f"/api/venues/{sg_venue}/").status_code, 200)
+        reservations = self.client.get(f"/api/bookings/{sg_space}/reservations/")
+        self.assertEqual(len(reservations.data), 1)
+
+
+class BrokerTests(SimpleTestCase):
+
+    def test_events_from_other_threads_reach_subscribers_and_overflow_resyncs(self):
+        async def scenario():
+            broker = LocalBroker()
+            subscription = broker.subscribe(["space:1"], maxsize=2)
+            await sync_to_async(broker.publish, thread_sensitive=False)("space:1", {"n": 1})
+            self.assertEqual(await subscription.get(timeout=1), {"n": 1})
+
+            for n in range(3):
+                broker.publish("space:1", {"n": n})
+            broker.publish("space:2", {"n": "elsewhere"})
+            await asyncio.sleep(0)
+            self.assertIs(await subscription.get(timeout=1), RESYNC)
+            self.assertIsNone(await subscription.get(timeout=0.01))
+
+            subscription.close()
+            self.assertEqual(broker.subscriber_count(), 0)
+
+        asyncio.run(scenario())
+
+
+class EventStreamTests(TransactionTestCase):
+    """Drives the ASGI app directly; rows must be committed for its threads to see them."""
+
+    def open_stream(self, path, query=b""):
+        sent, disconnected = asyncio.Queue(), asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        scope = {"type": "http", "method": "GET", "path": path,
+                 "query_string": query, "headers": []}
+        task = asyncio.ensure_future(EventStreamApp(None)(scope, receive, sent.put))
+        return sent, disconnected, task
+
+    @staticmethod
+    async def next_event(sent):
+        message = await asyncio.wait_for(sent.get(), 5)
+        event, data = message["body"].decode().split("\n\n")[-2].split("\n")
+        return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+    def test_space_stream_pushes_committed_bookings(self):
+        data = build_dataset(1)
+        space, renter = data["free_space"], data["renter"]
+        token = generate_token(renter.id)
+        day = today() + timedelta(days=3)
+
+        def book():
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION="Bearer " + token)
+            return client.post(
+                f"/api/bookings/{space.id}/confirm/",
+                {"StartDate": day.isoformat(), "EndDate": day.isoformat(), "totalCost": "10.00"},
+                format="json",
+            ).status_code
+
+        async def scenario():
+            sent, disconnected, task = self.open_stream(
+                f"/api/events/spaces/{space.id}/", f"token={token}".encode()
+            )
+            start = await asyncio.wait_for(sent.get(), 5)
+            self.assertEqual(start["status"], 200)
+            self.assertEqual(await self.next_event(sent),
+                             ("snapshot", {"space": space.id, "reservations": []}))
+
+            self.assertEqual(await sync_to_async(book)(), 201)
+            event, delta = await self.next_event(sent)
+            self.assertEqual(event, "reservations")
+            self.assertEqual(delta["venue"], data["venue"].id)
+            self.assertEqual(delta["reserved"], [{"start": day.isoformat(), "end": day.isoformat()}])
+            self.assertEqual(delta["released"], [])
+
+            disconnected.set()
+            await asyncio.wait_for(task, 5)
+
+        cache.clear()
+        asyncio.run(scenario())
+
+    def test_stream_requires_a_token(self):
+        async def scenario():
+            sent, _, task = self.open_stream("/api/events/venues/1/")
+            await asyncio.wait_for(task, 5)
+            return (await sent.get())["status"]
+
+        self.assertEqual(asyncio.run(scenario()), 401)
@@ -0,0 +1,123 @@
+"""
+Token-bucket throttles for expensive endpoints.
+
+Each view names a bucket with `throttle_scope`; THROTTLE_BUCKETS maps the
+scope to a refill rate and a burst size:
+
+    THROTTLE_BUCKETS = {"login": {"rate": "10/min", "burst": 5}}
+
+A client may spend up to `burst` requests at once, after which tokens come
+back at `rate`. Buckets live in the THROTTLE_CACHE cache so every worker
+shares them, and each bucket is read and updated under a short cache lock
+(api/utils/cache_lock.py) so parallel requests cannot spend the same token.
+If that cache is unreachable the throttle keeps working on a per-process
+in-memory cache instead of failing requests.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import BaseThrottle
+
+from .utils import cache_lock
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+# A bucket is locked for as long as one read and one write take.
+LOCK_SECONDS = 1
+LOCK_WAIT_SECONDS = 0.25
+
+_fallback_cache = LocMemCache("throttle-fallback", {})
+
+
+def parse_rate(rate):
+    """'10/min' -> tokens per second (the period is read from its first letter)."""
+    count, period = rate.split("/")
+    return int(count) / PERIODS[period[0]]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Base class; subclasses choose what a bucket is keyed by. Views without a
+    `throttle_scope`, or with a scope missing from THROTTLE_BUCKETS, are not
+    throttled.
+    """
+    key_prefix = None
+
+    def __init__(self):
+        self.delay = 0
+
+    def get_bucket_key(self, request, view):
+        raise NotImplementedError
+
+    def get_config(self, view):
+        scope = getattr(view, "throttle_scope", None)
+        config = getattr(settings, "THROTTLE_BUCKETS", {}).get(scope)
+        if config is None:
+            return None, None
+        try:
+            return scope, (parse_rate(config["rate"]), config.get("burst", 1))
+        except (KeyError, ValueError) as e:
+            raise ImproperlyConfigured(f"Invalid THROTTLE_BUCKETS entry for {scope!r}.") from e
+
+    def allow_request(self, request, view):
+        scope, config = self.get_config(view)
+        if config is None:
+            return True
+        ident = self.get_bucket_key(request, view)
+        if ident is None:
+            return True
+
+        refill, burst = config
+        key = f"throttle:{scope}:{self.key_prefix}:{ident}"
+        try:
+            return self.take(caches[settings.THROTTLE_CACHE], key, refill, burst)
+        except Exception:
+            logger.warning("Throttle cache unavailable, using in-memory buckets", exc_info=True)
+            return self.take(_fallback_cache, key, refill, burst)
+
+    def take(self, cache, key, refill, burst):
+        """Spends a token from the bucket `key` if it has one."""
+        # Read, refill and write back under the bucket's lock, or parallel
+        # requests would all spend the same token.
+        lock = cache_lock.held(cache, key + ":lock", timeout=LOCK_SECONDS, wait=LOCK_WAIT_SECONDS)
+        with lock as acquired:
+            if not acquired:
+                # Only a client flooding its own bucket waits this long.
+                self.delay = LOCK_WAIT_SECONDS
+                return False
+            now = time.time()
+            tokens, updated = cache.get(key) or (burst, now)
+            tokens = min(burst, tokens + (now - updated) * refill)
+
+            if tokens < 1:
+                self.delay = (1 - tokens) / refill
+                return False
+            # The bucket refills completely after burst / refill seconds of silence.
+            cache.set(key, (tokens - 1, now), timeout=int(burst / refill) + 1)
+            return True
+
+    def wait(self):
+        return self.delay
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """Buckets per client address (honours NUM_PROXIES for X-Forwarded-For)."""
+    key_prefix = "ip"
+
+    def get_bucket_key(self, request, view):
+        return self.get_ident(request)
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Buckets per authenticated user; anonymous requests are left to the IP bucket."""
+    key_prefix = "user"
+
+    def get_bucket_key(self, request, view):
+        if request.user and getattr(request.user, "is_authenticated", False):
+            return request.user.pk
+        return None
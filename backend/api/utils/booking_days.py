@@ -0,0 +1,38 @@
+from datetime import datetime, time, timedelta
+import pytz
+
+# Bookings are whole days in Thailand time; every day-based computation
+# (analytics, occupancy, reservations) goes through these helpers.
+BANGKOK_TZ = pytz.timezone("Asia/Bangkok")
+
+
+def day_bounds(start_date, end_date):
+    """
+    Returns the aware datetimes stored on a Booking covering the given
+    Bangkok dates: 00:00:00 on the first day to 23:59:59 on the last day.
+    """
+    start_dt = BANGKOK_TZ.localize(datetime.combine(start_date, time.min))
+    end_dt = BANGKOK_TZ.localize(datetime.combine(end_date, time(23, 59, 59)))
+    return start_dt, end_dt
+
+
+def local_date(dt):
+    """Converts a stored (UTC) datetime to its Bangkok calendar date."""
+    return dt.astimezone(BANGKOK_TZ).date()
+
+
+def today():
+    return datetime.now(BANGKOK_TZ).date()
+
+
+def date_range(start_date, end_date):
+    """Yields every date from start_date to end_date inclusive."""
+    day = start_date
+    while day <= end_date:
+        yield day
+        day += timedelta(days=1)
+
+
+def booking_days(start_dt, end_dt):
+    """Returns the list of Bangkok dates covered by a booking's datetimes."""
+    return list(date_range(local_date(start_dt), local_date(end_dt)))
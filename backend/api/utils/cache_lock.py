@@ -0,0 +1,76 @@
+"""
+Short-lived locks on a Django cache, so work keyed by a cache entry (an
+Idempotency-Key, a throttle bucket) runs once at a time across processes
+sharing the cache:
+
+    with held(cache, "throttle:login:ip:10.0.0.1:lock", timeout=1, wait=0.25) as acquired:
+        if acquired:
+            ...
+
+A lock is taken with cache.add() under a random token and expires after
+`timeout` seconds in case its holder dies. Release deletes the key only if
+it still holds that token (an atomic compare-and-delete on Redis and on the
+local-memory cache), so a holder that overran its timeout never frees a
+lock someone else has taken since.
+"""
+import pickle
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+POLL_SECONDS = 0.01
+
+# KEYS[1] = lock key, ARGV[1] = the serialized token.
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def acquire(cache, key, timeout):
+    """Takes the lock if it is free; returns its token, or None."""
+    token = uuid.uuid4().hex
+    return token if cache.add(key, token, timeout=timeout) else None
+
+
+def release(cache, key, token):
+    """Frees the lock if `token` still holds it; returns whether it did."""
+    if isinstance(cache, RedisCache):
+        client = cache._cache
+        cache_key = cache.make_and_validate_key(key)
+        return bool(client.get_client(cache_key, write=True).eval(
+            RELEASE_SCRIPT, 1, cache_key, client._serializer.dumps(token)
+        ))
+    if isinstance(cache, LocMemCache):
+        cache_key = cache.make_and_validate_key(key)
+        with cache._lock:
+            pickled = cache._cache.get(cache_key)
+            if pickled is None or cache._has_expired(cache_key) or pickle.loads(pickled) != token:
+                return False
+            return cache._delete(cache_key)
+    # Other backends offer no compare-and-delete; this leaves a short race.
+    if cache.get(key) != token:
+        return False
+    return cache.delete(key)
+
+
+@contextmanager
+def held(cache, key, timeout, wait=0, poll=POLL_SECONDS):
+    """
+    Holds the lock for the block, polling for up to `wait` seconds while
+    someone else has it. Yields whether it was acquired; the block runs
+    either way.
+    """
+    deadline = time.monotonic() + wait
+    while (token := acquire(cache, key, timeout)) is None and time.monotonic() < deadline:
+        time.sleep(poll)
+    try:
+        yield token is not None
+    finally:
+        if token is not None:
+            release(cache, key, token)
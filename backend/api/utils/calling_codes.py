@@ -1,9 +1,260 @@
-#Based on E.164 format
+# Based on E.164 format: ITU-T country codes for every assigned country and
+# territory, keyed by ISO 3166-1 alpha-2 code (except "UK", kept for the
+# United Kingdom instead of "GB" because stored data and clients use it).
+#
+# Several countries share a country code. Those that are told apart by the
+# start of the national number list it under "area_codes" (NANP territories
+# under +1, Kazakhstan under +7, the Crown Dependencies under +44, ...); the
+# country without area codes owns every other number with that code.
 CALLING_CODES = {
-    "US": { "code": "+1",  "drop_zero": False },
+    "AD": { "code": "+376", "drop_zero": False },
+    "AE": { "code": "+971", "drop_zero": True },
+    "AF": { "code": "+93", "drop_zero": True },
+    "AG": { "code": "+1", "drop_zero": False, "area_codes": ["268"] },
+    "AI": { "code": "+1", "drop_zero": False, "area_codes": ["264"] },
+    "AL": { "code": "+355", "drop_zero": True },
+    "AM": { "code": "+374", "drop_zero": True },
+    "AO": { "code": "+244", "drop_zero": False },
+    "AR": { "code": "+54", "drop_zero": True },
+    "AS": { "code": "+1", "drop_zero": False, "area_codes": ["684"] },
+    "AT": { "code": "+43", "drop_zero": True },
+    "AU": { "code": "+61", "drop_zero": True },
+    "AW": { "code": "+297", "drop_zero": False },
+    "AX": { "code": "+358", "drop_zero": True, "area_codes": ["18"] },
+    "AZ": { "code": "+994", "drop_zero": True },
+    "BA": { "code": "+387", "drop_zero": True },
+    "BB": { "code": "+1", "drop_zero": False, "area_codes": ["246"] },
+    "BD": { "code": "+880", "drop_zero": True },
+    "BE": { "code": "+32", "drop_zero": True },
+    "BF": { "code": "+226", "drop_zero": False },
+    "BG": { "code": "+359", "drop_zero": True },
+    "BH": { "code": "+973", "drop_zero": False },
+    "BI": { "code": "+257", "drop_zero": False },
+    "BJ": { "code": "+229", "drop_zero": False },
+    "BL": { "code": "+590", "drop_zero": True, "area_codes": ["59027"] },
+    "BM": { "code": "+1", "drop_zero": False, "area_codes": ["441"] },
+    "BN": { "code": "+673", "drop_zero": False },
+    "BO": { "code": "+591", "drop_zero": True },
+    "BQ": { "code": "+599", "drop_zero": False, "area_codes": ["7"] },
+    "BR": { "code": "+55", "drop_zero": True },
+    "BS": { "code": "+1", "drop_zero": False, "area_codes": ["242"] },
+    "BT": { "code": "+975", "drop_zero": False },
+    "BW": { "code": "+267", "drop_zero": False },
+    "BY": { "code": "+375", "drop_zero": False },
+    "BZ": { "code": "+501", "drop_zero": False },
+    "CA": { "code": "+1", "drop_zero": False, "area_codes": [
+        "204", "226", "236", "249", "250", "263", "289", "306", "343", "354",
+        "365", "367", "368", "382", "387", "403", "416", "418", "428", "431",
+        "437", "438", "450", "460", "468", "474", "506", "514", "519", "548",
+        "579", "581", "584", "587", "604", "613", "639", "647", "672", "683",
+        "705", "709", "742", "753", "778", "780", "782", "807", "819", "825",
+        "867", "873", "879", "902", "905"
+    ] },
+    "CC": { "code": "+61", "drop_zero": True, "area_codes": ["89162"] },
+    "CD": { "code": "+243", "drop_zero": True },
+    "CF": { "code": "+236", "drop_zero": False },
+    "CG": { "code": "+242", "drop_zero": False },
+    "CH": { "code": "+41", "drop_zero": True },
+    "CI": { "code": "+225", "drop_zero": False },
+    "CK": { "code": "+682", "drop_zero": False },
+    "CL": { "code": "+56", "drop_zero": False },
+    "CM": { "code": "+237", "drop_zero": False },
+    "CN": { "code": "+86", "drop_zero": False },
+    "CO": { "code": "+57", "drop_zero": False },
+    "CR": { "code": "+506", "drop_zero": False },
+    "CU": { "code": "+53", "drop_zero": True },
+    "CV": { "code": "+238", "drop_zero": False },
+    "CW": { "code": "+599", "drop_zero": False, "area_codes": ["9"] },
+    "CX": { "code": "+61", "drop_zero": True, "area_codes": ["89164"] },
+    "CY": { "code": "+357", "drop_zero": False },
+    "CZ": { "code": "+420", "drop_zero": False },
+    "DE": { "code": "+49", "drop_zero": True },
+    "DJ": { "code": "+253", "drop_zero": False },
+    "DK": { "code": "+45", "drop_zero": False },
+    "DM": { "code": "+1", "drop_zero": False, "area_codes": ["767"] },
+    "DO": { "code": "+1", "drop_zero": False, "area_codes": ["809", "829", "849"] },
+    "DZ": { "code": "+213", "drop_zero": True },
+    "EC": { "code": "+593", "drop_zero": True },
+    "EE": { "code": "+372", "drop_zero": False },
+    "EG": { "code": "+20", "drop_zero": True },
+    "EH": { "code": "+212", "drop_zero": True, "area_codes": ["5288", "5289"] },
+    "ER": { "code": "+291", "drop_zero": True },
+    "ES": { "code": "+34", "drop_zero": False },
+    "ET": { "code": "+251", "drop_zero": True },
+    "FI": { "code": "+358", "drop_zero": True },
+    "FJ": { "code": "+679", "drop_zero": False },
+    "FK": { "code": "+500", "drop_zero": False },
+    "FM": { "code": "+691", "drop_zero": False },
+    "FO": { "code": "+298", "drop_zero": False },
+    "FR": { "code": "+33", "drop_zero": True },
+    "GA": { "code": "+241", "drop_zero": False },
+    "GD": { "code": "+1", "drop_zero": False, "area_codes": ["473"] },
+    "GE": { "code": "+995", "drop_zero": True },
+    "GF": { "code": "+594", "drop_zero": True },
+    "GG": { "code": "+44", "drop_zero": True, "area_codes": ["1481"] },
+    "GH": { "code": "+233", "drop_zero": True },
+    "GI": { "code": "+350", "drop_zero": False },
+    "GL": { "code": "+299", "drop_zero": False },
+    "GM": { "code": "+220", "drop_zero": False },
+    "GN": { "code": "+224", "drop_zero": False },
+    "GP": { "code": "+590", "drop_zero": True },
+    "GQ": { "code": "+240", "drop_zero": False },
+    "GR": { "code": "+30", "drop_zero": False },
+    "GT": { "code": "+502", "drop_zero": False },
+    "GU": { "code": "+1", "drop_zero": False, "area_codes": ["671"] },
+    "GW": { "code": "+245", "drop_zero": False },
+    "GY": { "code": "+592", "drop_zero": False },
+    "HK": { "code": "+852", "drop_zero": False },
+    "HN": { "code": "+504", "drop_zero": False },
+    "HR": { "code": "+385", "drop_zero": True },
+    "HT": { "code": "+509", "drop_zero": False },
+    "HU": { "code": "+36", "drop_zero": False },
+    "ID": { "code": "+62", "drop_zero": True },
+    "IE": { "code": "+353", "drop_zero": True },
+    "IL": { "code": "+972", "drop_zero": True },
+    "IM": { "code": "+44", "drop_zero": True, "area_codes": ["1624"] },
+    "IN": { "code": "+91", "drop_zero": True },
+    "IO": { "code": "+246", "drop_zero": False },
+    "IQ": { "code": "+964", "drop_zero": True },
+    "IR": { "code": "+98", "drop_zero": True },
+    "IS": { "code": "+354", "drop_zero": False },
     "IT": { "code": "+39", "drop_zero": True },
-    "UK": { "code": "+44", "drop_zero": True },
-    "TH": { "code": "+66", "drop_zero": True },
+    "JE": { "code": "+44", "drop_zero": True, "area_codes": ["1534"] },
+    "JM": { "code": "+1", "drop_zero": False, "area_codes": ["658", "876"] },
+    "JO": { "code": "+962", "drop_zero": True },
     "JP": { "code": "+81", "drop_zero": True },
-    "CN": { "code": "+86", "drop_zero": False },
-}
\ No newline at end of file
+    "KE": { "code": "+254", "drop_zero": True },
+    "KG": { "code": "+996", "drop_zero": True },
+    "KH": { "code": "+855", "drop_zero": True },
+    "KI": { "code": "+686", "drop_zero": False },
+    "KM": { "code": "+269", "drop_zero": False },
+    "KN": { "code": "+1", "drop_zero": False, "area_codes": ["869"] },
+    "KP": { "code": "+850", "drop_zero": True },
+    "KR": { "code": "+82", "drop_zero": True },
+    "KW": { "code": "+965", "drop_zero": False },
+    "KY": { "code": "+1", "drop_zero": False, "area_codes": ["345"] },
+    "KZ": { "code": "+7", "drop_zero": False, "area_codes": ["6", "7"] },
+    "LA": { "code": "+856", "drop_zero": True },
+    "LB": { "code": "+961", "drop_zero": True },
+    "LC": { "code": "+1", "drop_zero": False, "area_codes": ["758"] },
+    "LI": { "code": "+423", "drop_zero": False },
+    "LK": { "code": "+94", "drop_zero": True },
+    "LR": { "code": "+231", "drop_zero": True },
+    "LS": { "code": "+266", "drop_zero": False },
+    "LT": { "code": "+370", "drop_zero": False },
+    "LU": { "code": "+352", "drop_zero": False },
+    "LV": { "code": "+371", "drop_zero": False },
+    "LY": { "code": "+218", "drop_zero": True },
+    "MA": { "code": "+212", "drop_zero": True },
+    "MC": { "code": "+377", "drop_zero": False },
+    "MD": { "code": "+373", "drop_zero": True },
+    "ME": { "code": "+382", "drop_zero": True },
+    "MF": { "code": "+590", "drop_zero": True, "area_codes": ["59087"] },
+    "MG": { "code": "+261", "drop_zero": True },
+    "MH": { "code": "+692", "drop_zero": False },
+    "MK": { "code": "+389", "drop_zero": True },
+    "ML": { "code": "+223", "drop_zero": False },
+    "MM": { "code": "+95", "drop_zero": True },
+    "MN": { "code": "+976", "drop_zero": True },
+    "MO": { "code": "+853", "drop_zero": False },
+    "MP": { "code": "+1", "drop_zero": False, "area_codes": ["670"] },
+    "MQ": { "code": "+596", "drop_zero": True },
+    "MR": { "code": "+222", "drop_zero": False },
+    "MS": { "code": "+1", "drop_zero": False, "area_codes": ["664"] },
+    "MT": { "code": "+356", "drop_zero": False },
+    "MU": { "code": "+230", "drop_zero": False },
+    "MV": { "code": "+960", "drop_zero": False },
+    "MW": { "code": "+265", "drop_zero": True },
+    "MX": { "code": "+52", "drop_zero": False },
+    "MY": { "code": "+60", "drop_zero": True },
+    "MZ": { "code": "+258", "drop_zero": False },
+    "NA": { "code": "+264", "drop_zero": True },
+    "NC": { "code": "+687", "drop_zero": False },
+    "NE": { "code": "+227", "drop_zero": False },
+    "NF": { "code": "+672", "drop_zero": False, "area_codes": ["3"] },
+    "NG": { "code": "+234", "drop_zero": True },
+    "NI": { "code": "+505", "drop_zero": False },
+    "NL": { "code": "+31", "drop_zero": True },
+    "NO": { "code": "+47", "drop_zero": False },
+    "NP": { "code": "+977", "drop_zero": True },
+    "NR": { "code": "+674", "drop_zero": False },
+    "NU": { "code": "+683", "drop_zero": False },
+    "NZ": { "code": "+64", "drop_zero": True },
+    "OM": { "code": "+968", "drop_zero": False },
+    "PA": { "code": "+507", "drop_zero": False },
+    "PE": { "code": "+51", "drop_zero": True },
+    "PF": { "code": "+689", "drop_zero": False },
+    "PG": { "code": "+675", "drop_zero": False },
+    "PH": { "code": "+63", "drop_zero": True },
+    "PK": { "code": "+92", "drop_zero": True },
+    "PL": { "code": "+48", "drop_zero": False },
+    "PM": { "code": "+508", "drop_zero": False },
+    "PR": { "code": "+1", "drop_zero": False, "area_codes": ["787", "939"] },
+    "PS": { "code": "+970", "drop_zero": True },
+    "PT": { "code": "+351", "drop_zero": False },
+    "PW": { "code": "+680", "drop_zero": False },
+    "PY": { "code": "+595", "drop_zero": True },
+    "QA": { "code": "+974", "drop_zero": False },
+    "RE": { "code": "+262", "drop_zero": True },
+    "RO": { "code": "+40", "drop_zero": True },
+    "RS": { "code": "+381", "drop_zero": True },
+    "RU": { "code": "+7", "drop_zero": False },
+    "RW": { "code": "+250", "drop_zero": False },
+    "SA": { "code": "+966", "drop_zero": True },
+    "SB": { "code": "+677", "drop_zero": False },
+    "SC": { "code": "+248", "drop_zero": False },
+    "SD": { "code": "+249", "drop_zero": True },
+    "SE": { "code": "+46", "drop_zero": True },
+    "SG": { "code": "+65", "drop_zero": False },
+    "SH": { "code": "+290", "drop_zero": False },
+    "SI": { "code": "+386", "drop_zero": True },
+    "SJ": { "code": "+47", "drop_zero": False, "area_codes": ["79"] },
+    "SK": { "code": "+421", "drop_zero": True },
+    "SL": { "code": "+232", "drop_zero": True },
+    "SM": { "code": "+378", "drop_zero": False },
+    "SN": { "code": "+221", "drop_zero": False },
+    "SO": { "code": "+252", "drop_zero": True },
+    "SR": { "code": "+597", "drop_zero": False },
+    "SS": { "code": "+211", "drop_zero": True },
+    "ST": { "code": "+239", "drop_zero": False },
+    "SV": { "code": "+503", "drop_zero": False },
+    "SX": { "code": "+1", "drop_zero": False, "area_codes": ["721"] },
+    "SY": { "code": "+963", "drop_zero": True },
+    "SZ": { "code": "+268", "drop_zero": False },
+    "TC": { "code": "+1", "drop_zero": False, "area_codes": ["649"] },
+    "TD": { "code": "+235", "drop_zero": False },
+    "TG": { "code": "+228", "drop_zero": False },
+    "TH": { "code": "+66", "drop_zero": True },
+    "TJ": { "code": "+992", "drop_zero": False },
+    "TK": { "code": "+690", "drop_zero": False },
+    "TL": { "code": "+670", "drop_zero": False },
+    "TM": { "code": "+993", "drop_zero": False },
+    "TN": { "code": "+216", "drop_zero": False },
+    "TO": { "code": "+676", "drop_zero": False },
+    "TR": { "code": "+90", "drop_zero": True },
+    "TT": { "code": "+1", "drop_zero": False, "area_codes": ["868"] },
+    "TV": { "code": "+688", "drop_zero": False },
+    "TW": { "code": "+886", "drop_zero": True },
+    "TZ": { "code": "+255", "drop_zero": True },
+    "UA": { "code": "+380", "drop_zero": True },
+    "UG": { "code": "+256", "drop_zero": True },
+    "UK": { "code": "+44", "drop_zero": True },
+    "US": { "code": "+1", "drop_zero": False },
+    "UY": { "code": "+598", "drop_zero": True },
+    "UZ": { "code": "+998", "drop_zero": False },
+    "VA": { "code": "+39", "drop_zero": True, "area_codes": ["6698"] },
+    "VC": { "code": "+1", "drop_zero": False, "area_codes": ["784"] },
+    "VE": { "code": "+58", "drop_zero": True },
+    "VG": { "code": "+1", "drop_zero": False, "area_codes": ["284"] },
+    "VI": { "code": "+1", "drop_zero": False, "area_codes": ["340"] },
+    "VN": { "code": "+84", "drop_zero": True },
+    "VU": { "code": "+678", "drop_zero": False },
+    "WF": { "code": "+681", "drop_zero": False },
+    "WS": { "code": "+685", "drop_zero": False },
+    "XK": { "code": "+383", "drop_zero": True },
+    "YE": { "code": "+967", "drop_zero": True },
+    "YT": { "code": "+262", "drop_zero": True, "area_codes": ["269", "639"] },
+    "ZA": { "code": "+27", "drop_zero": True },
+    "ZM": { "code": "+260", "drop_zero": True },
+    "ZW": { "code": "+263", "drop_zero": True },
+}
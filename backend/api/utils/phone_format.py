@@ -1,3 +1,5 @@
+import re
+
 from .calling_codes import CALLING_CODES
 from django.core.validators import RegexValidator
 
@@ -8,6 +10,41 @@ format_rule = RegexValidator(
     message="Incorrect phone number"
 )
 
+
+def build_prefix_trie(calling_codes):
+    """
+    Builds a digit trie over every country code (plus area codes, for shared
+    country codes). A node's None key holds the country that matches there;
+    when two countries claim the same prefix, the first one listed keeps it.
+    """
+    root = {}
+    for country, cfg in calling_codes.items():
+        digits = cfg["code"].lstrip("+")
+        for area_code in cfg.get("area_codes") or [""]:
+            node = root
+            for digit in digits + area_code:
+                node = node.setdefault(digit, {})
+            node.setdefault(None, country)
+    return root
+
+
+PREFIX_TRIE = build_prefix_trie(CALLING_CODES)
+
+
+def match_country(full_phone: str):
+    """
+    Returns the country whose prefix is the longest match for an E.164
+    number, or None. Walks at most as many digits as the longest prefix.
+    """
+    node, country = PREFIX_TRIE, None
+    for digit in full_phone.lstrip("+"):
+        node = node.get(digit)
+        if node is None:
+            break
+        country = node.get(None, country)
+    return country
+
+
 def format_phone_number(raw_phone: str, country: str) -> str:
     """
     Normalize a raw phone number using country-specific rules.
@@ -44,19 +81,67 @@ def deformat_phone_number(instance):
     """
     full_phone = instance.phone
 
-    for country_key, cfg in CALLING_CODES.items():
-        prefix = cfg["code"]
+    country_key = match_country(full_phone)
+    if country_key is None:
+        raise ValueError("Could not match phone number to any country prefix.")
 
-        if full_phone.startswith(prefix):
-            raw = full_phone[len(prefix):]
+    cfg = CALLING_CODES[country_key]
+    raw = full_phone[len(cfg["code"]):]
 
-            # Restore leading zero if the country's rule drops it.
-            if cfg.get("drop_zero") and not raw.startswith("0"):
-                raw = "0" + raw
+    # Restore leading zero if the country's rule drops it.
+    if cfg.get("drop_zero") and not raw.startswith("0"):
+        raw = "0" + raw
 
-            return {
-                "country": country_key,
-                "phone": raw,
-            }
+    return {
+        "country": country_key,
+        "phone": raw,
+    }
 
-    raise ValueError("Could not match phone number to any country prefix.")
+
+SEPARATORS = re.compile(r"[\s\-().]")
+
+
+def normalize_phone_number(value: str, default_country: str = None) -> str:
+    """
+    Normalize a phone number as typed or stored in the past into E.164.
+    Separators are removed and an international "00" becomes "+". Numbers
+    with a country code keep it (dropping a trunk zero written after it);
+    national numbers are formatted for `default_country`.
+    Raises ValueError when the number cannot be normalized.
+    """
+    phone = SEPARATORS.sub("", value or "")
+    if phone.startswith("00"):
+        phone = "+" + phone[2:]
+
+    if phone.startswith("+"):
+        if not phone[1:].isdigit():
+            raise ValueError("Phone number must contain digits only.")
+        country = match_country(phone)
+        if country is None:
+            raise ValueError("Could not match phone number to any country prefix.")
+        cfg = CALLING_CODES[country]
+        national = phone[len(cfg["code"]):]
+        if cfg["drop_zero"] and national.startswith("0"):
+            phone = cfg["code"] + national[1:]
+    elif default_country is None:
+        raise ValueError("Phone number has no country code.")
+    else:
+        phone = format_phone_number(phone, default_country)
+
+    if not format_rule.regex.match(phone):
+        raise ValueError(format_rule.message)
+    return phone
+
+
+def normalize_phone_numbers(values, default_country: str = None):
+    """
+    Bulk form of normalize_phone_number.
+    Returns ({value: normalized}, {value: error message}).
+    """
+    normalized, errors = {}, {}
+    for value in values:
+        try:
+            normalized[value] = normalize_phone_number(value, default_country)
+        except ValueError as e:
+            errors[value] = str(e)
+    return normalized, errors
@@ -1,5 +1,5 @@
 from rest_framework import viewsets, status
-from .models import User, Venue, Space, Amenity, Booking, Review
+from .models import User, Venue, Space, Amenity, ArchivedBooking, Booking, Review
 from .serializers import (
     UserSerializer,
     UserReadSerializer,
@@ -8,17 +8,35 @@ from .serializers import (
     BookingSerializer,
     VenueCreateWithSpacesSerializer,
     VenueUpdateWithSpacesSerializer,
-    ReviewSerializer
+    ReviewSerializer,
+    AnalyticsQuerySerializer,
+    PopularQuerySerializer,
+    ReservationQuerySerializer,
 )
-
-from django.shortcuts import get_object_or_404
+from . import analytics, archive, bulk, counters, identity, occupancy, sharding, sync
+from .projections import (
+    review_projection,
+    space_projection,
+    user_projection,
+    venue_projection,
+)
+from .streaming import FORMATS as STREAM_FORMATS, streaming_list_response
+from .expand import expand_venue, parse_expand
+from .idempotency import idempotent
+from .occupancy import DatesUnavailable
+from .tasks import clean_up_archived_venue, notify_host_of_booking
+from .throttling import IPTokenBucketThrottle, UserTokenBucketThrottle
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 from django.core.exceptions import PermissionDenied
 from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from api.utils.calling_codes import CALLING_CODES
-from datetime import datetime, time, timedelta
-import pytz
+from api.utils.booking_days import day_bounds
 from rest_framework.permissions import BasePermission
 
 class IsSelf(BasePermission):
@@ -26,8 +44,158 @@ class IsSelf(BasePermission):
     def has_object_permission(self, request, view, obj):
         return obj.id == request.user.id
 
-class UserViewSet(viewsets.ModelViewSet):
+class ProjectedListMixin:
+    """
+    Serves `list` through a Projection (see api/projections.py): same JSON as
+    the read serializer, without building model instances. Falls back to the
+    serializer when pagination is configured.
+
+    Viewsets with `streaming = True` also accept `?stream=json|ndjson`, which
+    streams the whole, unpaginated list in constant memory (api/streaming.py).
+
+    `?updated_since=<ISO datetime or watermark>` returns a delta-sync page
+    instead (api/sync.py), keyed on `sync_field`; rows matching
+    `sync_archived` are reported as deleted, so get_sync_queryset must not
+    filter them out.
+
+    With region sharding on, an unpinned list of venue data is read from
+    every database and merged newest first (api/sharding.py); streams and
+    delta-sync pages are only served for one database.
+
+    Viewsets with `counts_impressions = True` count an impression of every
+    row a list returns, paginated and streamed lists included (api/counters.py).
+    """
+    projection = None
+    streaming = False
+    sync_archived = None
+    sync_field = "updated_at"
+    counts_impressions = False
+
+    def get_sync_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    def fans_out(self):
+        return (
+            sharding.enabled()
+            and sharding.pinned_alias() is None
+            and sharding.is_sharded(self.projection.serializer_class.Meta.model)
+        )
+
+    def count_impressions(self, items):
+        if self.counts_impressions:
+            counters.record_impressions(
+                self.projection.serializer_class.Meta.model, [item["id"] for item in items]
+            )
+        return items
+
+    def get_paginated_response(self, data):
+        return super().get_paginated_response(self.count_impressions(data))
+
+    def list(self, request, *args, **kwargs):
+        fans_out = self.fans_out()
+        for param in ("updated_since", "stream"):
+            if fans_out and request.query_params.get(param) is not None:
+                raise ValidationError({param: "Not available for lists that span regions."})
+
+        updated_since = request.query_params.get("updated_since")
+        if updated_since is not None:
+            try:
+                since = sync.parse_watermark(updated_since)
+            except sync.InvalidWatermark as e:
+                raise ValidationError({"updated_since": str(e)})
+            queryset = self.get_sync_queryset()
+            return Response(sync.changes(
+                queryset.model._meta.model_name,
+                self.projection,
+                queryset,
+                since,
+                archived=self.sync_archived,
+                field=self.sync_field,
+            ))
+
+        stream = request.query_params.get("stream")
+        if self.streaming and stream:
+            if stream not in STREAM_FORMATS:
+                raise ValidationError(
+                    {"stream": f"Must be one of: {', '.join(STREAM_FORMATS)}."}
+                )
+            queryset = self.filter_queryset(self.get_queryset())
+            return streaming_list_response(request, self.projection, queryset, stream,
+                                           on_batch=self.count_impressions)
+
+        if self.paginator is not None:
+            return super().list(request, *args, **kwargs)
+        if fans_out:
+            return Response(self.count_impressions(sharding.merge(
+                sharding.fan_out(
+                    lambda: self.projection.data(self.filter_queryset(self.get_queryset()))
+                ),
+                key=lambda item: parse_datetime(item["created_at"]),
+                reverse=True,
+            )))
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(self.count_impressions(self.projection.data(queryset)))
+
+
+class ShardPinMixin:
+    """
+    Pins the request to the database holding its venue data (api/sharding.py)
+    from initial() until the response is finalized. get_shard() names it from
+    the URL or body; None leaves the request unpinned.
+    """
+
+    def get_shard(self):
+        return None
+
+    def body(self):
+        return self.request.data if isinstance(self.request.data, dict) else {}
+
+    def first_item_id(self):
+        """The first item's id of a bulk body; a batch is applied on one database."""
+        items = self.body().get("items")
+        if isinstance(items, list) and items and isinstance(items[0], dict):
+            return items[0].get("id")
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        if sharding.enabled():
+            self._shard_token = sharding.pin(self.get_shard())
+        super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, "_shard_token", None)
+        if token is not None:
+            self._shard_token = None
+            sharding.unpin(token)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class IdentityMapMixin:
+    """
+    get_object() loads the row once per request and shares it through the
+    identity map (api/identity.py). When the viewset's queryset loads rows
+    plainly, a row already in the map is used without a query.
+    """
+
+    def get_object(self):
+        if getattr(self, "_object", None) is None:
+            queryset = self.get_queryset()
+            mapped = None
+            if self.lookup_field == "pk" and identity.is_plain(queryset):
+                mapped = identity.peek(
+                    queryset.model, self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+                )
+            if mapped is None:
+                self._object = identity.remember(super().get_object())
+            else:
+                self.check_object_permissions(self.request, mapped)
+                self._object = mapped
+        return self._object
+
+
+class UserViewSet(IdentityMapMixin, ProjectedListMixin, viewsets.ModelViewSet):
     queryset = User.objects.all().order_by("-created_at")
+    projection = user_projection
 
     def get_serializer_class(self):
         if self.action in ["list", "retrieve"]:
@@ -39,8 +207,12 @@ class UserViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated(), IsSelf()]
         return []
 
+    def perform_destroy(self, instance):
+        sharding.delete_owned(instance)
+        instance.delete()
+
 
-class VenueViewSet(viewsets.ModelViewSet):
+class VenueViewSet(ShardPinMixin, IdentityMapMixin, ProjectedListMixin, viewsets.ModelViewSet):
     """
     In API Layer (Normal User, Host, Renter, Frontend requests):
         - Account that isn't Host unable to create new Venues.
@@ -48,11 +220,76 @@ class VenueViewSet(viewsets.ModelViewSet):
     """
 
     def get_queryset(self):
-        return Venue.objects.filter(is_active=True).order_by("-created_at")
+        return VenueSerializer.setup_eager_loading(
+            Venue.objects.filter(is_active=True).order_by("-created_at")
+        )
 
     serializer_class = VenueSerializer
+    projection = venue_projection
+    streaming = True
+    sync_archived = Q(is_active=False)
+    sync_field = "changed_at"
+    counts_impressions = True
+
+    def get_sync_queryset(self):
+        return VenueSerializer.setup_eager_loading(Venue.objects.all())
+
+    def get_shard(self):
+        if "pk" in self.kwargs:
+            return sharding.locate(Venue, self.kwargs["pk"])
+        if self.action == "create":
+            return sharding.shard_for_country(self.body().get("country"))
+        if self.action == "create_with_spaces":
+            venue = self.body().get("venue")
+            if isinstance(venue, dict):
+                return sharding.shard_for_country(venue.get("country"))
+        return None
+
+    def retrieve(self, request, *args, **kwargs):
+        """Supports `?expand=spaces,spaces.amenities,reservations,reviews` (api/expand.py)."""
+        expand = parse_expand(request.query_params.get("expand"))
+        venue = self.get_object()
+        data = self.get_serializer(venue).data
+        if expand:
+            data.update(expand_venue(venue, expand))
+        counters.record_view(Venue, venue.id)
+        return Response(data)
+
+    @action(detail=False, methods=["get"], url_path="popular")
+    def popular(self, request):
+        """
+        The most viewed active venues, best first, each with its `views` and
+        `impressions` over the window. Read from the daily view counts, so
+        the last few seconds of traffic are not in it yet (api/counters.py).
+        GET /api/venues/popular/?from=YYYY-MM-DD&to=YYYY-MM-DD&limit=20
+        """
+        query = PopularQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        start, end, limit = (query.validated_data[key] for key in ("from", "to", "limit"))
+
+        def ranked():
+            totals = counters.ranking(Venue, start, end, limit, venue__is_active=True)
+            venues = {
+                item["id"]: item
+                for item in self.projection.data(
+                    self.get_queryset().filter(id__in=[row["id"] for row in totals])
+                )
+            }
+            return [
+                {**venues[row["id"]], "views": row["views"], "impressions": row["impressions"]}
+                for row in totals if row["id"] in venues
+            ]
+
+        if not self.fans_out():
+            return Response(ranked())
+        return Response(sharding.merge(
+            sharding.fan_out(ranked),
+            key=lambda item: (item["views"], item["impressions"]),
+            reverse=True,
+        )[:limit])
 
     @action(detail=False, methods=["post"], url_path="create-with-spaces", permission_classes=[IsAuthenticated],)
+    @idempotent
     def create_with_spaces(self, request):
 
         serializer = VenueCreateWithSpacesSerializer(
@@ -79,11 +316,16 @@ class VenueViewSet(viewsets.ModelViewSet):
     def soft_delete(self, request, pk=None):
         venue = self.get_object()
 
-        if venue.owner != request.user:
+        if identity.related(venue, "owner") != request.user:
             raise PermissionDenied("You can only delete your own venue.")
 
-        venue.is_active = False
-        venue.save()
+        with transaction.atomic(using=sharding.current()):
+            venue.is_active = False
+            venue.save()
+            clean_up_archived_venue.enqueue(
+                venue_id=venue.id,
+                idempotency_key=f"venue-archived:{venue.id}:{venue.updated_at.isoformat()}",
+            )
 
         return Response(
             {"message": "Venue archived successfully"},
@@ -94,7 +336,9 @@ class VenueViewSet(viewsets.ModelViewSet):
     def list_spaces(self, request, pk=None):
         venue = self.get_object()
 
-        spaces = venue.spaces.all().order_by("-created_at")
+        spaces = SpaceSerializer.setup_eager_loading(
+            venue.spaces.all().order_by("-created_at")
+        )
         serializer = SpaceSerializer(spaces, many=True)
 
         return Response(
@@ -130,81 +374,162 @@ class VenueViewSet(viewsets.ModelViewSet):
 
         return Response({"message": "Venue updated successfully"})
 
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path="analytics",
+        permission_classes=[IsAuthenticated],
+    )
+    def venue_analytics(self, request, pk=None):
+        """
+        Occupancy, revenue and booking counts for the venue, read from the
+        daily rollup, with its page views and impressions.
+        GET /api/venues/<pk>/analytics/?from=YYYY-MM-DD&to=YYYY-MM-DD&granularity=day|week|month
+        """
+        venue = self.get_object()
+
+        if identity.related(venue, "owner") != request.user:
+            raise PermissionDenied("You can only view analytics for your own venue.")
+
+        query = AnalyticsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        return Response(
+            analytics.venue_analytics(
+                venue,
+                query.validated_data["from"],
+                query.validated_data["to"],
+                query.validated_data["granularity"],
+            ),
+            status=status.HTTP_200_OK,
+        )
+
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
     def perform_update(self, serializer):
         venue = self.get_object()
-        if venue.owner != self.request.user:
+        if identity.related(venue, "owner") != self.request.user:
             raise PermissionDenied("You can only edit your own venue.")
         serializer.save()
 
-class SpaceViewSet(viewsets.ModelViewSet):
-    queryset = Space.objects.all().order_by('-created_at')
+class SpaceViewSet(ShardPinMixin, IdentityMapMixin, ProjectedListMixin, viewsets.ModelViewSet):
     serializer_class = SpaceSerializer
+    projection = space_projection
+    counts_impressions = True
+
+    def get_queryset(self):
+        return SpaceSerializer.setup_eager_loading(
+            Space.objects.all().order_by('-created_at')
+        )
+
+    def get_shard(self):
+        if "pk" in self.kwargs:
+            return sharding.locate(Space, self.kwargs["pk"])
+        if self.action == "create":
+            return sharding.locate(Venue, self.body().get("venue"))
+        if self.action == "bulk_update":
+            return sharding.locate(Space, self.first_item_id())
+        return None
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        counters.record_view(Space, self.get_object().id)
+        return response
 
     def perform_create(self, serializer):
         venue = serializer.validated_data["venue"]
 
-        if venue.owner != self.request.user:
+        if identity.related(venue, "owner") != self.request.user:
             raise PermissionDenied("Only venue owner can create spaces.")
         serializer.save()
 
     def perform_update(self, serializer):
         space = self.get_object()
-        venue = serializer.validated_data.get("venue", space.venue)
+        venue = serializer.validated_data.get("venue") or identity.related(space, "venue")
 
-        if venue.owner != self.request.user:
+        if identity.related(venue, "owner") != self.request.user:
             raise PermissionDenied("Only venue owner can update spaces.")
         serializer.save()
 
+    @action(detail=False, methods=["post"], url_path="bulk", permission_classes=[IsAuthenticated])
+    def bulk_update(self, request):
+        """
+        Publishes/unpublishes and reprices many spaces in one statement.
+        POST /api/spaces/bulk/  {"items": [{"id", "is_published"?, "price_per_day"?}, ...]}
+        All-or-nothing; see api/bulk.py for the response.
+        """
+        applied, results = bulk.update_spaces(request.user, request.data)
+        return Response(
+            {"results": results},
+            status=status.HTTP_200_OK if applied else status.HTTP_400_BAD_REQUEST,
+        )
+
     def perform_destroy(self, instance):
-        if instance.venue.owner != self.request.user:
+        venue = identity.related(instance, "venue")
+        if identity.related(venue, "owner") != self.request.user:
             raise PermissionDenied("Only venue owner can delete spaces.")
         instance.delete()
 
 
-class BookingViewSet(viewsets.ViewSet):
+class BookingViewSet(ShardPinMixin, viewsets.ViewSet):
     """
     Handles booking creation and fetching existing reservations for a space.
     All datetime handling uses Thailand timezone (Asia/Bangkok).
     """
     permission_classes = [IsAuthenticated]
+    # Only confirm_booking sets throttle_classes; the bucket is THROTTLE_BUCKETS["booking"].
+    throttle_scope = "booking"
+
+    def get_shard(self):
+        if "space_pk" in self.kwargs:
+            return sharding.locate(Space, self.kwargs["space_pk"])
+        if self.action == "bulk_status":
+            return sharding.locate(Booking, self.first_item_id())
+        return None
 
     @action(detail=False, methods=["get"], url_path=r"(?P<space_pk>\d+)/reservations")
     def list_reservations(self, request, space_pk=None):
         """
-        Returns a list of reserved date ranges (start_date, end_date) for the given space.
-        GET /api/bookings/<space_pk>/reservations/
+        Returns the reserved date ranges (start, end) for the given space,
+        merged into minimal spans.
+        GET /api/bookings/<space_pk>/reservations/?from=YYYY-MM-DD&to=YYYY-MM-DD
+
+        `from` defaults to today and `to` is open-ended, so past bookings are
+        not returned unless asked for. With `?month=YYYY-MM` the response is
+        instead {"month", "from", "to", "days"}, where `days` has one
+        character per day of the month ("1" reserved, "0" free).
 
         IMPORTANT: Returns dates in YYYY-MM-DD format (Thailand timezone)
         """
-        space = get_object_or_404(Space, pk=space_pk)
-
-        # Get Bangkok timezone
-        bangkok_tz = pytz.timezone('Asia/Bangkok')
+        space = identity.get_or_404(Space, space_pk)
 
-        bookings = Booking.objects.filter(
-            space=space,
-            status__in=["PENDING", "ACCEPTED"],
-        ).order_by('start_datetime')
+        query = ReservationQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        start, end = query.validated_data["from"], query.validated_data["to"]
 
-        reservations = []
-        for b in bookings:
-            # Convert UTC datetime to Bangkok timezone, then extract date
-            start_bangkok = b.start_datetime.astimezone(bangkok_tz)
-            end_bangkok = b.end_datetime.astimezone(bangkok_tz)
+        dates = occupancy.reserved_dates(space.id, start, end)
 
-            reservations.append({
-                'start': start_bangkok.date().isoformat(),
-                'end': end_bangkok.date().isoformat(),
-            })
+        if query.validated_data.get("month"):
+            return Response(
+                {
+                    "month": query.validated_data["month"],
+                    "from": start.isoformat(),
+                    "to": end.isoformat(),
+                    "days": occupancy.day_bitmap(dates, start, end),
+                },
+                status=status.HTTP_200_OK,
+            )
 
-        # Debug log
-        print(f"Returning reservations for space {space_pk}:", reservations)
-        return Response(reservations, status=status.HTTP_200_OK)
+        return Response(occupancy.merge_spans(dates), status=status.HTTP_200_OK)
 
-    @action(detail=False, methods=["post"], url_path=r"(?P<space_pk>\d+)/confirm")
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path=r"(?P<space_pk>\d+)/confirm",
+        throttle_classes=[IPTokenBucketThrottle, UserTokenBucketThrottle],
+    )
+    @idempotent
     def confirm_booking(self, request, space_pk=None):
         """
         Creates a new booking for the specified space.
@@ -212,8 +537,9 @@ class BookingViewSet(viewsets.ViewSet):
 
         Expects: StartDate (YYYY-MM-DD), EndDate (YYYY-MM-DD), totalCost
         All dates are interpreted as Bangkok timezone dates.
+        Retries should carry an Idempotency-Key header (api/idempotency.py).
         """
-        space = get_object_or_404(Space, pk=space_pk)
+        space = identity.get_or_404(Space, space_pk)
 
         serializer = BookingSerializer(
             data=request.data,
@@ -225,28 +551,29 @@ class BookingViewSet(viewsets.ViewSet):
         start_date = validated_data["StartDate"]
         end_date = validated_data["EndDate"]
 
-        # Get Bangkok timezone
-        bangkok_tz = pytz.timezone('Asia/Bangkok')
-
-        # Create timezone-aware datetimes in Bangkok timezone
-        # Start at 00:00:00 Bangkok time
-        start_dt = bangkok_tz.localize(datetime.combine(start_date, time.min))
-        # End at 23:59:59 Bangkok time
-        end_dt = bangkok_tz.localize(
-            datetime.combine(end_date, time(23, 59, 59)))
-
-        print(f"Creating booking: {start_dt} to {end_dt}")  # Debug log
-
-        # Django will automatically convert these to UTC for storage
-        booking = Booking.objects.create(
-            space=space,
-            renter=request.user,
-            start_datetime=start_dt,
-            end_datetime=end_dt,
-            total_price=validated_data["totalCost"],
-            status="ACCEPTED",
-            payment_status="PAID",
-        )
+        # Start at 00:00:00 and end at 23:59:59 Bangkok time
+        start_dt, end_dt = day_bounds(start_date, end_date)
+
+        # Django will automatically convert these to UTC for storage.
+        # Saving the booking claims its dates in the occupancy ledger in the
+        # same transaction; a concurrent booking for any of them fails here.
+        try:
+            with transaction.atomic(using=sharding.current()):
+                booking = Booking.objects.create(
+                    space=space,
+                    renter=request.user,
+                    start_datetime=start_dt,
+                    end_datetime=end_dt,
+                    total_price=validated_data["totalCost"],
+                    status="ACCEPTED",
+                    payment_status="PAID",
+                )
+                notify_host_of_booking.enqueue(
+                    booking_id=booking.id,
+                    idempotency_key=f"booking-confirmed:{booking.id}",
+                )
+        except DatesUnavailable as e:
+            raise ValidationError({"dates": str(e)})
 
         return Response(
             {
@@ -255,9 +582,22 @@ class BookingViewSet(viewsets.ViewSet):
             },
             status=status.HTTP_201_CREATED,
         )
-    
 
-class ReviewViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=["post"], url_path="bulk-status")
+    def bulk_status(self, request):
+        """
+        Accepts or rejects pending bookings on the user's venues.
+        POST /api/bookings/bulk-status/  {"items": [{"id", "status": "ACCEPTED"|"REJECTED"}, ...]}
+        All-or-nothing; see api/bulk.py for the response.
+        """
+        applied, results = bulk.transition_bookings(request.user, request.data)
+        return Response(
+            {"results": results},
+            status=status.HTTP_200_OK if applied else status.HTTP_400_BAD_REQUEST,
+        )
+
+
+class ReviewViewSet(ShardPinMixin, ProjectedListMixin, viewsets.ModelViewSet):
     """
     API endpoint for creating and listing reviews.
 
@@ -267,14 +607,29 @@ class ReviewViewSet(viewsets.ModelViewSet):
     reviews by venue id.
     """
     serializer_class = ReviewSerializer
+    projection = review_projection
+    streaming = True
 
     def get_queryset(self):
-        qs = Review.objects.all().order_by("-created_at")
+        qs = ReviewSerializer.setup_eager_loading(
+            Review.objects.all().order_by("-created_at")
+        )
         venue_id = self.request.query_params.get("venue")
         if venue_id:
             qs = qs.filter(booking__space__venue_id=venue_id)
         return qs
 
+    def get_shard(self):
+        if "pk" in self.kwargs:
+            return sharding.locate(Review, self.kwargs["pk"])
+        if self.action == "create":
+            return sharding.locate(Venue, self.body().get("venue"))
+        venue_id = self.request.query_params.get("venue")
+        if venue_id:
+            # A venue's reviews live with the venue.
+            return sharding.locate(Venue, venue_id)
+        return None
+
     def get_permissions(self):
         if self.action in ["create", "update", "partial_update", "destroy"]:
             return [IsAuthenticated()]
@@ -300,18 +655,31 @@ class ReviewViewSet(viewsets.ModelViewSet):
             )
 
         # Ensure the venue exists
-        venue = get_object_or_404(Venue, pk=venue_id)
+        venue = identity.get_or_404(Venue, venue_id)
 
         # Find a booking for this user and venue without an existing review
-        bookings = Booking.objects.filter(space__venue=venue, renter=request.user)
-        available_booking = None
-        for b in bookings:
-            # OneToOne relation: if review exists, accessing b.review will succeed
-            try:
-                _ = b.review
-            except Review.DoesNotExist:
-                available_booking = b
-                break
+        available_booking = (
+            sharding.select_related(
+                Booking.objects.filter(
+                    space__venue=venue,
+                    renter=request.user,
+                    review__isnull=True,
+                ),
+                "space", "renter",
+            )
+            .order_by("id")
+            .first()
+        )
+        if available_booking is None:
+            # Bookings that ended long ago live in the archive; a review
+            # needs its booking live, so move it back.
+            archived = (
+                ArchivedBooking.objects.filter(space__venue=venue, renter=request.user)
+                .order_by("id")
+                .first()
+            )
+            if archived is not None:
+                available_booking = archive.restore(archived)
 
         if available_booking is None:
             return Response(
@@ -320,11 +688,19 @@ class ReviewViewSet(viewsets.ModelViewSet):
             )
 
         # Create the review linked to the booking; reviewer and venue are derived
-        review = Review.objects.create(
-            booking=available_booking,
-            rating=rating_int,
-            comment=comment.strip(),
-        )
+        try:
+            with transaction.atomic(using=sharding.current()):
+                review = Review.objects.create(
+                    booking=available_booking,
+                    rating=rating_int,
+                    comment=comment.strip(),
+                )
+        except IntegrityError:
+            # A concurrent request reviewed the same booking first.
+            return Response(
+                {"detail": "No eligible booking found or review already submitted."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         serializer = self.get_serializer(review)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Reservation event streams are served before Django's request handling
+# (api/sse.py); everything else goes to Django.
+from api.sse import EventStreamApp  # noqa: E402  (needs the app registry)
+
+application = EventStreamApp(django_application)
@@ -10,9 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import importlib.util
 import os
 import sys
 from pathlib import Path
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -39,10 +41,14 @@ INSTALLED_APPS = [
 
     # local
     "api",
+    "tasks",
 ]
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
+    "api.middleware.LoadSheddingMiddleware",
+    "api.middleware.ProfilingMiddleware",
+    "api.middleware.IdentityMapMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -83,6 +89,36 @@ DATABASES = {
     }
 }
 
+# Region sharding (api/sharding.py): DATABASE_SHARDS maps extra database
+# aliases to the venue countries whose data they hold; other countries and
+# the global tables (users, amenities) stay on "default". From the env:
+#   DJANGO_DATABASE_SHARDS="shard_sea=SG,MY;shard_vn=VN"
+# Each shard is the MySQL database <MYSQL_DATABASE>_<alias> on
+# MYSQL_HOST_<ALIAS> (default MYSQL_HOST); with DJANGO_SQLITE_SHARDS=1 every
+# database is a local SQLite file instead. Create a shard's tables with
+# `python manage.py migrate --database <alias>`, and change a country's
+# shard by editing the mapping, then `python manage.py reshard <country> --to <alias>`.
+DATABASE_SHARDS = {
+    alias.strip(): [code.strip().upper() for code in countries.split(",") if code.strip()]
+    for alias, _, countries in (
+        part.partition("=")
+        for part in os.getenv("DJANGO_DATABASE_SHARDS", "").split(";") if part.strip()
+    )
+}
+for alias in DATABASE_SHARDS:
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "NAME": f"{DATABASES['default']['NAME']}_{alias}",
+        "HOST": os.getenv(f"MYSQL_HOST_{alias.upper()}", DATABASES["default"]["HOST"]),
+    }
+if os.getenv("DJANGO_SQLITE_SHARDS") == "1":
+    for alias in DATABASES:
+        DATABASES[alias] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": str(BASE_DIR / f"{alias}.sqlite3"),
+        }
+DATABASE_ROUTERS = ["api.sharding.ShardRouter"]
+
 # If you prefer pymysql instead of mysqlclient, add this near top of file:
 # import pymysql
 # pymysql.install_as_MySQLdb()
@@ -95,20 +131,147 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.AllowAny",
     ],
+    # orjson-backed JSON; output is byte-identical to DRF's JSONRenderer.
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "api.renderers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+}
+
+# Token-bucket throttles (api.throttling). A view opts in with
+# `throttle_scope`; "rate" is the refill rate and "burst" the bucket size.
+THROTTLE_CACHE = "default"
+THROTTLE_BUCKETS = {
+    "login": {"rate": os.getenv("DJANGO_THROTTLE_LOGIN", "10/min"), "burst": 10},
+    "register": {"rate": os.getenv("DJANGO_THROTTLE_REGISTER", "5/min"), "burst": 5},
+    "booking": {"rate": os.getenv("DJANGO_THROTTLE_BOOKING", "30/min"), "burst": 10},
 }
 
+# MessagePack (Accept / Content-Type: application/msgpack) is offered only
+# when the optional `msgpack` package is installed.
+if importlib.util.find_spec("msgpack"):
+    REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"].append("api.renderers.MessagePackRenderer")
+    REST_FRAMEWORK["DEFAULT_PARSER_CLASSES"].append("api.renderers.MessagePackParser")
+
+# Shared cache (throttle buckets). Without REDIS_URL each process keeps its
+# own in-memory cache.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+
+# Idempotency-Key replays (api/idempotency.py): responses are kept for
+# IDEMPOTENCY_TTL seconds; a concurrent retry waits IDEMPOTENCY_WAIT_SECONDS
+# for the first attempt to finish.
+IDEMPOTENCY_CACHE = "default"
+IDEMPOTENCY_TTL = 24 * 60 * 60
+IDEMPOTENCY_WAIT_SECONDS = 10
+
+# Load shedding (api.middleware.LoadSheddingMiddleware); 0 disables a check.
+LOAD_SHED_MAX_IN_FLIGHT = int(os.getenv("DJANGO_LOAD_SHED_MAX_IN_FLIGHT", "64"))
+LOAD_SHED_MAX_QUEUE_MS = int(os.getenv("DJANGO_LOAD_SHED_MAX_QUEUE_MS", "2000"))
+LOAD_SHED_RETRY_AFTER = 5
+
 # CORS - allow frontend dev
 CORS_ALLOWED_ORIGINS = os.getenv(
     "CORS_ALLOWED_ORIGINS",
     "http://localhost:5173,http://127.0.0.1:5173"
 ).split(",")
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
 
 # static
 STATIC_URL = "/static/"
 
+# Opt-in request profiling (api.middleware.ProfilingMiddleware).
+# Off by default; when off the middleware is dropped at startup.
+PROFILING_ENABLED = os.getenv("DJANGO_PROFILING", "0") == "1"
+PROFILING_DIR = os.getenv("DJANGO_PROFILING_DIR", str(BASE_DIR / "profiles"))
+PROFILING_HEADER = "X-Profile"
+PROFILING_ALLOWED_USER_IDS = [
+    int(user_id) for user_id in os.getenv("DJANGO_PROFILING_USERS", "").split(",") if user_id
+]
+PROFILING_EXPLAIN_TOP = 5
+
+# POST /api/batch/ (api.batch_views.BatchView)
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_WORKERS = 4
+BATCH_MAX_RESPONSE_BYTES = 5 * 1024 * 1024
+
+# Reservation event streams (api/sse.py). They are served by core.asgi, so
+# need an ASGI server (e.g. `uvicorn core.asgi:application`); under
+# runserver the frontend keeps its one-off reservations fetch. The default
+# broker only reaches streams in the process that made the booking.
+EVENTS_BROKER = os.getenv("DJANGO_EVENTS_BROKER", "api.events.LocalBroker")
+SSE_MAX_CONNECTIONS = int(os.getenv("DJANGO_SSE_MAX_CONNECTIONS", "10000"))
+SSE_HEARTBEAT_SECONDS = 15
+SSE_QUEUE_SIZE = 100
+SSE_RETRY_MS = 3000
+
+# Bulk host operations (api/bulk.py): items per request.
+BULK_MAX_ITEMS = 500
+
+# PENDING bookings hold their dates this long (api/holds.py); run
+# `python manage.py expire_holds --watch 60` to sweep expired holds.
+BOOKING_HOLD_MINUTES = int(os.getenv("DJANGO_BOOKING_HOLD_MINUTES", "30"))
+
+# Bookings that ended this many days ago move to the archive table
+# (`python manage.py archive_bookings`, api/archive.py).
+BOOKING_ARCHIVE_DAYS = int(os.getenv("DJANGO_BOOKING_ARCHIVE_DAYS", "365"))
+
+# Venue and space view counters (api/counters.py) are buffered per process and
+# written this often, or once the buffer holds VIEW_COUNTER_MAX_KEYS rows.
+VIEW_COUNTER_FLUSH_SECONDS = int(os.getenv("DJANGO_VIEW_COUNTER_FLUSH_SECONDS", "10"))
+VIEW_COUNTER_MAX_KEYS = 10000
+
+# Delta-sync tombstones (api/sync.py) are kept this many days, then deleted by
+# `python manage.py prune_tombstones`; older watermarks are rejected.
+SYNC_TOMBSTONE_DAYS = int(os.getenv("DJANGO_SYNC_TOMBSTONE_DAYS", "30"))
+
+# Default output directory of `manage.py export_changes`.
+EXPORT_DIR = os.getenv("DJANGO_EXPORT_DIR", str(BASE_DIR / "exports"))
+
+# Background tasks (tasks app): `python manage.py run_workers` starts
+# `concurrency` worker processes per queue.
+TASK_QUEUES = {
+    "default": {"concurrency": 1},
+    "analytics": {"concurrency": 1},
+    "notifications": {"concurrency": 2},
+}
+TASK_RETRY_BASE_SECONDS = 5
+TASK_RETRY_MAX_SECONDS = 3600
+TASK_LOCK_TIMEOUT = 600
+# DONE and FAILED tasks are deleted after this many days by `manage.py prune_tasks`.
+TASK_RETENTION_DAYS = int(os.getenv("DJANGO_TASK_RETENTION_DAYS", "7"))
+# Tasks are stored with the data that produced them, so workers poll every shard.
+TASK_DATABASES = ["default", *DATABASE_SHARDS]
+
+EMAIL_BACKEND = os.getenv("DJANGO_EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+DEFAULT_FROM_EMAIL = os.getenv("DJANGO_DEFAULT_FROM_EMAIL", "no-reply@localhost")
+
 # Use SQLite for testing to avoid MySQL permissions issues
 if 'test' in sys.argv:
     DATABASES['default'] = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',   # in-memory DB → very fast for tests purpose
-    }
\ No newline at end of file
+    }
+    # Tests run unsharded; ShardTests switches "shard_test" on itself.
+    DATABASES = {
+        'default': DATABASES['default'],
+        'shard_test': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+    }
+    DATABASE_SHARDS = {}
+    TASK_DATABASES = ['default']
+    # No flusher thread; tests call counters.flush() themselves.
+    VIEW_COUNTER_FLUSH_SECONDS = 0
\ No newline at end of file
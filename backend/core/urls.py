@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework import routers
 from api.views import UserViewSet, VenueViewSet, SpaceViewSet, BookingViewSet, ReviewViewSet, amenity_list, calling_codes 
+from api.batch_views import BatchView
 
 router = routers.DefaultRouter()
 router.register(r"users", UserViewSet, basename="user")
@@ -32,6 +33,7 @@ urlpatterns = [
 
     # custom endpoints
     path("api/amenities/", amenity_list),
+    path("api/batch/", BatchView.as_view(), name="batch"),
 
     # auth
     path("api/auth/", include("api.auth_urls")),
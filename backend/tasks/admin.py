@@ -0,0 +1,16 @@
+from django.contrib import admin
+
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    readonly_fields = ("id", "created_at", "updated_at")
+    list_display = (
+        "id", "name", "queue", "status", "attempts", "max_attempts",
+        "run_at", "locked_by", "created_at",
+    )
+    list_filter = ("queue", "status")
+    show_full_result_count = False
+    search_fields = ("name", "idempotency_key")
+    ordering = ("-created_at",)
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class TasksConfig(AppConfig):
+    name = 'tasks'
+
+    def ready(self):
+        # Register the @task functions every installed app defines in tasks.py.
+        autodiscover_modules("tasks")
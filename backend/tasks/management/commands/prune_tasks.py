@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from tasks.queue import prune, retention_cutoff, task_databases
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete DONE and FAILED tasks older than TASK_RETENTION_DAYS from every "
+        "task database, in bounded batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=None,
+            help="Keep finished tasks this many days (default: TASK_RETENTION_DAYS).",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        before = retention_cutoff(options["days"])
+        total = 0
+        for using in task_databases():
+            while True:
+                deleted = prune(before, using, options["batch_size"])
+                total += deleted
+                if deleted < options["batch_size"]:
+                    break
+        self.stdout.write(self.style.SUCCESS(f"Deleted {total} finished task(s)."))
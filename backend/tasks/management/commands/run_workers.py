@@ -0,0 +1,93 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+
+from tasks.queue import claim, execute, queue_settings, run_pending, task_databases
+
+
+def worker_loop(queue, worker_id, poll_interval):
+    """
+    Body of one worker process: claim and run tasks on one queue, from each
+    of TASK_DATABASES in turn, until stopped.
+    """
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while not stopping:
+        close_old_connections()
+        task_row = None
+        for using in task_databases():
+            task_row = claim(queue, worker_id, using)
+            if task_row is not None:
+                break
+        if task_row is None:
+            time.sleep(poll_interval)
+            continue
+        execute(task_row)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run task queue workers. Each queue in TASK_QUEUES gets `concurrency` "
+        "worker processes, which caps how many of its tasks run at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--queues",
+            help="Comma-separated queues to serve (default: every queue in TASK_QUEUES).",
+        )
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Run every due task in this process, then exit.",
+        )
+
+    def handle(self, *args, **options):
+        configured = queue_settings()
+        queues = options["queues"].split(",") if options["queues"] else list(configured)
+        unknown = [q for q in queues if q not in configured]
+        if unknown:
+            raise CommandError(f"Unknown queue(s): {', '.join(unknown)}")
+
+        if options["burst"]:
+            count = run_pending(queues)
+            self.stdout.write(self.style.SUCCESS(f"Ran {count} task(s)."))
+            return
+
+        # Children must not inherit the parent's open database connections.
+        connections.close_all()
+        host = f"{socket.gethostname()}:{os.getpid()}"
+        processes = []
+        for queue in queues:
+            for slot in range(configured[queue].get("concurrency", 1)):
+                process = multiprocessing.Process(
+                    target=worker_loop,
+                    args=(queue, f"{host}/{queue}/{slot}", options["poll_interval"]),
+                    name=f"worker-{queue}-{slot}",
+                )
+                process.start()
+                processes.append(process)
+        self.stdout.write(f"Started {len(processes)} worker(s) for: {', '.join(queues)}")
+
+        def shutdown(signum, frame):
+            for process in processes:
+                process.terminate()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+        for process in processes:
+            process.join()
+        self.stdout.write("Workers stopped.")
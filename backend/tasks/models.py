@@ -0,0 +1,48 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """
+    A unit of deferred work stored in the application database.
+    Workers (`manage.py run_workers`) claim QUEUED rows whose run_at has
+    passed, run the registered function and record the outcome.
+    """
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    queue = models.CharField(max_length=50, default="default")
+    name = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+
+    # Enqueueing twice with the same key is a no-op while the row exists.
+    idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["queue", "status", "run_at"]),
+        ]
+
+    def __str__(self):
+        return f"Task #{self.id} {self.name} [{self.queue}] {self.status}"
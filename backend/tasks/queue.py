@@ -0,0 +1,217 @@
+"""
+Durable task queue on the application database.
+
+    from tasks.queue import task
+
+    @task(queue="notifications", max_attempts=3)
+    def notify_host(booking_id):
+        ...
+
+    notify_host.enqueue(booking_id=42, idempotency_key="booking-confirmed:42")
+
+Enqueueing inserts a Task row in the caller's transaction, so work is only
+ever visible to workers once the request that produced it has committed.
+Workers claim rows with a conditional UPDATE (no broker, no row locks held
+while a task runs), retry failures with exponential backoff, and reclaim
+tasks whose worker died mid-run once TASK_LOCK_TIMEOUT passes.
+
+The Task row goes to whichever database the router picks for the caller's
+writes, so with several databases (TASK_DATABASES) each has its own queue
+table and workers poll them all; a task runs in a transaction on the
+database its row is on.
+
+DONE and FAILED rows are kept for TASK_RETENTION_DAYS (for the admin, and so
+an idempotency key keeps deduplicating for that long), then deleted by
+`manage.py prune_tasks`.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def queue_settings():
+    return getattr(settings, "TASK_QUEUES", {"default": {"concurrency": 1}})
+
+
+def task_databases():
+    return getattr(settings, "TASK_DATABASES", None) or [DEFAULT_DB_ALIAS]
+
+
+def backoff_seconds(attempts):
+    """Exponential backoff with jitter: ~base, 2*base, 4*base ... capped."""
+    base = getattr(settings, "TASK_RETRY_BASE_SECONDS", 5)
+    cap = getattr(settings, "TASK_RETRY_MAX_SECONDS", 3600)
+    delay = min(cap, base * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class TaskFunction:
+    def __init__(self, func, queue, max_attempts):
+        self.func = func
+        self.queue = queue
+        self.max_attempts = max_attempts
+        self.name = f"{func.__module__}.{func.__name__}"
+        self.__doc__ = func.__doc__
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+    def enqueue(self, idempotency_key=None, delay=None, **kwargs):
+        return enqueue(
+            self.name, kwargs, queue=self.queue, max_attempts=self.max_attempts,
+            idempotency_key=idempotency_key, delay=delay,
+        )
+
+    def enqueue_many(self, payloads, delay=None):
+        """Inserts one task per kwargs dict in a single statement (no idempotency keys)."""
+        run_at = timezone.now() + (delay or timedelta())
+        return Task.objects.bulk_create(
+            Task(queue=self.queue, name=self.name, payload=payload,
+                 max_attempts=self.max_attempts, run_at=run_at)
+            for payload in payloads
+        )
+
+
+def task(queue="default", max_attempts=5):
+    """Registers a function as a task; call `.enqueue(**kwargs)` to defer it."""
+    def decorator(func):
+        task_function = TaskFunction(func, queue, max_attempts)
+        registry[task_function.name] = task_function
+        return task_function
+    return decorator
+
+
+def enqueue(name, payload, queue="default", max_attempts=5, idempotency_key=None, delay=None):
+    """
+    Inserts a task row. With an idempotency key, an existing row with the same
+    key is returned instead of creating a duplicate.
+    """
+    fields = {
+        "queue": queue,
+        "name": name,
+        "payload": payload,
+        "max_attempts": max_attempts,
+        "run_at": timezone.now() + (delay or timedelta()),
+    }
+    if idempotency_key is None:
+        return Task.objects.create(**fields)
+
+    using = router.db_for_write(Task)
+    try:
+        with transaction.atomic(using=using):
+            return Task.objects.using(using).create(idempotency_key=idempotency_key, **fields)
+    except IntegrityError:
+        return Task.objects.using(using).get(idempotency_key=idempotency_key)
+
+
+def claim(queue, worker_id, using=DEFAULT_DB_ALIAS):
+    """
+    Claims the next runnable task on `queue` in database `using`, or returns
+    None. A task is runnable when it is QUEUED and due, or RUNNING with an
+    expired lock.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, "TASK_LOCK_TIMEOUT", 600))
+    runnable = Q(status=Task.QUEUED, run_at__lte=now) | Q(status=Task.RUNNING, locked_at__lt=stale)
+
+    candidates = (
+        Task.objects.using(using).filter(runnable, queue=queue)
+        .order_by("run_at", "id")
+        .values_list("id", "status", "locked_at")[:10]
+    )
+    for task_id, status, locked_at in candidates:
+        # Only one worker's UPDATE can match the row in the state it was read in.
+        claimed = Task.objects.using(using).filter(
+            id=task_id, status=status, locked_at=locked_at,
+        ).update(
+            status=Task.RUNNING,
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Task.objects.using(using).get(id=task_id)
+    return None
+
+
+def execute(task_row):
+    """Runs a claimed task and records success, a scheduled retry or failure."""
+    task_function = registry.get(task_row.name)
+    tasks = Task.objects.using(task_row._state.db)
+    try:
+        if task_function is None:
+            raise LookupError(f"No task registered as {task_row.name!r}.")
+        # The task's writes and its DONE mark commit together, so a worker
+        # dying mid-task never leaves work applied but still claimable.
+        with transaction.atomic(using=task_row._state.db):
+            task_function(**task_row.payload)
+            tasks.filter(id=task_row.id).update(
+                status=Task.DONE, last_error="", locked_by="", locked_at=None,
+            )
+    except Exception:
+        error = traceback.format_exc()
+        if task_row.attempts < task_row.max_attempts:
+            status = Task.QUEUED
+            run_at = timezone.now() + timedelta(seconds=backoff_seconds(task_row.attempts))
+            logger.warning("Task %s failed (attempt %s), retrying at %s",
+                           task_row.id, task_row.attempts, run_at)
+        else:
+            status, run_at = Task.FAILED, task_row.run_at
+            logger.error("Task %s failed permanently:\n%s", task_row.id, error)
+        tasks.filter(id=task_row.id).update(
+            status=status, run_at=run_at, last_error=error, locked_by="", locked_at=None,
+        )
+        return False
+    return True
+
+
+def run_pending(queues=None, worker_id="inline", limit=None):
+    """
+    Drains due tasks in this process; returns the number run. Used by
+    `run_workers --burst` and by tests that need deferred work to happen.
+    """
+    count = 0
+    for using in task_databases():
+        for queue in queues or queue_settings():
+            while limit is None or count < limit:
+                task_row = claim(queue, worker_id, using)
+                if task_row is None:
+                    break
+                execute(task_row)
+                count += 1
+    return count
+
+
+def retention_cutoff(days=None):
+    if days is None:
+        days = getattr(settings, "TASK_RETENTION_DAYS", 7)
+    return timezone.now() - timedelta(days=days)
+
+
+def prune(before, using=DEFAULT_DB_ALIAS, batch_size=1000):
+    """
+    Deletes up to `batch_size` DONE and FAILED tasks on `using` last updated
+    before `before`; returns how many.
+    """
+    ids = list(
+        Task.objects.using(using)
+        .filter(status__in=(Task.DONE, Task.FAILED), updated_at__lt=before)
+        .order_by("id")
+        .values_list("id", flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+    Task.objects.using(using).filter(id__in=ids).delete()
+    return len(ids)
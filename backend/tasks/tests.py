@@ -0,0 +1,123 @@
+import io
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Task
+from .queue import backoff_seconds, claim, enqueue, execute, prune, run_pending, task
+
+calls = []
+
+
+@task(queue="default", max_attempts=2)
+def record_call(value):
+    calls.append(value)
+
+
+@task(queue="default", max_attempts=2)
+def always_fail():
+    raise RuntimeError("boom")
+
+
+class QueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_only_one_of_two_racing_workers_claims_a_task(self):
+        queued = record_call.enqueue(value=1)
+        real_update = QuerySet.update
+        raced = []
+
+        def update(queryset, **kwargs):
+            # The other worker claims the row between this one's read and its UPDATE.
+            if not raced:
+                raced.append(None)
+                raced[0] = claim("default", "other")
+            return real_update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, "update", update):
+            self.assertIsNone(claim("default", "this"))
+
+        self.assertEqual(raced[0].id, queued.id)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.locked_by, queued.attempts),
+                         (Task.RUNNING, "other", 1))
+        self.assertIsNone(claim("default", "third"))
+
+    @override_settings(TASK_LOCK_TIMEOUT=60)
+    def test_a_task_whose_worker_died_is_reclaimed(self):
+        queued = record_call.enqueue(value=1)
+        claim("default", "dead")
+        Task.objects.filter(pk=queued.pk).update(locked_at=timezone.now() - timedelta(minutes=2))
+        reclaimed = claim("default", "alive")
+        self.assertEqual((reclaimed.id, reclaimed.locked_by, reclaimed.attempts),
+                         (queued.id, "alive", 2))
+
+    @override_settings(TASK_RETRY_BASE_SECONDS=5, TASK_RETRY_MAX_SECONDS=60)
+    def test_backoff_doubles_with_jitter_up_to_the_cap(self):
+        for attempts, delay in ((1, 5), (2, 10), (3, 20), (4, 40), (5, 60), (12, 60)):
+            for _ in range(20):
+                self.assertTrue(delay * 0.8 <= backoff_seconds(attempts) <= delay * 1.2)
+
+    def test_failures_retry_after_a_backoff_then_fail_for_good(self):
+        queued = always_fail.enqueue()
+        with self.assertLogs("tasks.queue", "WARNING"):
+            self.assertFalse(execute(claim("default", "worker")))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Task.QUEUED, 1))
+        self.assertGreater(queued.run_at, timezone.now())
+        self.assertIn("RuntimeError: boom", queued.last_error)
+        # Not due yet.
+        self.assertIsNone(claim("default", "worker"))
+
+        Task.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        with self.assertLogs("tasks.queue", "ERROR"):
+            self.assertFalse(execute(claim("default", "worker")))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts, queued.locked_by),
+                         (Task.FAILED, 2, ""))
+        self.assertEqual(run_pending(), 0)
+
+    def test_an_idempotency_key_deduplicates_until_the_row_is_pruned(self):
+        first = record_call.enqueue(value=1, idempotency_key="once")
+        second = record_call.enqueue(value=2, idempotency_key="once")
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [1])
+
+        # Still deduplicated once DONE, while the row is kept.
+        self.assertEqual(record_call.enqueue(value=3, idempotency_key="once").id, first.id)
+        self.assertEqual(run_pending(), 0)
+
+        Task.objects.filter(pk=first.pk).update(updated_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(prune(timezone.now() - timedelta(days=7)), 1)
+        self.assertNotEqual(record_call.enqueue(value=4, idempotency_key="once").id, first.id)
+
+    def test_unknown_tasks_fail_without_running_anything(self):
+        enqueue("tasks.tests.missing", {}, max_attempts=1)
+        with self.assertLogs("tasks.queue", "ERROR"):
+            self.assertEqual(run_pending(), 1)
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+    @override_settings(TASK_RETENTION_DAYS=7)
+    def test_prune_tasks_deletes_old_finished_tasks_only(self):
+        old = timezone.now() - timedelta(days=8)
+        for status in (Task.DONE, Task.FAILED, Task.QUEUED, Task.RUNNING):
+            Task.objects.filter(pk=enqueue("tasks.tests.record_call", {"value": 0}).pk).update(
+                status=status, updated_at=old,
+            )
+        recent = enqueue("tasks.tests.record_call", {"value": 0})
+        Task.objects.filter(pk=recent.pk).update(status=Task.DONE)
+
+        out = io.StringIO()
+        call_command("prune_tasks", batch_size=1, stdout=out)
+        self.assertIn("Deleted 2 finished task(s).", out.getvalue())
+        self.assertCountEqual(
+            Task.objects.values_list("status", flat=True),
+            [Task.QUEUED, Task.RUNNING, Task.DONE],
+        )
@@ -66,6 +66,14 @@ function getDisabledDates(reservations) {
     return disabledDates;
 }
 
+// Applies a reservation delta pushed by /api/events/spaces/<id>/.
+function applyReservationDelta(reservations, delta) {
+    const days = getDisabledDates(reservations);
+    for (const day of getDisabledDates(delta.reserved)) days.add(day);
+    for (const day of getDisabledDates(delta.released)) days.delete(day);
+    return [...days].sort().map((day) => ({ start: day, end: day }));
+}
+
 function getNextSevenDays(minDateStr) {
     const dates = [];
     let current = createDateFromString(minDateStr);
@@ -228,6 +236,23 @@ export default function Booking() {
         }
     }, [spaceId, navigate, token]);
 
+    // Keep availability current while the page is open instead of re-fetching.
+    useEffect(() => {
+        if (!spaceId || !token || typeof EventSource === "undefined") return undefined;
+
+        const source = new EventSource(
+            `${API_BASE}/api/events/spaces/${spaceId}/?token=${encodeURIComponent(token)}`
+        );
+        source.addEventListener("snapshot", (e) => {
+            setReservations(JSON.parse(e.data).reservations);
+        });
+        source.addEventListener("reservations", (e) => {
+            const delta = JSON.parse(e.data);
+            setReservations((current) => applyReservationDelta(current, delta));
+        });
+        return () => source.close();
+    }, [spaceId, token]);
+
     if (loading) return <p style={{ textAlign: 'center', marginTop: '50px' }}>Loading space details...</p>;
     if (error) return <p style={{ textAlign: 'center', color: 'red', marginTop: '50px' }}>Error: {error}</p>;
 